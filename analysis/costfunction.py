@@ -49,6 +49,34 @@ class CostFunction:
         
         raise NotImplementedError
         
+        
+    #############################
+    def g_batch(self, X , U , T = 0 ):
+        """ 
+        step cost function for N points at once
+        
+        INPUTS
+        X  : state vectors            N x n
+        U  : control inputs vectors   N x m
+        T  : times                    1 x 1  or  N x 1
+        
+        OUTPUTS
+        dJ : step costs               N
+        
+        Default is a loop calling g on each row, child classes should
+        overload this function with vectorized numpy expressions.
+        
+        """
+        
+        N  = X.shape[0]
+        T  = np.broadcast_to( T , N )
+        dJ = np.zeros( N )
+        
+        for i in range( N ):
+            dJ[i] = self.g( X[i,:] , U[i,:] , T[i] )
+            
+        return dJ
+        
 
 #############################################################################
      
@@ -112,6 +140,28 @@ class QuadraticCostFunction( CostFunction ):
         return dJ
     
 
+    #############################
+    def g_batch(self, X , U , T = 0 ):
+        """ Quadratic additive cost for N points at once """
+        
+        dX = X - self.xbar
+        dU = U - self.ubar
+        
+        dJ = ( np.einsum( 'ij,jk,ik->i' , dX , self.Q , dX ) +
+               np.einsum( 'ij,jk,ik->i' , dU , self.R , dU ) )
+        
+        # Outputs are only computed when they are weighted
+        if np.any( self.V ):
+            dY  = self.sys.h_batch( X , U , T ) - self.ybar
+            dJ += np.einsum( 'ij,jk,ik->i' , dY , self.V , dY )
+        
+        # set cost to zero if on target
+        if self.ontarget_check:
+            dJ[ np.linalg.norm( dX , axis = 1 ) < self.EPS ] = 0
+        
+        return dJ
+    
+
 ##############################################################################
 
 class TimeCostFunction( CostFunction ):
@@ -158,6 +208,19 @@ class TimeCostFunction( CostFunction ):
                 
         return dJ
 
+    
+    #############################
+    def g_batch(self, X , U , T = 0 ):
+        """ Unity for N points at once """
+        
+        dJ = np.ones( X.shape[0] )
+        
+        if self.ontarget_check:
+            dX = X - self.xbar
+            dJ[ np.linalg.norm( dX , axis = 1 ) < self.EPS ] = 0
+                
+        return dJ
+
 '''
 #################################################################
 ##################          Main                         ########
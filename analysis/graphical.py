@@ -145,7 +145,7 @@ class Animator:
         self.ani_domains   = []
         
         # For all simulation data points
-        for i in range( self.sys.sim.n ):
+        for i in range( self.sys.sim.x_sol.shape[0] ):
             # Get configuration q from simulation
             q               = self.sys.xut2q(self.sys.sim.x_sol[i,:] ,
                                              self.sys.sim.u_sol[i,:] , 
@@ -221,7 +221,7 @@ class Animator:
             # adjust frame speed to simulation                                    
             inter           = self.sys.sim.dt * 1000. / time_factor_video 
             
-            n_frame         = self.sys.sim.n
+            n_frame         = self.sys.sim.x_sol.shape[0]
             
         else:
             # Simulation is faster than video
@@ -231,7 +231,7 @@ class Animator:
             self.skip_steps =  int( factor  ) 
             
             # --> number of video frames
-            n_frame         =  int( self.sys.sim.n / self.skip_steps )               
+            n_frame         =  int( self.sys.sim.x_sol.shape[0] / self.skip_steps )               
         
         # ANIMATION
         # blit=True option crash on mac
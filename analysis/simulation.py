@@ -5,17 +5,22 @@ Created on Fri Aug 07 11:51:55 2015
 @author: agirard
 """
 
+import copy
+import multiprocessing
+
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 
 from scipy.integrate import odeint
+from scipy.integrate import solve_ivp
 
 # Embed font type in PDF
 matplotlib.rcParams['pdf.fonttype'] = 42
 matplotlib.rcParams['ps.fonttype']  = 42
 
 
+from pyro.dynamic  import system
 from pyro.analysis import costfunction 
 from pyro.analysis import phaseanalysis
 
@@ -31,7 +36,19 @@ class Simulation:
     ContinuousDynamicSystem : Instance of ContinuousDynamicSystem
     tf : final time
     n  : number of points
-    solver : 'ode' or 'euler'
+    solver : 'ode'                 : odeint
+             'euler'               : fixed-step forward euler
+             'rk4'                 : fixed-step runge-kutta 4
+             'rk45'                : adaptive dormand-prince ( solve_ivp )
+             'semi-implicit-euler' : fixed-step for mechanical systems
+                                     with x = [ q , dq ]
+    --------------------------------------------------------
+    Events for early termination, the result arrays ( t , x_sol , ... )
+    are then trimmed at the event, tf and n are kept as configured, and
+    termination is 'domain', 'goal' or 'cost':
+    domain_check   : stop when the state leaves the domain ( isavalidstate )
+    x_goal         : stop when || x - x_goal || < goal_radius
+    cost_threshold : stop when the cost integral exceeds the threshold
     """
     ############################
     def __init__(self, ContinuousDynamicSystem, tf=10, n=10001, solver='ode'):
@@ -44,6 +61,19 @@ class Simulation:
         self.x0 = np.zeros( self.cds.n )
         self.solver = solver
         
+        # Tolerances of the adaptive solver
+        self.rtol = 1E-6
+        self.atol = 1E-9
+        
+        # Events for early termination
+        self.domain_check   = False
+        self.x_goal         = None
+        self.goal_radius    = 0.1
+        self.cost_threshold = None
+        self.event_chunk    = 100  # points per ode call when checking events
+        
+        self.termination    = None
+        
         # Ploting
         self.fontsize = 5
         self.figsize  = (4,3)
@@ -53,6 +83,33 @@ class Simulation:
         self.cf = costfunction.QuadraticCostFunction( ContinuousDynamicSystem )
 
         
+    ##############################
+    def __getattr__(self, name ):
+        """ 
+        Lazy evaluation of the outputs, inputs and cost arrays, computed on 
+        first access after compute()
+        """
+        
+        if name == 'y_sol':
+            self.compute_outputs()
+        elif name == 'u_sol':
+            self.compute_inputs()
+        elif name == 'dJ_sol' or name == 'J_sol' or name == 'J':
+            self.compute_cost()
+        else:
+            raise AttributeError( name )
+            
+        return self.__dict__[ name ]
+    
+    
+    ##############################
+    def clear_lazy_arrays(self):
+        """ Remove the lazy arrays of a previous simulation """
+        
+        for name in ( 'y_sol' , 'u_sol' , 'r_sol' , 'dJ_sol' , 'J_sol' , 'J' ):
+            self.__dict__.pop( name , None )
+
+        
     ##############################
     def compute(self):
         """ Integrate trought time """
@@ -60,71 +117,279 @@ class Simulation:
         self.t  = np.linspace( self.t0 , self.tf , self.n )
         self.dt = ( self.tf + 0.0 - self.t0 ) / ( self.n - 1 )
         
-        self.J  = 0
+        self.clear_lazy_arrays()
+        
+        self.termination = None
+        self.J_events    = 0.
+        
+        if self.has_events() and ( self.solver == 'ode' or 
+                                   self.solver == 'rk45' ):
+            self.x_sol = self.compute_chunks()
+        elif self.solver == 'ode':
+            self.x_sol = odeint( self.cds.fbar , self.x0 , self.t)
+        elif self.solver == 'euler':
+            self.x_sol = self.compute_euler()
+        elif self.solver == 'rk4':
+            self.x_sol = self.compute_rk4()
+        elif self.solver == 'rk45':
+            self.x_sol = self.compute_rk45()
+        elif self.solver == 'semi-implicit-euler':
+            self.x_sol = self.compute_semi_implicit_euler()
+        else:
+            raise ValueError('not a valid solver')
+        
+        # Trim the time at the termination event
+        self.t = self.t[ : self.x_sol.shape[0] ]
+            
+            
+    ##############################
+    def has_events(self):
+        """ Check if any termination event is active """
+        
+        return ( self.domain_check or 
+                 self.x_goal is not None or 
+                 self.cost_threshold is not None )
+    
+    
+    ##############################
+    def event_input(self, x , t ):
+        """ Input used for the running cost of the cost threshold event """
+        
+        return self.cds.ubar
+    
+    
+    ##############################
+    def is_terminated(self, x , t ):
+        """ Check the events at state x and time t, set self.termination """
+        
+        if self.domain_check and not( self.cds.isavalidstate( x ) ):
+            self.termination = 'domain'
+            
+        elif ( self.x_goal is not None and 
+               np.linalg.norm( x - self.x_goal ) < self.goal_radius ):
+            self.termination = 'goal'
+            
+        elif self.cost_threshold is not None:
+            
+            u = self.event_input( x , t )
+            
+            self.J_events = self.cf.g( x , u , t ) * self.dt + self.J_events
+            
+            if self.J_events > self.cost_threshold:
+                self.termination = 'cost'
+                
+        return self.termination is not None
+    
+    
+    ##############################
+    def compute_chunks(self):
+        """ 
+        Integrate with odeint or solve_ivp by chunks of event_chunk points,
+        stop at the first point where an event occurs
+        """
+        
+        x_sol = np.zeros(( self.n , self.cds.n ))
+        
+        # Initial State    
+        x_sol[0,:] = self.x0
+        
+        if self.is_terminated( x_sol[0,:] , self.t[0] ):
+            return x_sol[ : 1 ]
         
-        if self.solver == 'ode':
+        i0 = 0
+        
+        while i0 < ( self.n - 1 ):
+            
+            i1 = min( i0 + self.event_chunk , self.n - 1 )
+            
+            t  = self.t[ i0 : i1 + 1 ]
+            
+            if self.solver == 'ode':
+                x_sol[ i0 : i1 + 1 ] = odeint( self.cds.fbar , x_sol[i0] , t )
+            else:
+                sol = solve_ivp( lambda t , x : self.cds.fbar( x , t ) , 
+                                 ( t[0] , t[-1] ) , 
+                                 x_sol[i0] , 
+                                 method = 'RK45' , 
+                                 t_eval = t , 
+                                 rtol   = self.rtol , 
+                                 atol   = self.atol )
+                x_sol[ i0 : i1 + 1 ] = sol.y.T
+                
+            for i in range( i0 + 1 , i1 + 1 ):
+                if self.is_terminated( x_sol[i,:] , self.t[i] ):
+                    return x_sol[ : i + 1 ]
+                
+            i0 = i1
+            
+        return x_sol
         
-            self.x_sol = odeint( self.cds.fbar , self.x0 , self.t)   
 
-            # Compute inputs-output values
-            self.y_sol = np.zeros(( self.n , self.cds.p ))  
-            self.u_sol = np.zeros((self.n,self.cds.m))
+    ##############################
+    def compute_inputs(self):
+        """ Inputs values, constant open-loop input """
             
-            for i in range(self.n):
+        self.u_sol = np.tile( self.cds.ubar , ( self.t.shape[0] , 1 ) ).astype( float )
 
-                x = self.x_sol[i,:]  
-                u = self.cds.ubar
-                t = self.t[i]
+        
+    ##############################
+    def compute_outputs(self):
+        """ Outputs values, with the batch output function """
+        
+        self.y_sol = self.cds.h_batch( self.x_sol , self.u_sol , self.t )
                 
-                self.y_sol[i,:] = self.cds.h( x , u , t )
-                self.u_sol[i,:] = u
                 
-        elif self.solver == 'euler':
+    ##############################
+    def compute_euler(self):
+        """ Fixed-step forward euler integration """
             
-            self.x_sol = np.zeros((self.n,self.cds.n))
-            self.u_sol = np.zeros((self.n,self.cds.m))
-            self.y_sol = np.zeros((self.n,self.cds.p))
+        x_sol = np.zeros(( self.n , self.cds.n ))
             
-            # Initial State    
-            self.x_sol[0,:] = self.x0
+        # Initial State    
+        x_sol[0,:] = self.x0
             
-            for i in range(self.n):
+        events = self.has_events()
+        
+        if events and self.is_terminated( x_sol[0,:] , self.t[0] ):
+            return x_sol[ : 1 ]
+        
+        for i in range( self.n - 1 ):
                 
-                x = self.x_sol[i,:]
-                u = self.cds.ubar
-                t = self.t[i]
+            x = x_sol[i,:]
+            t = self.t[i]
                 
-                if i+1<self.n:
-                    self.x_sol[i+1,:] = self.cds.f( x , u , t ) * self.dt + x
+            x_sol[i+1,:] = self.cds.fbar( x , t ) * self.dt + x
+            
+            if events and self.is_terminated( x_sol[i+1,:] , self.t[i+1] ):
+                return x_sol[ : i + 2 ]
                 
-                self.y_sol[i,:] = self.cds.h( x , u , t )
-                self.u_sol[i,:] = u
+        return x_sol
+    
+    
+    ##############################
+    def compute_rk4(self):
+        """ Fixed-step runge-kutta 4 integration """
+        
+        x_sol = np.zeros(( self.n , self.cds.n ))
+        
+        # Stage buffers
+        k  = np.zeros(( 4 , self.cds.n ))
+        xs = np.zeros( self.cds.n )
+        
+        dt = self.dt
+        f  = self.cds.fbar
+        
+        # Initial State    
+        x_sol[0,:] = self.x0
+        
+        events = self.has_events()
+        
+        if events and self.is_terminated( x_sol[0,:] , self.t[0] ):
+            return x_sol[ : 1 ]
+        
+        for i in range( self.n - 1 ):
+            
+            x = x_sol[i,:]
+            t = self.t[i]
+            
+            k[0] = f( x , t )
+            
+            np.multiply( k[0] , 0.5 * dt , out = xs )
+            xs += x
+            k[1] = f( xs , t + 0.5 * dt )
+            
+            np.multiply( k[1] , 0.5 * dt , out = xs )
+            xs += x
+            k[2] = f( xs , t + 0.5 * dt )
+            
+            np.multiply( k[2] , dt , out = xs )
+            xs += x
+            k[3] = f( xs , t + dt )
+            
+            x_sol[i+1,:] = x + ( k[0] + 2 * k[1] + 2 * k[2] + k[3] ) * dt / 6
+            
+            if events and self.is_terminated( x_sol[i+1,:] , self.t[i+1] ):
+                return x_sol[ : i + 2 ]
+            
+        return x_sol
+    
+    
+    ##############################
+    def compute_rk45(self):
+        """ Adaptive dormand-prince integration, evaluated at self.t """
+        
+        sol = solve_ivp( lambda t , x : self.cds.fbar( x , t ) , 
+                         ( self.t0 , self.tf ) , 
+                         self.x0 , 
+                         method = 'RK45' , 
+                         t_eval = self.t , 
+                         rtol   = self.rtol , 
+                         atol   = self.atol )
+        
+        return sol.y.T
+    
+    
+    ##############################
+    def compute_semi_implicit_euler(self):
+        """ 
+        Fixed-step semi-implicit euler integration of x = [ q , dq ]
+        -------------------------------------------------------------
+        dq[k+1] = dq[k] + ddq[k] * dt
+        q[k+1]  = q[k]  + dq[k+1] * dt
+        
+        """
+        
+        # Mechanical system or closed-loop mechanical system
+        dof = getattr( self.cds , 'dof' , None )
+        
+        if dof is None:
+            dof = getattr( getattr( self.cds , 'sys' , None ) , 'dof' , None )
+            
+        if dof is None or not( 2 * dof == self.cds.n ):
+            raise ValueError('semi-implicit euler requires x = [ q , dq ]')
+        
+        x_sol = np.zeros(( self.n , self.cds.n ))
+        
+        # Initial State    
+        x_sol[0,:] = self.x0
+        
+        events = self.has_events()
+        
+        if events and self.is_terminated( x_sol[0,:] , self.t[0] ):
+            return x_sol[ : 1 ]
+        
+        for i in range( self.n - 1 ):
+            
+            x = x_sol[i,:]
+            t = self.t[i]
+            
+            ddq = self.cds.fbar( x , t )[ dof : ]
+            
+            x_sol[i+1,dof:] = x[dof:] + ddq * self.dt
+            x_sol[i+1,:dof] = x[:dof] + x_sol[i+1,dof:] * self.dt
+            
+            if events and self.is_terminated( x_sol[i+1,:] , self.t[i+1] ):
+                return x_sol[ : i + 2 ]
+            
+        return x_sol
                 
                 
     ##############################
     def compute_cost(self):
         """ Integrate cost trought time """
         
-        self.J      = 0  # cost integral
-        self.dJ_sol = np.zeros((self.n,1))
-        self.J_sol  = np.zeros((self.n,1))
+        dJ = self.cf.g_batch( self.x_sol , self.u_sol , self.t )
         
-        for i in range(self.n):
-
-            x = self.x_sol[i,:]  
-            u = self.u_sol[i,:] 
-            y = self.y_sol[i,:] 
-            t = self.t[i]
-            
-            dJ = self.cf.g(x, u, t)
-            self.J  = dJ * self.dt + self.J
-            
-            self.dJ_sol[i] = dJ
-            self.J_sol[i]  = self.J
+        # Cumulative trapezoidal integration
+        J = np.zeros( self.t.shape[0] )
+        J[1:] = np.cumsum( ( dJ[1:] + dJ[:-1] ) * 0.5 * np.diff( self.t ) )
         
         # Final cost
-        self.J = self.cf.h(x, t) + self.J
-        self.J_sol[-1] = self.J
+        J[-1] += self.cf.h( self.x_sol[-1,:] , self.t[-1] )
+        
+        self.dJ_sol = dJ.reshape( -1 , 1 )
+        self.J_sol  = J.reshape( -1 , 1 )
+        self.J      = J[-1]  # cost integral
        
         
     ###########################################################################
@@ -307,29 +572,44 @@ class CLosedLoopSimulation( Simulation ):
         
         
     ###########################################################################
-    def compute(self):
+    def __getattr__(self, name ):
+        """ Lazy evaluation of the reference and internal input arrays """
+        
+        if name == 'r_sol' or name == 'u_sol':
+            self.compute_inputs()
+            return self.__dict__[ name ]
         
-        Simulation.compute(self)
+        return Simulation.__getattr__(self, name )
         
-        self.compute_inputs()
+    ###########################################################################
+    def compute_outputs(self):
+        """ Outputs values, the reference does not affect the outputs """
+        
+        U = np.tile( self.cds.ubar , ( self.t.shape[0] , 1 ) )
+        
+        self.y_sol = self.cds.h_batch( self.x_sol , U , self.t )
         
     ###########################################################################
     def compute_inputs(self):
         """ Compute internal control signal of the closed-loop system """
         
-        self.r_sol = self.u_sol.copy() # reference is input of combined sys
-        self.u_sol = np.zeros((self.n,self.sys.m))
+        # reference is input of combined sys
+        self.r_sol = np.tile( self.cds.ubar , ( self.t.shape[0] , 1 ) ).astype( float )
         
         # Compute internal input signal
-        for i in range(self.n):
-            
-            r = self.r_sol[i,:] 
-            y = self.y_sol[i,:] 
-            t = self.t[i]
-            
-            self.u_sol[i,:] = self.ctl.c( y , r , t )
+        self.u_sol = self.ctl.c_batch( self.y_sol , self.r_sol , self.t )
             
             
+    ##############################
+    def event_input(self, x , t ):
+        """ Input used for the running cost of the cost threshold event """
+        
+        r = self.cds.ubar
+        y = self.cds.h( x , r , t )
+        
+        return self.ctl.c( y , r , t )
+    
+    
     ###########################################################################
     def phase_plane_trajectory_closed_loop(self , x_axis , y_axis ):
         """ """
@@ -362,6 +642,329 @@ class CLosedLoopSimulation( Simulation ):
         
             
     
+###############################################################################
+# Batch Simulation
+###############################################################################
+
+def batch_simulation_worker( args ):
+    """ Simulate one run of a BatchSimulation in a worker process """
+    
+    cds , x0 , params , tf , n , solver , events = args
+    
+    # Per-run parameters
+    if params:
+        cds = copy.deepcopy( cds )
+        for name , value in params.items():
+            setattr( cds , name , value )
+    
+    sim = Simulation( cds , tf , n , solver )
+    
+    sim.x0 = x0
+    
+    # Termination events
+    for name , value in events.items():
+        setattr( sim , name , value )
+        
+    sim.compute()
+    
+    return sim.x_sol , sim.termination
+    
+
+###############################################################################
+    
+class BatchSimulation:
+    """ 
+    Simulation of N initial states of a ContinuousDynamicalSystem at once
+    ----------------------------------------------------------------------
+    ContinuousDynamicSystem : Instance of ContinuousDynamicSystem
+    tf : final time
+    n  : number of points
+    solver : 'rk4' or 'euler' fixed-step integration
+    ----------------------------------------------------------------------
+    x0     : initial states                         N x n
+    params : dict of per-run system parameters      { name : N values }
+    
+    All runs are integrated together with the vectorized f_batch when the 
+    system provides one, the parameter arrays must then broadcast in its 
+    expressions. Otherwise each run is simulated in a pool of processes.
+    
+    Results are x_sol ( N x n_points x n ), u_sol ( N x n_points x m ) 
+    and the cost J ( N ) of each run.
+    
+    Events ( domain_check, x_goal, cost_threshold ) are checked per run as 
+    in Simulation, a terminated run keeps its last state, termination ( N ) 
+    is the event of each run and termination_index ( N ) the index of its 
+    last point. Arrays ( t , x_sol , ... ) are trimmed once all runs are
+    terminated, tf and n are kept as configured.
+    
+    """
+    ############################
+    def __init__(self, ContinuousDynamicSystem, tf=10, n=10001, solver='rk4'):
+        
+        self.cds    = ContinuousDynamicSystem
+        self.t0     = 0
+        self.tf     = tf
+        self.n      = int(n)
+        self.dt     = ( tf + 0.0 - self.t0 ) / ( n - 1 )
+        self.x0     = np.zeros(( 1 , self.cds.n ))
+        self.params = {}
+        self.solver = solver
+        
+        # None: vectorized if the system overloads f_batch
+        self.vectorized = None
+        self.workers    = multiprocessing.cpu_count()
+        
+        # Events for early termination
+        self.domain_check   = False
+        self.x_goal         = None
+        self.goal_radius    = 0.1
+        self.cost_threshold = None
+        
+        # Cost computing
+        self.cf = costfunction.QuadraticCostFunction( ContinuousDynamicSystem )
+        
+        
+    ##############################
+    def is_vectorized(self):
+        """
+        Check if the system provides a vectorized f_batch, i.e. overloaded
+        by the class defining f or a child class of it
+        """
+        
+        if self.vectorized is not None:
+            return self.vectorized
+        
+        mro = type( self.cds ).__mro__
+        
+        f_class       = next( c for c in mro if 'f' in vars( c ) )
+        f_batch_class = next( c for c in mro if 'f_batch' in vars( c ) )
+        
+        return ( issubclass( f_batch_class , f_class ) and
+                 not( f_batch_class is system.ContinuousDynamicSystem ) )
+        
+        
+    ##############################
+    def compute(self):
+        """ Integrate all the runs trought time """
+        
+        self.x0 = np.atleast_2d( np.asarray( self.x0 , dtype = float ) )
+        self.N  = self.x0.shape[0]
+        
+        self.t  = np.linspace( self.t0 , self.tf , self.n )
+        self.dt = ( self.tf + 0.0 - self.t0 ) / ( self.n - 1 )
+        
+        if not( self.solver == 'rk4' or self.solver == 'euler' ):
+            raise ValueError('not a valid solver')
+        
+        self.termination       = np.full( self.N , None , dtype = object )
+        self.termination_index = np.full( self.N , self.n - 1 , dtype = int )
+        
+        if self.is_vectorized():
+            self.x_sol = self.compute_vectorized()
+        else:
+            self.x_sol = self.compute_pool()
+            
+        # Trim the time once all runs are terminated
+        self.t = self.t[ : self.x_sol.shape[1] ]
+            
+        # Open-loop inputs
+        self.u_sol = np.zeros(( self.N , self.t.shape[0] , self.cds.m ))
+        self.u_sol[:] = self.cds.ubar
+        
+        self.compute_cost()
+        
+        
+    ##############################
+    def has_events(self):
+        """ Check if any termination event is active """
+        
+        return ( self.domain_check or 
+                 self.x_goal is not None or 
+                 self.cost_threshold is not None )
+    
+    
+    ##############################
+    def check_events(self, cds , X , U , t , i , active ):
+        """ 
+        Check the events of the active runs at their states X ( N x n ) of 
+        point i, return the mask of the runs terminated at this point
+        """
+        
+        terminated = np.zeros( self.N , dtype = bool )
+        
+        if self.domain_check:
+            out = active & ~terminated
+            out[ out ] = ~cds.isavalidstate_batch( X[ out ] )
+            self.termination[ out ] = 'domain'
+            terminated |= out
+            
+        if self.x_goal is not None:
+            d    = np.linalg.norm( X - self.x_goal , axis = 1 )
+            goal = active & ~terminated & ( d < self.goal_radius )
+            self.termination[ goal ] = 'goal'
+            terminated |= goal
+            
+        if self.cost_threshold is not None:
+            j = active & ~terminated
+            self.J_events[j] += self.cf.g_batch( X[j] , U[j] , t ) * self.dt
+            cost = ( active & ~terminated & 
+                     ( self.J_events > self.cost_threshold ) )
+            self.termination[ cost ] = 'cost'
+            terminated |= cost
+            
+        self.termination_index[ terminated ] = i
+            
+        return terminated
+        
+        
+    ##############################
+    def compute_vectorized(self):
+        """ Fixed-step integration of all runs with f_batch """
+        
+        cds = self.cds
+        
+        # Per-run parameters as arrays
+        if self.params:
+            cds = copy.deepcopy( cds )
+            for name , values in self.params.items():
+                setattr( cds , name , np.asarray( values ) )
+        
+        N  = self.N
+        dt = self.dt
+        U  = np.tile( cds.ubar , ( N , 1 ) )
+        
+        x_sol = np.zeros(( N , self.n , cds.n ))
+        
+        # Stage buffers
+        k  = np.zeros(( 4 , N , cds.n ))
+        xs = np.zeros(( N , cds.n ))
+        
+        x_sol[:,0,:] = self.x0
+        
+        events = self.has_events()
+        active = np.ones( N , dtype = bool )
+        
+        self.J_events = np.zeros( N )
+        
+        if events:
+            active &= ~self.check_events( cds , x_sol[:,0,:] , U , self.t[0] , 
+                                          0 , active )
+        
+        for i in range( self.n - 1 ):
+            
+            if not active.any():
+                # All runs are terminated
+                return x_sol[ : , : i + 1 , : ]
+            
+            x = x_sol[:,i,:]
+            t = self.t[i]
+            
+            k[0] = cds.f_batch( x , U , t )
+            
+            if self.solver == 'euler':
+                x_sol[:,i+1,:] = x + k[0] * dt
+            else:
+                np.multiply( k[0] , 0.5 * dt , out = xs )
+                xs += x
+                k[1] = cds.f_batch( xs , U , t + 0.5 * dt )
+            
+                np.multiply( k[1] , 0.5 * dt , out = xs )
+                xs += x
+                k[2] = cds.f_batch( xs , U , t + 0.5 * dt )
+            
+                np.multiply( k[2] , dt , out = xs )
+                xs += x
+                k[3] = cds.f_batch( xs , U , t + dt )
+            
+                x_sol[:,i+1,:] = x + ( k[0] + 2*k[1] + 2*k[2] + k[3] ) * dt / 6
+            
+            if events:
+                # Terminated runs keep their last state
+                x_sol[~active,i+1,:] = x[~active]
+                active &= ~self.check_events( cds , x_sol[:,i+1,:] , U , 
+                                              self.t[i+1] , i + 1 , active )
+            
+        return x_sol
+    
+    
+    ##############################
+    def compute_pool(self):
+        """ Simulate each run in a pool of processes """
+        
+        args = []
+        
+        events = { 'domain_check'   : self.domain_check , 
+                   'x_goal'         : self.x_goal , 
+                   'goal_radius'    : self.goal_radius , 
+                   'cost_threshold' : self.cost_threshold }
+        
+        for j in range( self.N ):
+            
+            params = { name : np.asarray( values )[j] 
+                       for name , values in self.params.items() }
+            
+            args.append( ( self.cds , self.x0[j] , params , 
+                           self.tf , self.n , self.solver , events ) )
+            
+        pool = multiprocessing.Pool( self.workers )
+        
+        try:
+            results = pool.map( batch_simulation_worker , args )
+        finally:
+            pool.close()
+            pool.join()
+            
+        # Runs terminated by an event keep their last state
+        n     = max( x_sol.shape[0] for x_sol , termination in results )
+        x_sol = np.zeros(( self.N , n , self.cds.n ))
+        
+        for j , ( x_sol_j , termination ) in enumerate( results ):
+            
+            x_sol[ j , : x_sol_j.shape[0] ] = x_sol_j
+            x_sol[ j , x_sol_j.shape[0] : ] = x_sol_j[-1]
+            
+            if termination is not None:
+                self.termination[j]       = termination
+                self.termination_index[j] = x_sol_j.shape[0] - 1
+            
+        return x_sol
+    
+    
+    ##############################
+    def compute_cost(self):
+        """ Integrate the cost of each run trought time """
+        
+        N = self.N
+        n = self.t.shape[0]
+        
+        X = self.x_sol.reshape( N * n , self.cds.n )
+        U = self.u_sol.reshape( N * n , self.cds.m )
+        T = np.tile( self.t , N )
+        
+        # Runs are integrated up to their termination
+        running = np.arange( n ) <= self.termination_index[:,None]
+        
+        self.dJ_sol = self.cf.g_batch( X , U , T ).reshape( N , n ) * running
+        
+        # Cumulative trapezoidal integration
+        dJ = self.dJ_sol
+        
+        dJ_segments = ( dJ[:,1:] + dJ[:,:-1] ) * 0.5 * np.diff( self.t )
+        dJ_segments[ ~running[:,1:] ] = 0
+        
+        self.J_sol = np.zeros(( N , n ))
+        self.J_sol[:,1:] = np.cumsum( dJ_segments , axis = 1 )
+        
+        # Final cost at the last point of each run
+        for j in range( N ):
+            i = self.termination_index[j]
+            self.J_sol[j,i:] += self.cf.h( self.x_sol[j,i,:] , self.t[i] )
+        
+        self.J = self.J_sol[:,-1]
+            
+            
+            
+
 
 '''
 #################################################################
@@ -84,6 +84,34 @@ class StaticController:
         return u
     
     
+    #############################
+    def c_batch( self , Y , R , t = 0 ):
+        """ 
+        Feedback static computation U = c(Y,R,t) for N samples at once
+        
+        INPUTS
+        Y  : sensor signal vectors    N x p
+        R  : reference signal vectors N x k
+        t  : time                     1 x 1  or  N x 1
+        
+        OUPUTS
+        U  : control inputs vectors   N x m
+        
+        Default is a loop calling c on each row, child classes can
+        overload this function with vectorized numpy expressions.
+        
+        """
+        
+        N  = Y.shape[0]
+        T  = np.broadcast_to( t , N )
+        U  = np.zeros(( N , self.m ))
+        
+        for i in range( N ):
+            U[i,:] = self.c( Y[i,:] , R[i,:] , T[i] )
+            
+        return U
+    
+    
     #########################################################################
     # No need to overwrite the following functions for child classes
     #########################################################################
@@ -223,6 +251,36 @@ class ClosedLoopSystem( system.ContinuousDynamicSystem ):
         
         return y
     
+    
+    ###########################################################################
+    def h_batch( self , X , U , t = 0 ):
+        """ Output fonction Y = h(X,t) for N states at once """
+        
+        U_sys = np.tile( self.sys.ubar , ( X.shape[0] , 1 ) )
+        
+        return self.sys.h_batch( X , U_sys , t )
+    
+    
+    ###########################################################################
+    def isavalidstate( self , x ):
+        """ check if x is in the state domain of the open-loop system """
+        
+        return self.sys.isavalidstate( x )
+    
+    
+    ###########################################################################
+    def isavalidstate_batch( self , X ):
+        """ check if each row of X ( N x n ) is in the state domain """
+        
+        return self.sys.isavalidstate_batch( X )
+    
+    
+    ###########################################################################
+    def isavalidtransition_batch( self , X0 , X1 ):
+        """ check each transition from X0 to X1 ( N x n ) """
+        
+        return self.sys.isavalidtransition_batch( X0 , X1 )
+    
     ###########################################################################
     def plot_phase_plane_closed_loop(self , x_axis = 0 , y_axis = 1 ):
         """ 
@@ -7,7 +7,7 @@ Created on Fri Nov  9 10:46:14 2018
 
 ###############################################################################
 import numpy as np
-from scipy.interpolate import interp1d
+from scipy.interpolate import CubicSpline
 ###############################################################################
 from pyro.control import controller
 from pyro.dynamic import mechanical
@@ -16,6 +16,105 @@ from pyro.dynamic import mechanical
 
 
 
+###############################################################################
+# Reference trajectory
+###############################################################################
+
+class TrajectoryReference:
+    """ 
+    Piecewise polynomial reference r(t) = [ q , dq , ddq ] of a trajectory
+    -----------------------------------------------------------------------
+    t        : time-steps                         N
+    q,dq,ddq : positions, speeds and accelerations  N x dof
+    order    : 1 linear interpolation ( as interp1d ) or 3 cubic spline
+    -----------------------------------------------------------------------
+    The three signals are packed in the coefficients c ( order+1, N-1, 3dof )
+    of a single piecewise polynomial. The segment of the last evaluation is 
+    tried first, so monotone queries find their segment in O(1).
+    """
+    
+    ############################
+    def __init__(self, t , q , dq , ddq , order = 1 ):
+        
+        self.t     = np.asarray( t , dtype = float ).ravel()
+        self.dof   = q.shape[1]
+        self.order = order
+        
+        r  = np.hstack( ( q , dq , ddq ) )
+        
+        if order == 1:
+            slope  = np.diff( r , axis = 0 ) / np.diff( self.t )[:,None]
+            self.c = np.stack( ( slope , r[:-1] ) )
+        elif order == 3:
+            self.c = CubicSpline( self.t , r , axis = 0 ).c
+        else:
+            raise ValueError('order must be 1 or 3')
+        
+        self.last_index = 0
+        self.i_max      = self.t.size - 2
+        
+        
+    ############################
+    def segment(self, t ):
+        """ index i of the segment t[i] <= t < t[i+1], clipped to the ends """
+        
+        if np.ndim( t ) > 0:
+            i = np.searchsorted( self.t , t , side = 'right' ) - 1
+            return np.clip( i , 0 , self.i_max )
+        
+        # Same or next segment than the last evaluation
+        i = self.last_index
+        
+        for j in ( i , i + 1 ):
+            if j <= self.i_max and self.t[j] <= t < self.t[j+1]:
+                self.last_index = j
+                return j
+            
+        i = np.searchsorted( self.t , t , side = 'right' ) - 1
+        i = min( max( i , 0 ) , self.i_max )
+        
+        self.last_index = i
+        
+        return i
+    
+    
+    ############################
+    def __call__(self, t ):
+        """ 
+        Evaluate the reference at time t 
+        
+        OUTPUTS
+        r : [ q , dq , ddq ]     3dof  or  N x 3dof for an array of N times
+        """
+        
+        if np.ndim( t ) > 0:
+            t = np.asarray( t )
+        
+        i  = self.segment( t )
+        c  = self.c[ : , i ]
+        dt = np.clip( t , self.t[0] , self.t[-1] ) - self.t[ i ]
+        dt = np.asarray( dt )[...,None]
+        
+        # Horner evaluation of all signals at once
+        r = c[0]
+        for k in range( 1 , self.order + 1 ):
+            r = r * dt + c[k]
+            
+        return r
+    
+    
+    ############################
+    def q_dq_ddq(self, t ):
+        """ Evaluate and split the reference at time t """
+        
+        r   = self( t )
+        dof = self.dof
+        
+        return r[...,:dof] , r[...,dof:2*dof] , r[...,2*dof:]
+
+
+
+
 ###############################################################################
 # Computed Torque
 ###############################################################################
@@ -58,6 +157,7 @@ class ComputedTorqueController( controller.StaticController ) :
         
         # Mode
         if traj == None:
+            self.mode = 'fixed'
             self.c = self.c_fixed_goal
         else:
             self.load_trajectory( traj )
@@ -139,26 +239,35 @@ class ComputedTorqueController( controller.StaticController ) :
         ddq = traj.dx_sol[:, self.model.dof : 2 * self.model.dof ]
         t   = traj.t_sol
         
-        # Create interpol functions
-        self.q   = interp1d(t,q.T)
-        self.dq  = interp1d(t,dq.T)
-        self.ddq = interp1d(t,ddq.T)
+        # Packed piecewise linear reference
+        self.reference = TrajectoryReference( t , q , dq , ddq )
         
         
     ############################
     def get_traj( self , t  ):
         """ 
         
-        Find closest point on the trajectory
+        Find closest point on the trajectory, t can be an array of times
         
         """
         
-        if t < self.trajectory.time_final :
+        if np.ndim( t ) > 0:
+            
+            t = np.asarray( t )
+            
+            q , dq , ddq = self.reference.q_dq_ddq( t )
+            
+            # Hold the goal after the trajectory
+            after = t >= self.trajectory.time_final
+            
+            q[ after ]   = self.rbar
+            dq[ after ]  = 0
+            ddq[ after ] = 0
+        
+        elif t < self.trajectory.time_final :
 
             # Load trajectory
-            q     = self.q(   t )
-            dq    = self.dq(  t )
-            ddq   = self.ddq( t )          
+            q , dq , ddq = self.reference.q_dq_ddq( t )
 
         else:
             
@@ -211,6 +320,35 @@ class ComputedTorqueController( controller.StaticController ) :
         return u
     
 
+    #############################
+    def c_batch( self , Y , R , t = 0 ):
+        """ 
+        Feedback static computation U = c(Y,R,t) for N samples at once,
+        with the batched inverse dynamic of the model
+        
+        """
+        
+        X   = Y
+        dof = self.model.dof
+        
+        Q  = X[ : , : dof ]
+        dQ = X[ : , dof : 2 * dof ]
+        
+        if self.mode == 'interpol':
+            T = np.broadcast_to( t , X.shape[0] )
+            ddQ_d , dQ_d , Q_d = self.get_traj( T )
+        else:
+            Q_d   = R
+            dQ_d  = np.zeros( Q.shape )
+            ddQ_d = np.zeros( Q.shape )
+            
+        ddQ_r = self.compute_ddq_r( ddQ_d , dQ_d , Q_d , dQ , Q )
+        
+        U = self.model.actuator_forces_batch( Q , dQ , ddQ_r )
+        
+        return U
+    
+
 
 ##############################################################################
         
@@ -236,6 +374,13 @@ class SlidingModeController( ComputedTorqueController ):
         
         
         
+    #############################
+    def c_batch( self , Y , R , t = 0 ):
+        """ Loop calling c, the sliding torque is computed point by point """
+        
+        return controller.StaticController.c_batch( self , Y , R , t )
+        
+        
     ############################
     def compute_sliding_variables( self , ddq_d , dq_d , q_d , dq , q ):
         """ 
@@ -71,6 +71,23 @@ class SimpleIntegrator( system.ContinuousDynamicSystem ):
         return dx
 
 
+    #############################
+    def f_batch(self, X , U , t = 0 ):
+        """ 
+        Vectorized foward dynamics for N states at once
+        
+        X  : state vectors            N x n
+        U  : control inputs vectors   N x m
+        
+        """
+        
+        dX = np.zeros(( X.shape[0] , self.n ))
+        
+        dX[:,0] = U[:,0]
+        
+        return dX
+
+
 #############################################################################
 
 class DoubleIntegrator( system.ContinuousDynamicSystem ):
@@ -131,6 +148,24 @@ class DoubleIntegrator( system.ContinuousDynamicSystem ):
         return dx
     
     
+    #############################
+    def f_batch(self, X , U , t = 0 ):
+        """ 
+        Vectorized foward dynamics for N states at once
+        
+        X  : state vectors            N x n
+        U  : control inputs vectors   N x m
+        
+        """
+        
+        dX = np.zeros(( X.shape[0] , self.n ))
+        
+        dX[:,0] = X[:,1]
+        dX[:,1] = U[:,0]
+        
+        return dX
+    
+    
     #############################
     def h( self , x , u , t ):
         """ 
@@ -153,6 +188,21 @@ class DoubleIntegrator( system.ContinuousDynamicSystem ):
         return y
     
     
+    #############################
+    def h_batch( self , X , U , t = 0 ):
+        """ 
+        Vectorized output fonction for N states at once
+        
+        X  : state vectors            N x n
+        U  : control inputs vectors   N x m
+        
+        """
+        
+        Y = X[:,0:1].copy() # output is first state = position
+        
+        return Y
+    
+    
     
 ##############################################################################
         
@@ -216,6 +266,25 @@ class TripleIntegrator( system.ContinuousDynamicSystem ):
         return dx
     
     
+    #############################
+    def f_batch(self, X , U , t = 0 ):
+        """ 
+        Vectorized foward dynamics for N states at once
+        
+        X  : state vectors            N x n
+        U  : control inputs vectors   N x m
+        
+        """
+        
+        dX = np.zeros(( X.shape[0] , self.n ))
+        
+        dX[:,0] = X[:,1]
+        dX[:,1] = X[:,2]
+        dX[:,2] = U[:,0]
+        
+        return dX
+    
+    
     #############################
     def h( self , x , u , t ):
         """ 
@@ -238,6 +307,21 @@ class TripleIntegrator( system.ContinuousDynamicSystem ):
         return y
     
     
+    #############################
+    def h_batch( self , X , U , t = 0 ):
+        """ 
+        Vectorized output fonction for N states at once
+        
+        X  : state vectors            N x n
+        U  : control inputs vectors   N x m
+        
+        """
+        
+        Y = X[:,0:1].copy() # output is first state = position
+        
+        return Y
+    
+    
     
 '''
 #################################################################
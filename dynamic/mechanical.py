@@ -30,6 +30,11 @@ class MechanicalSystem( system.ContinuousDynamicSystem ):
     ddq    :  dim = (dof, 1)   : acceleration variables
     d(q,dq):  dim = (dof, 1)   : state-dependent dissipative forces
     g(q)   :  dim = (dof, 1)   : state-dependent conservatives forces
+    -------------------------------------------------------
+    B_is_constant : None  -> detected at first use by comparing B(q) at 
+                             a few configurations
+                    True  -> B(0) and its inverse are cached
+                    False -> B(q) is evaluated at each call
     
     """
     
@@ -69,6 +74,12 @@ class MechanicalSystem( system.ContinuousDynamicSystem ):
             self.input_label[i] = 'Torque ' + str(i)
             self.input_units[i] ='[Nm]'
             
+        # Actuator matrix cache
+        self.B_is_constant = None
+        self.B_constant    = None
+        self.B_inv         = None
+        self.B_is_identity = False
+            
     ###########################################################################
     # The following functions needs to be overloaded by child classes
     # to represent the dynamic of the system
@@ -135,6 +146,42 @@ class MechanicalSystem( system.ContinuousDynamicSystem ):
         
         return d
     
+    ###########################################################################
+    def dynamics_bundle(self, q , dq ):
+        """ 
+        H, C, g and d evaluated together
+        ----------------------------------
+        q , dq : dim = ( dof )  or  ( N , dof )
+        
+        H , C  : dim = ( dof , dof )  or  ( N , dof , dof )
+        g , d  : dim = ( dof )        or  ( N , dof )
+        
+        Default calls H, C, g and d on each configuration, child classes 
+        should overload it with vectorized expressions sharing the 
+        trigonometric terms.
+        
+        """
+        
+        if np.ndim( q ) == 1:
+            return ( self.H( q ) , self.C( q , dq ) , 
+                     self.g( q ) , self.d( q , dq ) )
+        
+        N   = q.shape[0]
+        dof = self.dof
+        
+        H = np.zeros(( N , dof , dof ))
+        C = np.zeros(( N , dof , dof ))
+        g = np.zeros(( N , dof ))
+        d = np.zeros(( N , dof ))
+        
+        for i in range( N ):
+            H[i] = self.H( q[i] )
+            C[i] = self.C( q[i] , dq[i] )
+            g[i] = self.g( q[i] )
+            d[i] = self.d( q[i] , dq[i] )
+            
+        return H , C , g , d
+    
     
     ###########################################################################
     # No need to overwrite the following functions for custom system
@@ -168,51 +215,226 @@ class MechanicalSystem( system.ContinuousDynamicSystem ):
         return self.x2q(x)[0]
     
     
+    ##############################
+    def uses_model_of(self, cls ):
+        """ 
+        True if H, C, g, d and B are still the methods of class cls, so the 
+        hand-written dynamics_bundle of cls describes this system
+        """
+        
+        return all( getattr( type( self ) , name ) is getattr( cls , name )
+                    for name in ( 'H' , 'C' , 'g' , 'd' , 'B' ) )
+    
+    
+    ##############################
+    def check_constant_B(self):
+        """ 
+        Detect a constant actuator matrix and cache it with its inverse,
+        return True if B is constant
+        """
+        
+        if self.B_is_constant is None:
+            
+            if type( self ).B is MechanicalSystem.B:
+                # Default is identity matrix
+                self.B_is_constant = True
+                
+            else:
+                q0 = np.zeros( self.dof )
+                q1 = + 0.37 * np.arange( 1 , self.dof + 1 )
+                q2 = - 1.13 * np.arange( 1 , self.dof + 1 )
+                
+                B0 = self.B( q0 )
+                
+                self.B_is_constant = ( np.array_equal( B0 , self.B( q1 ) ) and
+                                       np.array_equal( B0 , self.B( q2 ) ) )
+                
+        if self.B_is_constant and self.B_constant is None:
+            
+            B = np.array( self.B( np.zeros( self.dof ) ) , dtype = float )
+            
+            self.B_constant    = B
+            self.B_is_identity = ( B.shape[0] == B.shape[1] and 
+                                   np.array_equal( B , np.eye( B.shape[0] ) ) )
+            
+            # Pseudo-inverse for underactuated systems
+            if ( B.shape[0] == B.shape[1] and 
+                 np.linalg.matrix_rank( B ) == B.shape[0] ):
+                self.B_inv = np.linalg.inv( B )
+            else:
+                self.B_inv = np.linalg.pinv( B )
+        
+        return self.B_is_constant
+    
+    
+    ##############################
+    def actuator_generalized_forces(self, q , u ):
+        """ Generalized forces B(q) u of the actuators """
+        
+        if self.check_constant_B():
+            
+            if self.B_is_identity:
+                return u
+            
+            return np.dot( self.B_constant , u )
+        
+        return np.dot( self.B( q ) , u )
+    
+    
+    ##############################
+    def solve_inertia(self, H , r ):
+        """ 
+        Solve H ddq = r for one ( dof x dof ) or N stacked ( N x dof x dof )
+        inertia matrices, closed-form for 1 and 2 dof
+        """
+        
+        if self.dof == 1:
+            return r / H[...,0]
+        
+        elif self.dof == 2:
+            
+            H00 = H[...,0,0]
+            H01 = H[...,0,1]
+            H10 = H[...,1,0]
+            H11 = H[...,1,1]
+            
+            det = H00 * H11 - H01 * H10
+            
+            ddq = np.zeros( np.shape( r ) )
+            
+            ddq[...,0] = ( H11 * r[...,0] - H01 * r[...,1] ) / det
+            ddq[...,1] = ( H00 * r[...,1] - H10 * r[...,0] ) / det
+            
+            return ddq
+        
+        else:
+            return np.linalg.solve( H , r[...,None] )[...,0]
+    
+    
     ##############################
     def generalized_forces(self, q  , dq  , ddq , t = 0 ):
         """ Computed generalized forces given a trajectory """  
         
-        H = self.H( q )
-        C = self.C( q , dq )
-        g = self.g( q )
-        d = self.d( q , dq )
+        H , C , g , d = self.dynamics_bundle( q , dq )
                 
         # Generalized forces
         forces = np.dot( H , ddq ) + np.dot( C , dq ) + g + d
         
         return forces
     
+    ##############################
+    def generalized_forces_batch(self, Q , dQ , ddQ , t = 0 ):
+        """ Computed generalized forces for N points of a trajectory """  
+        
+        H , C , g , d = self.dynamics_bundle( Q , dQ )
+                
+        # Generalized forces
+        forces = ( np.einsum( 'nij,nj->ni' , H , ddQ ) + 
+                   np.einsum( 'nij,nj->ni' , C , dQ ) + g + d )
+        
+        return forces
+    
     ##############################
     def actuator_forces(self, q  , dq  , ddq , t = 0 ):
         """ Computed actuator forces given a trajectory (inverse dynamic) """  
         
-        B = self.B( q )
-                
         # Generalized forces
         forces = self.generalized_forces( q , dq , ddq , t )
         
         # Actuator forces
-        u = np.dot( np.linalg.inv( B ) , forces )
+        if self.check_constant_B():
+            
+            if self.B_is_identity:
+                return forces
+            
+            return np.dot( self.B_inv , forces )
+        
+        u = np.linalg.solve( self.B( q ) , forces )
         
         return u
     
+    ##############################
+    def actuator_forces_batch(self, Q , dQ , ddQ , t = 0 ):
+        """ Computed actuator forces for N points of a trajectory """  
+        
+        # Generalized forces
+        forces = self.generalized_forces_batch( Q , dQ , ddQ , t )
+        
+        # Actuator forces
+        if self.check_constant_B():
+            
+            if self.B_is_identity:
+                return forces
+            
+            return np.dot( forces , self.B_inv.T )
+        
+        U = np.zeros(( Q.shape[0] , self.m ))
+        
+        for i in range( Q.shape[0] ):
+            U[i] = np.linalg.solve( self.B( Q[i] ) , forces[i] )
+        
+        return U
+    
     
     ##############################
     def ddq(self, q , dq , u , t = 0 ):
         """ Computed accelerations given actuator forces (foward dynamic) """  
         
-        H = self.H( q )
-        C = self.C( q , dq )
-        g = self.g( q  )
-        d = self.d( q , dq)
-        B = self.B( q )
+        H , C , g , d = self.dynamics_bundle( q , dq )
+        
+        r = self.actuator_generalized_forces( q , u ) - np.dot( C , dq ) - g - d
         
-        ddq = np.dot( np.linalg.inv( H ) ,  ( np.dot( B , u )  
-                                            - np.dot( C , dq ) - g - d ) )
+        ddq = self.solve_inertia( H , r )
         
         return ddq
     
     
+    ##############################
+    def ddq_batch(self, Q , dQ , U , t = 0 ):
+        """ 
+        Computed accelerations for N states at once (foward dynamic)
+        
+        INPUTS
+        Q   : positions               N x dof
+        dQ  : velocities              N x dof
+        U   : actuator forces         N x m
+        
+        OUTPUTS
+        ddQ : accelerations           N x dof
+        
+        H, C, g, d are evaluated with dynamics_bundle and all the inertia 
+        matrices are solved at once. If a child class overloads ddq, it is
+        called on each state instead.
+        
+        """
+        
+        if type( self ).ddq is not MechanicalSystem.ddq:
+        
+            ddQ = np.zeros( Q.shape )
+            T   = np.broadcast_to( t , Q.shape[0] )
+            
+            for i in range( Q.shape[0] ):
+                ddQ[i] = self.ddq( Q[i] , dQ[i] , U[i] , T[i] )
+            
+            return ddQ
+        
+        H , C , g , d = self.dynamics_bundle( Q , dQ )
+        
+        r = - np.einsum( 'nij,nj->ni' , C , dQ ) - g - d
+            
+        # Actuator forces
+        if self.check_constant_B():
+            if self.B_is_identity:
+                r += U
+            else:
+                r += np.dot( U , self.B_constant.T )
+        else:
+            for i in range( Q.shape[0] ):
+                r[i] += np.dot( self.B( Q[i] ) , U[i] )
+            
+        return self.solve_inertia( H , r )
+    
+    
     ###########################################################################
     def f(self, x , u , t = 0 ):
         """ 
@@ -242,6 +464,31 @@ class MechanicalSystem( system.ContinuousDynamicSystem ):
         return dx
     
     
+    ###########################################################################
+    def f_batch(self, X , U , t = 0 ):
+        """ 
+        Continuous time foward dynamics for N states at once
+        
+        dX = [ dQ , ddQ ] with ddQ from ddq_batch and dynamics_bundle
+        
+        If a child class overloads f, the default loop calling f on each
+        state is used instead.
+        
+        """
+        
+        if type( self ).f is not MechanicalSystem.f:
+            return system.ContinuousDynamicSystem.f_batch( self , X , U , t )
+        
+        dof = self.dof
+        
+        dX = np.zeros(( X.shape[0] , self.n ))
+        
+        dX[:,:dof] = X[:,dof:]
+        dX[:,dof:] = self.ddq_batch( X[:,:dof] , X[:,dof:] , U , t )
+        
+        return dX
+    
+    
     ###########################################################################
     def kinetic_energy(self, q  , dq ):
         """ Compute kinetic energy of manipulator """  
@@ -272,4 +519,3 @@ if __name__ == "__main__":
     #m.show3( np.array([-0.5,1.5]))
     
     m.animate_simulation()
-        
\ No newline at end of file
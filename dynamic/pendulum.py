@@ -124,6 +124,34 @@ class SinglePendulum( mechanical.MechanicalSystem ):
         d[0] = self.d1 * dq[0]
         
         return d
+    
+    ###########################################################################
+    def dynamics_bundle(self, q , dq ):
+        """ 
+        H, C, g and d for one ( dof ) or N ( N x dof ) configurations
+        
+        Same equations as H, C, g and d above, evaluated column-wise, or 
+        the generic bundle if a child class overloads one of them
+        
+        """
+        
+        if not self.uses_model_of( SinglePendulum ):
+            return mechanical.MechanicalSystem.dynamics_bundle( self , q , dq )
+        
+        shape = np.shape( q )[:-1]
+        
+        [c1,s1] = self.trig( q[...,0] )
+        
+        H = np.zeros( shape + ( 1 , 1 ) )
+        C = np.zeros( shape + ( 1 , 1 ) )
+        g = np.zeros( shape + ( 1 , ) )
+        d = np.zeros( shape + ( 1 , ) )
+        
+        H[...,0,0] = self.m1 * self.lc1**2 + self.I1
+        g[...,0]   = self.m1 * self.gravity * self.lc1 * s1
+        d[...,0]   = self.d1 * dq[...,0]
+        
+        return H , C , g , d
         
     ###########################################################################
     # Graphical output
@@ -326,6 +354,64 @@ class DoublePendulum( mechanical.MechanicalSystem ):
         
         return d
         
+    ###########################################################################
+    def dynamics_bundle(self, q , dq ):
+        """ 
+        H, C, g and d for one ( dof ) or N ( N x dof ) configurations
+        
+        Same equations as H, C, g and d above, evaluated column-wise 
+        with a single trig evaluation, or the generic bundle if a child 
+        class overloads one of them
+        
+        """
+        
+        if not self.uses_model_of( DoublePendulum ):
+            return mechanical.MechanicalSystem.dynamics_bundle( self , q , dq )
+        
+        shape = np.shape( q )[:-1]
+        
+        [c1,s1,c2,s2,c12,s12] = self.trig( q.T )
+        
+        dq0 = dq[...,0]
+        dq1 = dq[...,1]
+        
+        # Inertia matrix
+        H = np.zeros( shape + ( 2 , 2 ) )
+        
+        H[...,0,0] = ( self.m1 * self.lc1**2 + self.I1 + self.I2 + 
+                       self.m2 * ( self.l1**2 + self.lc2**2 + 
+                                   2 * self.l1 * self.lc2 * c2 ) )
+        H[...,1,0] = ( self.m2 * self.lc2**2 + 
+                       self.m2 * self.l1 * self.lc2 * c2 + self.I2 )
+        H[...,0,1] = H[...,1,0]
+        H[...,1,1] = self.m2 * self.lc2 ** 2 + self.I2
+        
+        # Corriolis matrix
+        h = self.m2 * self.l1 * self.lc2 * s2
+        
+        C = np.zeros( shape + ( 2 , 2 ) )
+        
+        C[...,0,0] = - h * dq1
+        C[...,1,0] =   h * dq0
+        C[...,0,1] = - h * ( dq0 + dq1 )
+        
+        # Gravity
+        g1 = (self.m1 * self.lc1 + self.m2 * self.l1 ) * self.gravity
+        g2 = self.m2 * self.lc2 * self.gravity
+        
+        g = np.zeros( shape + ( 2 , ) )
+        
+        g[...,0] = - g1 * s1 - g2 * s12
+        g[...,1] = - g2 * s12
+        
+        # Dissipative forces
+        d = np.zeros( shape + ( 2 , ) )
+        
+        d[...,0] = self.d1 * dq0
+        d[...,1] = self.d2 * dq1
+        
+        return H , C , g , d
+        
     ###########################################################################
     # Graphical output
     ###########################################################################
@@ -0,0 +1,494 @@
+# -*- coding: utf-8 -*-
+"""
+Mechanical systems generated from a symbolic Lagrangian
+
+SymPy is only needed to derive and generate a new model, the generated
+modules are cached on disk and only use numpy.
+
+"""
+
+import os
+import keyword
+import hashlib
+import tempfile
+import importlib.util
+
+import numpy as np
+
+from pyro.dynamic import mechanical
+
+
+# Version of the generated code, part of the cache key
+CODEGEN_VERSION = 1
+
+
+###############################################################################
+# Base class of generated systems
+###############################################################################
+
+class SymbolicMechanicalSystem( mechanical.MechanicalSystem ):
+    """
+    Mechanical system with H, C, g and d generated from a Lagrangian
+    -------------------------------------------------------------------
+    Child classes are written by generate_mechanical_system and provide:
+
+    setparams       : default values of the model parameters
+    dynamics_bundle : H, C, g and d in one vectorized function
+    jacobian_terms  : dH/dq, dr/dq and dr/ddq with r = - C dq - g - d
+    actuator_matrix : constant B matrix
+
+    """
+
+    ############################
+    def __init__(self, dof ):
+        """ """
+
+        mechanical.MechanicalSystem.__init__(self, dof )
+
+        # params
+        self.setparams()
+
+        # The actuator matrix only depends on the parameters
+        self.B_is_constant = True
+
+    #############################
+    def setparams(self):
+        """ Set model parameters here """
+
+        pass
+
+    ###########################################################################
+    def H(self, q ):
+        """ Inertia matrix : dof x dof """
+
+        return self.dynamics_bundle( q , np.zeros( np.shape( q ) ) )[0]
+
+    ###########################################################################
+    def C(self, q , dq ):
+        """ Corriolis and Centrifugal Matrix : dof x dof """
+
+        return self.dynamics_bundle( q , dq )[1]
+
+    ###########################################################################
+    def B(self, q ):
+        """ Actuator Matrix  : dof x m """
+
+        return self.actuator_matrix()
+
+    ###########################################################################
+    def g(self, q ):
+        """ Gravitationnal forces vector : dof x 1 """
+
+        return self.dynamics_bundle( q , np.zeros( np.shape( q ) ) )[2]
+
+    ###########################################################################
+    def d(self, q , dq ):
+        """ State-dependent dissipative forces : dof x 1 """
+
+        return self.dynamics_bundle( q , dq )[3]
+
+    ###########################################################################
+    def f_jacobians(self, x , u , t = 0 ):
+        """
+        Jacobians of the foward dynamics dx = f(x,u,t)
+
+        INPUTS
+        x  : state vector             n   or  N x n
+        u  : control inputs vector    m   or  N x m
+
+        OUTPUTS
+        A  : df/dx                    n x n  or  N x n x n
+        B  : df/du                    n x m  or  N x n x m
+
+        With H ddq = B u + r , the derivatives of ddq are solved from
+        H dddq/dq_k = dr/dq_k - dH/dq_k ddq
+
+        """
+
+        dof = self.dof
+
+        q  = x[...,:dof]
+        dq = x[...,dof:]
+
+        shape = np.shape( q )[:-1]
+
+        H , C , g , d         = self.dynamics_bundle( q , dq )
+        dH , dr_dq , dr_ddq   = self.jacobian_terms( q , dq )
+        B                     = self.actuator_matrix()
+
+        r   = - np.einsum( '...ij,...j->...i' , C , dq ) - g - d
+        ddq = self.solve_inertia( H , np.dot( u , B.T ) + r )
+
+        M = dr_dq - np.einsum( '...ijk,...j->...ik' , dH , ddq )
+
+        A = np.zeros( shape + ( self.n , self.n ) )
+
+        A[...,:dof,dof:] = np.eye( dof )
+        A[...,dof:,:dof] = np.linalg.solve( H , M )
+        A[...,dof:,dof:] = np.linalg.solve( H , dr_ddq )
+
+        Bf = np.zeros( shape + ( self.n , self.m ) )
+
+        Bf[...,dof:,:] = np.linalg.solve( H , np.broadcast_to( B , H.shape ) )
+
+        return A , Bf
+
+
+###############################################################################
+# Model derivation
+###############################################################################
+
+def planar_chain_model( dof ):
+    """
+    Lagrangian of a planar chain of revolute links under gravity
+    ---------------------------------------------------------------------
+    link i : length l<i>, center of mass lc<i>, mass m<i>, inertia I<i>,
+             viscous friction d<i> and angle q<i> relative to the previous
+             link, all angles at zero is hanging down
+    ---------------------------------------------------------------------
+    returns L, q, dq, params, d for generate_mechanical_system
+
+    """
+
+    import sympy as sp
+
+    q  = sp.symbols( 'q1:%d'  % ( dof + 1 ) )
+    dq = sp.symbols( 'dq1:%d' % ( dof + 1 ) )
+
+    gravity = sp.Symbol( 'gravity' )
+
+    params = { gravity : 9.81 }
+    d      = []
+
+    T     = 0
+    V     = 0
+    x     = 0
+    y     = 0
+    angle = 0
+    w     = 0
+
+    for i in range( dof ):
+
+        l , lc , m , I , di = sp.symbols( 'l%d lc%d m%d I%d d%d' %
+                                          ( ( i + 1 , ) * 5 ) )
+
+        params.update( { l : 1. , lc : 1. , m : 1. , I : 1. , di : 0. } )
+
+        angle = angle + q[i]
+        w     = w + dq[i]
+
+        # Center of mass position and speed
+        xc = x + lc * sp.sin( angle )
+        yc = y - lc * sp.cos( angle )
+
+        vx = sum( sp.diff( xc , q[j] ) * dq[j] for j in range( i + 1 ) )
+        vy = sum( sp.diff( yc , q[j] ) * dq[j] for j in range( i + 1 ) )
+
+        T = T + m * ( vx**2 + vy**2 ) / 2 + I * w**2 / 2
+        V = V + m * gravity * yc
+
+        d.append( di * dq[i] )
+
+        # Next joint
+        x = x + l * sp.sin( angle )
+        y = y - l * sp.cos( angle )
+
+    return T - V , q , dq , params , d
+
+
+###############################################################################
+# Code generation
+###############################################################################
+
+def generate_mechanical_system( L , q , dq , params = None , d = None ,
+                                B = None , name = 'Symbolic Mechanical System',
+                                cache_dir = None ):
+    """
+    Generate a MechanicalSystem subclass from a SymPy Lagrangian
+    ---------------------------------------------------------------------
+    L         : Lagrangian T(q,dq) - V(q) , T quadratic in dq
+    q , dq    : dof position and velocity symbols
+    params    : { symbol : default value } of the model parameters,
+                they are attributes of the instances
+    d         : dof expressions of the dissipative forces ( default zeros )
+    B         : dof x dof actuator matrix of parameters ( default identity )
+    name      : name of the system
+    cache_dir : folder of the generated modules ( default tmp/pyro_codegen )
+    ---------------------------------------------------------------------
+    H = d2L/ddq2 , g = dV/dq and C from the Christoffel symbols of H.
+    H, C, g, d and the Jacobian terms are each written as a single
+    vectorized function after common subexpression elimination. The module
+    is saved under a hash of the model, so the derivation runs only once.
+
+    """
+
+    import sympy as sp
+
+    dof    = len( q )
+    params = {} if params is None else params
+    d      = sp.zeros( dof , 1 ) if d is None else sp.Matrix( d )
+    B      = sp.eye( dof ) if B is None else sp.Matrix( B )
+
+    # Checks
+    reserved = ( set( dir( SymbolicMechanicalSystem ) ) |
+                 set( vars( mechanical.MechanicalSystem( dof ) ) ) |
+                 { 'self' , 'numpy' , 'q' , 'dq' , 'shape' } )
+
+    for s in params:
+        if ( not s.name.isidentifier() or keyword.iskeyword( s.name ) or
+             s.name in reserved or s.name.startswith(( 'q_' , 'dq_' , 'cse_' )) ):
+            raise ValueError('not a valid parameter name: ' + s.name )
+
+    if B.shape != ( dof , dof ):
+        raise ValueError('B must be a dof x dof matrix')
+
+    if not B.free_symbols <= set( params ):
+        raise ValueError('B must only depend on the parameters')
+
+    unknown = ( ( sp.sympify( L ).free_symbols | d.free_symbols ) -
+                set( q ) - set( dq ) - set( params ) )
+
+    if unknown:
+        raise ValueError('unknown symbols: ' + str( unknown ) )
+
+    # Cache key
+    defaults = sorted( ( s.name , float( v ) ) for s , v in params.items() )
+
+    model = repr( ( CODEGEN_VERSION , sp.srepr( L ) , sp.srepr( tuple( q ) ) ,
+                    sp.srepr( tuple( dq ) ) , sp.srepr( d ) , sp.srepr( B ) ,
+                    defaults , name ) )
+
+    key = hashlib.sha1( model.encode() ).hexdigest()[:16]
+
+    if cache_dir is None:
+        cache_dir = os.path.join( tempfile.gettempdir() , 'pyro_codegen' )
+
+    path = os.path.join( cache_dir , 'pyro_mechanical_' + key + '.py' )
+
+    if not os.path.exists( path ):
+
+        source = generate_source( L , q , dq , params , d , B , name )
+
+        os.makedirs( cache_dir , exist_ok = True )
+
+        # Atomic write, other processes only see a complete module
+        tmp = path + '.' + str( os.getpid() ) + '.tmp'
+
+        with open( tmp , 'w' ) as file:
+            file.write( source )
+
+        os.replace( tmp , path )
+
+    return load_generated_system( path )
+
+
+##############################################################################
+def load_generated_system( path ):
+    """ Import a generated module and return its system class """
+
+    name = os.path.splitext( os.path.basename( path ) )[0]
+
+    spec   = importlib.util.spec_from_file_location( name , path )
+    module = importlib.util.module_from_spec( spec )
+
+    spec.loader.exec_module( module )
+
+    return module.GeneratedMechanicalSystem
+
+
+##############################################################################
+def generate_source( L , q , dq , params , d , B , name ):
+    """ Derive the model terms and return the source of the module """
+
+    import sympy as sp
+    from sympy.printing.numpy import NumPyPrinter
+
+    dof = len( q )
+
+    # Canonical symbols of the generated code
+    Q  = sp.symbols( 'q_0:%d'  % dof )
+    dQ = sp.symbols( 'dq_0:%d' % dof )
+
+    rename = dict( zip( q , Q ) )
+    rename.update( zip( dq , dQ ) )
+
+    L = sp.expand( sp.sympify( L ).xreplace( rename ) )
+    d = d.xreplace( rename )
+
+    # Inertia matrix from the kinetic energy
+    H = sp.hessian( L , dQ ).applyfunc( lambda e : sp.trigsimp( e ) )
+
+    # Conservative forces from the potential energy
+    V = - L.xreplace( { s : 0 for s in dQ } )
+    g = sp.Matrix( [ sp.trigsimp( sp.diff( V , s ) ) for s in Q ] )
+
+    # Corriolis matrix from the Christoffel symbols, d H / dt = C + C^T
+    C = sp.zeros( dof , dof )
+
+    for k in range( dof ):
+        for j in range( dof ):
+            C[k,j] = sp.simplify( sum( ( sp.diff( H[k,j] , Q[i] ) +
+                                         sp.diff( H[k,i] , Q[j] ) -
+                                         sp.diff( H[i,j] , Q[k] ) ) * dQ[i] / 2
+                                       for i in range( dof ) ) )
+
+    # Jacobian terms of r = - C dq - g - d
+    r = - C * sp.Matrix( dQ ) - g - d
+
+    dr_dq  = r.jacobian( Q )
+    dr_ddq = r.jacobian( dQ )
+
+    # dH[i,j,k] = d H[i,j] / d q[k]
+    dH = { ( i , j , k ) : sp.diff( H[i,j] , Q[k] )
+           for i in range( dof ) for j in range( dof ) for k in range( dof ) }
+
+    printer = NumPyPrinter( { 'fully_qualified_modules' : True } )
+
+    # Locals of the generated functions
+    header = [ '        shape = numpy.shape( q )[:-1]' , '' ]
+
+    for i in range( dof ):
+        header.append( '        q_%d  = q[...,%d]' % ( i , i ) )
+    for i in range( dof ):
+        header.append( '        dq_%d = dq[...,%d]' % ( i , i ) )
+
+    header.append( '' )
+
+    for s in sorted( params , key = lambda s : s.name ):
+        header.append( '        %s = self.%s' % ( s.name , s.name ) )
+
+    header.append( '' )
+
+    lines = []
+
+    ##########################
+    def function( fname , doc , arrays ):
+        """
+        Write a function computing arrays = [ ( name , shape , { index :
+        expression } ) ] with common subexpressions eliminated
+        """
+
+        items = [ ( a , index , e ) for a , shape , entries in arrays
+                                    for index , e in entries.items()
+                                    if e != 0 ]
+
+        cse , reduced = sp.cse( [ e for a , index , e in items ] ,
+                                symbols = sp.numbered_symbols( 'cse_' ) )
+
+        lines.append( '    ' + '#' * 75 )
+        lines.append( '    def %s(self, q , dq ):' % fname )
+        lines.append( '        """ %s """' % doc )
+        lines.append( '        ' )
+        lines.extend( header )
+
+        for s , e in cse:
+            lines.append( '        %s = %s' % ( s , printer.doprint( e ) ) )
+
+        lines.append( '' )
+
+        for a , shape , entries in arrays:
+            lines.append( '        %s = numpy.zeros( shape + %s )' %
+                          ( a , repr( shape ) ) )
+
+        for ( a , index , e ) , expr in zip( items , reduced ):
+            lines.append( '        %s[...,%s] = %s' %
+                          ( a , ','.join( map( str , index ) ) ,
+                            printer.doprint( expr ) ) )
+
+        lines.append( '' )
+        lines.append( '        return ' + ' , '.join( a for a , s , e in arrays ) )
+        lines.append( '    ' )
+
+    function( 'dynamics_bundle' , 'H, C, g and d for ( dof ) or ( N x dof )' ,
+              [ ( 'H' , ( dof , dof ) ,
+                  { ( i , j ) : H[i,j] for i in range( dof )
+                                       for j in range( dof ) } ) ,
+                ( 'C' , ( dof , dof ) ,
+                  { ( i , j ) : C[i,j] for i in range( dof )
+                                       for j in range( dof ) } ) ,
+                ( 'g' , ( dof , ) , { ( i , ) : g[i] for i in range( dof ) } ) ,
+                ( 'd' , ( dof , ) , { ( i , ) : d[i] for i in range( dof ) } ) ] )
+
+    function( 'jacobian_terms' , 'dH/dq, dr/dq and dr/ddq, r = - C dq - g - d' ,
+              [ ( 'dH' , ( dof , dof , dof ) , dH ) ,
+                ( 'dr_dq' , ( dof , dof ) ,
+                  { ( i , j ) : dr_dq[i,j] for i in range( dof )
+                                           for j in range( dof ) } ) ,
+                ( 'dr_ddq' , ( dof , dof ) ,
+                  { ( i , j ) : dr_ddq[i,j] for i in range( dof )
+                                            for j in range( dof ) } ) ] )
+
+    # Constant actuator matrix
+    lines.append( '    ' + '#' * 75 )
+    lines.append( '    def actuator_matrix(self):' )
+    lines.append( '        """ Actuator Matrix  : dof x m """' )
+    lines.append( '        ' )
+
+    for s in sorted( B.free_symbols , key = lambda s : s.name ):
+        lines.append( '        %s = self.%s' % ( s.name , s.name ) )
+
+    rows = [ '[ ' + ' , '.join( printer.doprint( B[i,j] )
+                                for j in range( dof ) ) + ' ]'
+             for i in range( dof ) ]
+
+    lines.append( '        return numpy.array([ %s ] , dtype = float )' %
+                  ' ,\n                              '.join( rows ) )
+
+    # Module
+    source = [ '# -*- coding: utf-8 -*-' ,
+               '"""' ,
+               'Generated by pyro.dynamic.symbolic, do not edit' ,
+               '"""' ,
+               '' ,
+               'import numpy' ,
+               '' ,
+               'from pyro.dynamic import symbolic' ,
+               '' ,
+               '' ,
+               'class GeneratedMechanicalSystem( '
+               'symbolic.SymbolicMechanicalSystem ):' ,
+               '    """ %s """' % name ,
+               '    ' ,
+               '    ' + '#' * 28 ,
+               '    def __init__(self):' ,
+               '        """ """' ,
+               '        ' ,
+               '        symbolic.SymbolicMechanicalSystem.__init__(self, %d )' % dof ,
+               '        ' ,
+               '        # Name' ,
+               '        self.name = %s' % repr( name ) ,
+               '        ' ,
+               '    ' + '#' * 29 ,
+               '    def setparams(self):' ,
+               '        """ Default model parameters """' ,
+               '        ' ]
+
+    for s , value in sorted( params.items() , key = lambda p : p[0].name ):
+        source.append( '        self.%s = %s' % ( s.name , repr( float( value ) ) ) )
+
+    source.append( '        ' )
+
+    return '\n'.join( source + lines ) + '\n'
+
+
+
+'''
+#################################################################
+##################          Main                         ########
+#################################################################
+'''
+
+
+if __name__ == "__main__":
+    """ MAIN TEST """
+
+    L , q , dq , params , d = planar_chain_model( 2 )
+
+    DoublePendulum = generate_mechanical_system( L , q , dq , params , d ,
+                                                 name = 'Double Pendulum' )
+
+    sys = DoublePendulum()
+
+    x0 = np.array([0.1,0.2,0,0])
+
+    sys.plot_trajectory( x0 )
@@ -129,6 +129,70 @@ class ContinuousDynamicSystem:
         return y
     
         
+    ###########################################################################
+    # Batch evaluations, overload with vectorized expressions when possible
+    ###########################################################################
+
+    #############################
+    def f_batch( self , X , U , t = 0 ):
+        """
+        Continuous time foward dynamics evaluation for N states at once
+
+        INPUTS
+        X  : state vectors            N x n
+        U  : control inputs vectors   N x m
+        t  : time                     1 x 1  or  N x 1
+
+        OUPUTS
+        dX : state derivative vectors N x n
+
+        Default is a loop calling f on each row, child classes should
+        overload this function with vectorized numpy expressions.
+
+        """
+
+        N  = X.shape[0]
+        T  = np.broadcast_to( t , N )
+        dX = np.zeros(( N , self.n ))
+
+        for i in range( N ):
+            dX[i,:] = self.f( X[i,:] , U[i,:] , T[i] )
+
+        return dX
+
+
+    #############################
+    def h_batch( self , X , U , t = 0 ):
+        """
+        Output fonction Y = h(X,U,t) for N states at once
+
+        INPUTS
+        X  : state vectors            N x n
+        U  : control inputs vectors   N x m
+        t  : time                     1 x 1  or  N x 1
+
+        OUTPUTS
+        Y  : output vectors           N x p
+
+        Default is a loop calling h on each row, or a copy of X when h is
+        the default output function.
+
+        """
+
+        # Default output is all states
+        if type( self ).h is ContinuousDynamicSystem.h:
+            return np.array( X , dtype = float )
+
+        N  = X.shape[0]
+        T  = np.broadcast_to( t , N )
+        Y  = np.zeros(( N , self.p ))
+
+        for i in range( N ):
+            Y[i,:] = self.h( X[i,:] , U[i,:] , T[i] )
+
+        return Y
+
+
     ###########################################################################
     # Basic domain checks, ovewload if something more complex is needed
     ###########################################################################
@@ -154,6 +218,71 @@ class ContinuousDynamicSystem:
         return not(ans)
     
     
+    #############################
+    def isavalidstate_batch(self , X ):
+        """ 
+        check if each row of X ( N x n ) is in the state domain
+        return a boolean mask N x 1
+        
+        Child classes overloading only isavalidstate are checked row by row
+        """
+        
+        if type( self ).isavalidstate is ContinuousDynamicSystem.isavalidstate:
+            
+            X = np.asarray( X )
+            
+            out = ( X < self.x_lb ) | ( X > self.x_ub )
+            
+            return ~out.any( axis = 1 )
+        
+        N   = X.shape[0]
+        ans = np.zeros( N , dtype = bool )
+        
+        for i in range( N ):
+            ans[i] = self.isavalidstate( X[i,:] )
+            
+        return ans
+    
+    
+    #############################
+    def isavalidinput_batch(self , X , U ):
+        """ 
+        check if each row of U ( N x m ) is in the control inputs domain 
+        given the row of X ( N x n ), return a boolean mask N x 1
+        
+        Child classes overloading only isavalidinput are checked row by row
+        """
+        
+        if type( self ).isavalidinput is ContinuousDynamicSystem.isavalidinput:
+            
+            U = np.asarray( U )
+            
+            out = ( U < self.u_lb ) | ( U > self.u_ub )
+            
+            return ~out.any( axis = 1 )
+        
+        N   = U.shape[0]
+        ans = np.zeros( N , dtype = bool )
+        
+        for i in range( N ):
+            ans[i] = self.isavalidinput( X[i,:] , U[i,:] )
+            
+        return ans
+    
+    
+    #############################
+    def isavalidtransition_batch(self , X0 , X1 ):
+        """ 
+        check if each transition from the row of X0 to the row of X1 
+        ( N x n ) is valid, return a boolean mask N x 1
+        
+        Default only checks the end states, overload to check the motion
+        in between ( ex: obstacles ).
+        """
+        
+        return self.isavalidstate_batch( X1 )
+    
+    
     ###########################################################################
     # Place holder graphical output, ovewload with specific graph output
     ###########################################################################
@@ -246,6 +375,28 @@ class ContinuousDynamicSystem:
             x =  x_next
         
         return x_next
+
+
+    #############################
+    def x_next_batch( self , X , U , t = 0 , dt = 0.1 , steps = 1 ):
+        """
+        Discrete time foward dynamics evaluation for N states at once
+        -------------------------------------------------------------
+        - using Euler integration
+
+        X  : state vectors            N x n
+        U  : control inputs vectors   N x m
+
+        """
+
+        X_next = X
+
+        # Multiple integration steps
+        for i in range(steps):
+
+            X_next = self.f_batch( X_next , U , t ) * dt + X_next
+
+        return X_next
     
     
     ###########################################################################
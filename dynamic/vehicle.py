@@ -84,6 +84,25 @@ class KinematicBicyleModel( system.ContinuousDynamicSystem ):
         return dx
     
     
+    #############################
+    def f_batch(self, X , U , t = 0 ):
+        """ 
+        Vectorized foward dynamics for N states at once
+        
+        X  : state vectors            N x n
+        U  : control inputs vectors   N x m
+        
+        """
+        
+        dX = np.zeros(( X.shape[0] , self.n ))
+        
+        dX[:,0] = U[:,0] * np.cos( X[:,2] )
+        dX[:,1] = U[:,0] * np.sin( X[:,2] )
+        dX[:,2] = U[:,0] * np.tan( U[:,1] ) * ( 1. / self.lenght) 
+        
+        return dX
+    
+    
     ###########################################################################
     # For graphical output
     ###########################################################################
@@ -244,6 +263,24 @@ class HolonomicMobileRobot( system.ContinuousDynamicSystem ):
         return dx
     
     
+    #############################
+    def f_batch(self, X , U , t = 0 ):
+        """ 
+        Vectorized foward dynamics for N states at once
+        
+        X  : state vectors            N x n
+        U  : control inputs vectors   N x m
+        
+        """
+        
+        dX = np.zeros(( X.shape[0] , self.n ))
+        
+        dX[:,0] = U[:,0]
+        dX[:,1] = U[:,1]
+        
+        return dX
+    
+    
     ###########################################################################
     # For graphical output
     ###########################################################################
@@ -306,6 +343,174 @@ class HolonomicMobileRobot( system.ContinuousDynamicSystem ):
         return lines_pts
 
 
+##############################################################################
+        
+class ObstacleMap:
+    """ 
+    Axis-aligned box obstacles in the plane stored as arrays
+    ----------------------------------------------------------
+    boxes : list of [ ( x_min , y_min ) , ( x_max , y_max ) ]
+    
+    A point is on an obstacle if it is strictly inside a box. All queries 
+    take N points ( N x 2 ) at once. An occupancy bitmap and a signed 
+    distance field sampled on a grid can optionally be computed with 
+    rasterize() for constant-time queries when there are many boxes.
+    
+    """
+    
+    ############################
+    def __init__(self, boxes = None ):
+        
+        self.boxes = [] if boxes is None else list( boxes )
+        
+        b = np.array( self.boxes , dtype = float ).reshape( -1 , 2 , 2 )
+        
+        self.lb = b[:,0,:]  # lower corners  k x 2
+        self.ub = b[:,1,:]  # upper corners  k x 2
+        
+        # Optional grid
+        self.bitmap = None
+        self.sdf    = None
+        
+        
+    ############################
+    def is_free(self, X ):
+        """ check if each point of X ( N x 2 ) is outside all boxes """
+        
+        X = np.asarray( X , dtype = float )[:,0:2]
+        
+        if self.bitmap is not None:
+            
+            i , j , inside = self.grid_index( X )
+            
+            free = np.ones( X.shape[0] , dtype = bool )
+            
+            free[ inside ] = ~self.bitmap[ i[ inside ] , j[ inside ] ]
+            
+            # Points outside of the grid
+            if not inside.all():
+                free[ ~inside ] = self.is_free_boxes( X[ ~inside ] )
+                
+            return free
+        
+        return self.is_free_boxes( X )
+    
+    
+    ############################
+    def is_free_boxes(self, X ):
+        """ exact check of each point of X ( N x 2 ) against all boxes """
+        
+        P = X[ : , None , : ]  # N x 1 x 2
+        
+        on_obs = ( ( P > self.lb ) & ( P < self.ub ) ).all( axis = 2 )
+        
+        return ~on_obs.any( axis = 1 )
+    
+    
+    ############################
+    def segment_is_free(self, X0 , X1 ):
+        """ 
+        check if each segment from X0 to X1 ( N x 2 ) does not cross a box
+        ( slab method, vectorized over segments and boxes )
+        """
+        
+        P0 = np.asarray( X0 , dtype = float )[ : , None , 0:2 ]  # N x 1 x 2
+        D  = np.asarray( X1 , dtype = float )[ : , None , 0:2 ] - P0
+        
+        with np.errstate( divide = 'ignore' , invalid = 'ignore' ):
+            s1 = ( self.lb - P0 ) / D
+            s2 = ( self.ub - P0 ) / D
+        
+        s_in  = np.minimum( s1 , s2 )
+        s_out = np.maximum( s1 , s2 )
+        
+        # Segment parallel to a slab: inside the slab for all s or never
+        parallel = ( D == 0 )
+        in_slab  = ( P0 > self.lb ) & ( P0 < self.ub )
+        
+        s_in  = np.where( parallel , np.where( in_slab , -np.inf , np.inf ) , s_in )
+        s_out = np.where( parallel , np.where( in_slab , np.inf , -np.inf ) , s_out )
+        
+        s_enter = np.maximum( s_in.max( axis = 2 ) , 0 )
+        s_exit  = np.minimum( s_out.min( axis = 2 ) , 1 )
+        
+        crossing = s_enter < s_exit
+        
+        return ~crossing.any( axis = 1 )
+    
+    
+    ############################
+    def signed_distance(self, X ):
+        """ 
+        Distance of each point of X ( N x 2 ) to the closest box, 
+        negative inside a box
+        """
+        
+        X = np.asarray( X , dtype = float )[:,0:2]
+        
+        if self.sdf is not None:
+            
+            i , j , inside = self.grid_index( X )
+            
+            if inside.all():
+                return self.sdf[ i , j ]
+            
+        if self.lb.shape[0] == 0:
+            return np.full( X.shape[0] , np.inf )
+        
+        P = X[ : , None , : ]
+        
+        d = np.maximum( self.lb - P , P - self.ub )  # N x k x 2
+        
+        outside = np.linalg.norm( np.maximum( d , 0 ) , axis = 2 )
+        inside  = np.minimum( d.max( axis = 2 ) , 0 )
+        
+        return ( outside + inside ).min( axis = 1 )
+    
+    
+    ############################
+    def rasterize(self, x_lb , x_ub , resolution = 0.05 ):
+        """ 
+        Compute the occupancy bitmap and signed distance field grids,
+        queries are then approximated at the grid resolution
+        """
+        
+        self.grid_lb         = np.asarray( x_lb , dtype = float )[0:2]
+        self.grid_resolution = resolution
+        
+        shape = np.ceil( ( np.asarray( x_ub , dtype = float )[0:2] - 
+                           self.grid_lb ) / resolution ).astype( int )
+        
+        # Cell centers
+        xs = self.grid_lb[0] + ( np.arange( shape[0] ) + 0.5 ) * resolution
+        ys = self.grid_lb[1] + ( np.arange( shape[1] ) + 0.5 ) * resolution
+        
+        X = np.stack( np.meshgrid( xs , ys , indexing = 'ij' ) , axis = -1 )
+        X = X.reshape( -1 , 2 )
+        
+        self.bitmap = None
+        self.sdf    = None
+        
+        sdf    = self.signed_distance( X ).reshape( shape )
+        bitmap = ~self.is_free_boxes( X ).reshape( shape )
+        
+        self.sdf    = sdf
+        self.bitmap = bitmap
+        
+        
+    ############################
+    def grid_index(self, X ):
+        """ Return the grid cell i , j of each point and if it is in the grid """
+        
+        ij = np.floor( ( X - self.grid_lb ) / self.grid_resolution ).astype( int )
+        
+        inside = ( ( ij >= 0 ) & ( ij < self.bitmap.shape ) ).all( axis = 1 )
+        
+        ij = np.clip( ij , 0 , np.array( self.bitmap.shape ) - 1 )
+        
+        return ij[:,0] , ij[:,1] , inside
+    
+    
 ##############################################################################
         
 class HolonomicMobileRobotwithObstacles( HolonomicMobileRobot ):
@@ -335,25 +540,54 @@ class HolonomicMobileRobotwithObstacles( HolonomicMobileRobot ):
                 [ (-8,-8),(-1,8)]
                 ]
         
+        self.obstacle_map = ObstacleMap( self.obstacles )
+        
+    #############################
+    def update_obstacle_map(self, force = False ):
+        """ 
+        Return the obstacle map, rebuilt if the boxes of the obstacles list
+        differ from the map ( list reassigned, resized or box edited in 
+        place ) or if force is True
+        """
+        
+        b   = np.array( self.obstacles , dtype = float ).reshape( -1 , 2 , 2 )
+        obs = self.obstacle_map
+        
+        if ( force or b.shape[0] != obs.lb.shape[0] or 
+             not( np.array_equal( b[:,0,:] , obs.lb ) and 
+                  np.array_equal( b[:,1,:] , obs.ub ) ) ):
+            self.obstacle_map = ObstacleMap( self.obstacles )
+            
+        return self.obstacle_map
+    
+        
     #############################
     def isavalidstate(self , x ):
         """ check if x is in the state domain """
         
-        ans = False
+        return self.isavalidstate_batch( np.asarray( x )[ None , : ] )[0]
         
-        for i in range(self.n):
-            ans = ans or ( x[i] < self.x_lb[i] )
-            ans = ans or ( x[i] > self.x_ub[i] )
         
-        for obs in self.obstacles:
-            on_obs = (( x[0] > obs[0][0]) and  
-                      ( x[1] > obs[0][1]) and 
-                      ( x[0] < obs[1][0]) and 
-                      ( x[1] < obs[1][1]) )
+    #############################
+    def isavalidstate_batch(self , X ):
+        """ check if each row of X ( N x n ) is in the state domain """
                      
-            ans = ans or on_obs
+        X = np.asarray( X , dtype = float )
             
-        return not(ans)
+        in_bounds = ( ( X >= self.x_lb ) & ( X <= self.x_ub ) ).all( axis = 1 )
+        
+        return in_bounds & self.update_obstacle_map().is_free( X )
+    
+    
+    #############################
+    def isavalidtransition_batch(self , X0 , X1 ):
+        """ 
+        check the end states X1 ( N x n ) and the straight line motions
+        from X0 to X1, so fast motions cannot tunnel through obstacles
+        """
+        
+        return ( self.isavalidstate_batch( X1 ) & 
+                 self.update_obstacle_map().segment_is_free( X0 , X1 ) )
         
        
     ###########################################################################
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel parking planned with independently seeded RRT trees grown in a
+pool of worker processes
+
+"""
+###############################################################################
+import numpy as np
+###############################################################################
+from pyro.dynamic import vehicle
+from pyro.planning import randomtree
+###############################################################################
+
+if __name__ == "__main__":
+
+    sys  = vehicle.KinematicBicyleModel()
+    
+    ###########################################################################
+    
+    x_start = np.array([0,0,0])
+    x_goal  = np.array([0,1,0])
+    
+    planner = randomtree.RRT( sys , x_start )
+    
+    speed    = 2
+    steering = 0.2
+    
+    planner.u_options = [
+            np.array([ speed,-steering]),
+            np.array([ speed,+steering]),
+            np.array([ speed,0]),
+            np.array([-speed,+steering]),
+            np.array([-speed,0]),
+            np.array([-speed,-steering])
+            ]
+    
+    planner.goal_radius       = 0.3
+    planner.dt                = 0.1
+    planner.steps             = 3
+    planner.max_solution_time = 8.0
+    
+    # Trees grown in parallel
+    parallel_planner = randomtree.ParallelRRT( planner )
+    
+    parallel_planner.trees_n     = 8
+    parallel_planner.time_budget = 60.0
+    parallel_planner.mode        = 'first'
+    
+    parallel_planner.find_path_to_goal( x_goal )
+    
+    parallel_planner.plot_open_loop_solution()
+    
+    ###########################################################################
+    
+    sys.dynamic_domain = False
+    sys.animate_simulation()
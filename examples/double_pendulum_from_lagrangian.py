@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Double pendulum generated from its symbolic Lagrangian ( requires sympy )
+
+"""
+###############################################################################
+import numpy as np
+###############################################################################
+from pyro.dynamic  import symbolic
+###############################################################################
+
+# Lagrangian of a planar chain of two links
+L , q , dq , params , d = symbolic.planar_chain_model( 2 )
+
+# Generated model, cached on disk after the first run
+DoublePendulum = symbolic.generate_mechanical_system( L , q , dq , params , d ,
+                                                     name = 'Double Pendulum' )
+
+sys = DoublePendulum()
+
+sys.d1 = 0.5
+sys.d2 = 0.5
+
+# Linearization at the downward equilibrium
+A , B = sys.f_jacobians( np.zeros( sys.n ) , np.zeros( sys.m ) )
+
+print('A =\n', A )
+print('B =\n', B )
+
+# Simulation
+x0 = np.array([0.5,0.5,0,0])
+
+sys.plot_trajectory( x0 )
+sys.sim.plot('xu')
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the parallel value iteration on a 4-D grid
+
+"""
+
+import time
+import multiprocessing
+
+import numpy as np
+
+from pyro.dynamic  import pendulum
+from pyro.planning import discretizer
+from pyro.analysis import costfunction
+from pyro.planning import valueiteration
+
+
+if __name__ == "__main__":
+    
+    sys  = pendulum.DoublePendulum()
+    
+    # Discrete world 
+    grid_sys = discretizer.GridDynamicSystem( sys , (21,21,21,21) , (5,5) )
+    
+    # Cost Function
+    cf = costfunction.QuadraticCostFunction( sys )
+    
+    cf.INF  = 10000
+    
+    steps = 50
+    
+    # Serial engine
+    vi = valueiteration.ValueIteration_ND( grid_sys , cf )
+    
+    vi.initialize()
+    vi.compute_transitions()
+    
+    t0 = time.time()
+    for i in range( steps ):
+        vi.compute_step_jacobi()
+    t_serial = time.time() - t0
+    
+    print('Serial :', steps ,'sweeps in', t_serial , 'sec')
+    
+    # Parallel engine
+    workers_n = multiprocessing.cpu_count()
+    
+    for workers in sorted( set([ 1 , 2 , 4 , workers_n ]) ):
+        
+        vi_p = valueiteration.ValueIteration_ND_Parallel( grid_sys , cf , workers )
+        
+        vi_p.initialize()
+        vi_p.compute_transitions()
+        vi_p.start_pool()
+        
+        t0 = time.time()
+        for i in range( steps ):
+            vi_p.compute_step_jacobi()
+        t_parallel = time.time() - t0
+        
+        vi_p.close_pool()
+        
+        print('Workers:', workers , ':', steps ,'sweeps in', t_parallel , 
+              'sec, speedup =', t_serial / t_parallel , 
+              ', max diff with serial =', np.abs( vi_p.J - vi.J ).max() )
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Anytime RRT* improving the swing-up trajectory within a time budget
+
+"""
+
+import numpy as np
+
+from pyro.dynamic  import pendulum
+from pyro.planning import randomtree
+from pyro.analysis import costfunction
+
+# Dynamic sysem
+sys  = pendulum.SinglePendulum()
+
+# Define planning problem
+x_start = np.array([0.1,0])
+x_goal  = np.array([-3.14,0])
+
+# Cost Function
+cf = costfunction.QuadraticCostFunction( sys )
+
+cf.ontarget_check = False
+
+planner = randomtree.RRTStar( sys , x_start , cf )
+
+planner.u_options = [
+            np.array([-5]),
+            np.array([-3]),
+            np.array([-1]),
+            np.array([ 0]),
+            np.array([ 1]),
+            np.array([ 3]),
+            np.array([ 5])
+            ]
+
+planner.goal_radius     = 0.2
+planner.rewire_radius   = 0.5
+planner.steer_tolerance = 0.1
+
+# Solve Planning Problem ( the first solution can take a few seconds )
+if planner.find_path_to_goal( x_goal , time_budget = 20.0 ):
+
+    # Print solution
+    planner.plot_cost_history()
+    planner.plot_tree()
+    planner.plot_open_loop_solution()
+    sys.animate_simulation()
@@ -5,7 +5,76 @@ Created on Wed Jul 12 10:02:12 2017
 @author: alxgr
 """
 
+import os
+import types
+import hashlib
+
 import numpy as np
+from scipy import sparse
+
+'''
+################################################################################
+'''
+
+
+##############################
+def update_hash( key , value , seen ):
+    """
+    Add value to the hashlib object key
+    ----------------------------------------
+    Containers and objects are hashed recursively with their attributes,
+    seen is a dict of the objects already hashed by id ( reference cycles ),
+    it keeps them alive so their id is not reused
+    
+    return False if value can't be hashed ( ex: functions )
+    
+    """
+    
+    if isinstance( value , type ):
+        key.update( ( value.__module__ + '.' + value.__qualname__ ).encode() )
+        return True
+    
+    if value is None or isinstance( value , ( bool , int , float , complex ,
+                                              str , bytes , np.generic ) ):
+        key.update( repr( value ).encode() )
+        return True
+    
+    if isinstance( value , np.ndarray ) and not value.dtype.hasobject:
+        key.update( repr( ( value.dtype.str , value.shape ) ).encode() )
+        key.update( np.ascontiguousarray( value ).tobytes() )
+        return True
+    
+    if isinstance( value , ( types.FunctionType , types.MethodType ,
+                             types.BuiltinFunctionType , types.ModuleType ) ):
+        return False
+    
+    if id( value ) in seen:
+        key.update( b'<seen>' )
+        return True
+    
+    seen[ id( value ) ] = value
+    
+    key.update( type( value ).__name__.encode() )
+    
+    if isinstance( value , np.ndarray ):
+        key.update( repr( value.shape ).encode() )
+        value = list( value.flat )
+    
+    if isinstance( value , ( set , frozenset ) ):
+        value = sorted( value , key = repr )
+    
+    if isinstance( value , dict ):
+        value = [ ( repr( k ) , value[ k ] ) for k in sorted( value , key = repr ) ]
+    
+    if isinstance( value , ( list , tuple ) ):
+        return all( update_hash( key , item , seen ) for item in value )
+    
+    if hasattr( value , '__dict__' ):
+        return ( update_hash( key , type( value ) , seen ) and
+                 update_hash( key , vars( value ) , seen ) )
+    
+    return False
+
 
 '''
 ################################################################################
@@ -13,10 +82,28 @@ import numpy as np
 
 
 class GridDynamicSystem:
-    """ Create a discrete gird state-action space for a 2D continous dynamic system, one continuous input u """
+    """ 
+    Create a discrete gird state-action space for a continous dynamic system
+    ---------------------------------------------------------------------------
+    sys        : ContinuousDynamicSystem of any state and input dimensions
+    xgriddim   : number of discrete values for each state
+    ugriddim   : number of discrete values for each input
+    dt         : time discretization
+    uselookuptable : compute the x_next and action_isok transition tables
+    max_memory : memory budget [bytes] of each chunk of the lookup table 
+                 computation
+    lookup_dir   : if not None, directory of np.memmap files backing the 
+                   lookup table, reused when the system parameters, grid 
+                   dimensions and dt are the same ( not used if a parameter
+                   of the system can't be hashed, ex: a function )
+    lookup_dtype : dtype of the x_next lookup table ( float or np.float32 )
+    
+    """
     
     ############################
-    def __init__(self, sys , xgriddim = ( 101 , 101 ), ugriddim = ( 11 , 1 ) , dt = 0.05 ):
+    def __init__(self, sys , xgriddim = ( 101 , 101 ), ugriddim = ( 11 , 1 ) , 
+                 dt = 0.05 , uselookuptable = True , max_memory = 1E8 ,
+                 lookup_dir = None , lookup_dtype = float ):
         
         self.sys = sys # Dynamic system class
         
@@ -30,7 +117,15 @@ class GridDynamicSystem:
         self.ugriddim = ugriddim
         
         # Options
-        self.uselookuptable = True
+        self.uselookuptable = uselookuptable
+        self.max_memory     = max_memory
+        self.lookup_dir     = lookup_dir
+        self.lookup_dtype   = lookup_dtype
+        
+        # System attributes not changing the transitions: simulation and
+        # plotting results, caches filled at the first dynamics evaluation
+        self.lookup_ignored = [ 'sim' , 'pp' , 'ani' , 'B_is_constant' ,
+                                'B_constant' , 'B_inv' , 'B_is_identity' ]
         
         self.compute()  
         
@@ -60,18 +155,11 @@ class GridDynamicSystem:
         self.xd       = []
         self.nodes_n  = 1
         
-        # n-D grid
-        self.x_grid2node    = np.zeros( self.xgriddim , dtype = int )     # grid of corresponding index
-        
         # linespace for each x-axis and total number of nodes
         for i in range(self.sys.n):
             self.xd.append(  np.linspace( self.sys.x_lb[i]  , self.sys.x_ub[i]  , self.xgriddim[i]  ) )
             self.nodes_n        = self.nodes_n * self.xgriddim[i]
         
-        # 1-D List of nodes
-        self.nodes_state    = np.zeros(( self.nodes_n , self.sys.n ), dtype = float )  # Number of nodes x state dimensions
-        self.nodes_index    = np.zeros(( self.nodes_n , self.sys.n ), dtype = int   )  # Number of nodes x state dimensions
-        
         
     #############################
     def discretizeactions(self):
@@ -85,100 +173,46 @@ class GridDynamicSystem:
             self.ud.append(  np.linspace( self.sys.u_lb[i]  , self.sys.u_ub[i]  , self.ugriddim[i]  ) )
             self.actions_n       = self.actions_n * self.ugriddim[i]
         
-        # 1-D List of actions
-        self.actions_input     =   np.zeros(( self.actions_n , self.sys.m ), dtype = float )  # Number of actions x inputs dimensions
-        self.actions_index     =   np.zeros(( self.actions_n , self.sys.m ), dtype = int   )  # Number of actions x inputs dimensions
-        
         
     ##############################
     def generate_nodes(self):
         """ Compute 1-D list of nodes """
         
-        # For all state nodes
-        node = 0
+        dims = tuple( self.xgriddim[ : self.sys.n ] )
         
-        if self.sys.n == 2 :
+        # Node # based on grid index, in row-major order of the grid
+        self.x_grid2node = np.arange( self.nodes_n ).reshape( dims )
             
-            for i in range(self.xgriddim[0]):
-                for j in range(self.xgriddim[1]):
-                    
-                    # State
-                    x = np.array([ self.xd[0][i]  ,  self.xd[1][j] ])
+        # Grid index based on node #, number of nodes x state dimensions
+        self.nodes_index = np.array( np.unravel_index( 
+                                        np.arange( self.nodes_n ) , dims ) ).T
                     
-                    # State and grid index based on node #
-                    self.nodes_state[node,:] = x
-                    self.nodes_index[node,:] = np.array([i,j])
+        # State based on node #, number of nodes x state dimensions
+        grids = np.meshgrid( *self.xd , indexing = 'ij' )
                     
-                    # Node # based on index ij
-                    self.x_grid2node[i,j]    = node
-    
-                    # Increment node number
-                    node = node + 1
+        self.nodes_state = np.zeros(( self.nodes_n , self.sys.n ), dtype = float )
                     
-                    
-        elif self.sys.n == 3:
-            
-            for i in range(self.xgriddim[0]):
-                for j in range(self.xgriddim[1]):
-                    for k in range(self.xgriddim[2]):
-                    
-                        # State
-                        x = np.array([ self.xd[0][i]  ,  self.xd[1][j]  , self.xd[2][k] ])
-                        
-                        # State and grid index based on node #
-                        self.nodes_state[node,:] = x
-                        self.nodes_index[node,:] = np.array([i,j,k])
-                        
-                        # Node # based on index ijk
-                        self.x_grid2node[i,j,k]    = node
-        
-                        # Increment node number
-                        node = node + 1
-                    
-        else:
-            
-            raise NotImplementedError
+        for i in range( self.sys.n ):
+            self.nodes_state[:,i] = grids[i].reshape( self.nodes_n )
             
                 
     ##############################
     def generate_actions(self):
         """ Compute 1-D list of actions """
         
-        # For all state nodes
-        action = 0
+        dims = tuple( self.ugriddim[ : self.sys.m ] )
         
-        # Single input
+        # Grid index based on action #, number of actions x inputs dimensions
+        self.actions_index = np.array( np.unravel_index( 
+                                        np.arange( self.actions_n ) , dims ) ).T
         
-        if self.sys.m == 1 :
+        # Input based on action #, number of actions x inputs dimensions
+        grids = np.meshgrid( *self.ud , indexing = 'ij' )
         
-            for k in range(self.ugriddim[0]):
+        self.actions_input = np.zeros(( self.actions_n , self.sys.m ), dtype = float )
                     
-                u = np.array([ self.ud[0][k] ])
-                
-                # State and grid index based on node #
-                self.actions_input[action,:] = u
-                self.actions_index[action,:] = k
-    
-                # Increment node number
-                action = action + 1
-                
-        elif self.sys.m == 2 :
-            
-            for k in range(self.ugriddim[0]):
-                for l in range(self.ugriddim[1]):
-                    
-                    u = np.array([ self.ud[0][k] , self.ud[1][l] ])
-                    
-                    # State and grid index based on node #
-                    self.actions_input[action,:] = u
-                    self.actions_index[action,:] = np.array([k,l])
-        
-                    # Increment node number
-                    action = action + 1
-        
-        else:
-            
-            raise NotImplementedError
+        for i in range( self.sys.m ):
+            self.actions_input[:,i] = grids[i].reshape( self.actions_n )
             
             
     ##############################
@@ -186,142 +220,296 @@ class GridDynamicSystem:
         """ Compute lookup table for faster evaluation """
 
         if self.uselookuptable:
-            # Evaluation lookup tables      
-            self.action_isok   = np.zeros( ( self.nodes_n , self.actions_n ) , dtype = bool )
-            self.x_next        = np.zeros( ( self.nodes_n , self.actions_n , self.sys.n ) , dtype = float ) # lookup table for dynamic
             
-            # For all state nodes        
-            for node in range( self.nodes_n ):  
+            key = None
+            
+            if self.lookup_dir is not None:
+            
+                key = self.lookuptable_key()
                 
-                    x = self.nodes_state[ node , : ]
+                if key is None:
+                    print('Lookup table not cached: a parameter of the system can\'t be hashed')
+            
+            if key is None:
+                # Evaluation lookup tables      
+                self.action_isok   = np.zeros( ( self.nodes_n , self.actions_n ) , dtype = bool )
+                self.x_next        = np.zeros( ( self.nodes_n , self.actions_n , self.sys.n ) , dtype = self.lookup_dtype ) # lookup table for dynamic
                 
-                    # For all control actions
-                    for action in range( self.actions_n ):
-                        
-                        u = self.actions_input[ action , : ]
-                        
-                        # Compute next state for all inputs
-                        x_next = self.sys.f( x , u ) * self.dt + x
-                        
-                        # validity of the options
-                        x_ok = self.sys.isavalidstate(x_next)
-                        u_ok = self.sys.isavalidinput(x,u)
+                nodes_done = 0
+                
+            else:
+                # Memory-mapped lookup tables, possibly partially computed
+                nodes_done = self.open_lookuptable_files( key )
+            
+            chunk_nodes = self.compute_chunk_size()
+                
+            for start in range( nodes_done , self.nodes_n , chunk_nodes ):
+                
+                stop = min( start + chunk_nodes , self.nodes_n )
                         
-                        self.x_next[ node,  action, : ] = x_next
-                        self.action_isok[ node, action]        = ( u_ok & x_ok )
+                self.compute_lookuptable_chunk( start , stop )
                 
+                if key is not None:
+                    # Save progress to resume after a restart
+                    self.x_next.flush()
+                    self.action_isok.flush()
+                    np.save( self.lookup_files[2] , stop )
+                    
+            if ( key is not None ) and ( nodes_done < self.nodes_n ):
+                # Completed tables are shared read-only
+                self.open_lookuptable_files( key )
+                    
                 
+    ##############################
+    def lookuptable_key(self):
+        """
+        Hash of the system parameters, grid dimensions and dt
+        -------------------------------------------------------
+        Nested objects ( ex: cost functions, obstacle maps ) are hashed with
+        their attributes, return None if a parameter can't be hashed
+        
+        """
+        
+        key = hashlib.sha1()
+        
+        key.update( repr( ( tuple( self.xgriddim[ : self.sys.n ] ) , 
+                            tuple( self.ugriddim[ : self.sys.m ] ) , 
+                            float( self.dt ) , 
+                            np.dtype( self.lookup_dtype ).str ) ).encode() )
+        
+        params = { name : value for name , value in vars( self.sys ).items()
+                   if name not in self.lookup_ignored }
+        
+        seen = { id( self.sys ) : self.sys }
+            
+        if not ( update_hash( key , type( self.sys ) , seen ) and
+                 update_hash( key , params , seen ) ):
+            return None
                 
-'''
-################################################################################
-'''
-
-
-class GridDynamicSystem3D(GridDynamicSystem):
-    """ Create a discrete gird state-action space for 3D continous dynamic system, two continuous input u """
+        return key.hexdigest()[:16]
     
-    ############################
-    def __init__(self, sys , dt = 0.05 , x_n = 21 ,  u_n = 11 ):
+    
+    ##############################
+    def open_lookuptable_files(self, key ):
+        """ 
+        Open or create the memory-mapped lookup table files of hash key
+        ------------------------------------------------------
+        return the number of nodes already computed
         
-        self.sys = sys # Dynamic system class
+        """
         
-        # Discretization Parameters
+        if not os.path.exists( self.lookup_dir ):
+            os.makedirs( self.lookup_dir )
         
-        # Simple 1-DoF
-        self.dt    = dt        # time discretization
-        self.x0_n  = x_n       # x discretizatio
-        self.x1_n  = x_n       # dx discretization
-        self.x2_n  = x_n       # dx discretization
-        self.u0_n  = u_n      # u0 discretization
-        self.u1_n  = u_n
+        base = os.path.join( self.lookup_dir , type( self.sys ).__name__ + 
+                             '_' + key )
         
-        # Options
-        self.uselookuptable = False # Too Big
+        self.lookup_files = [ base + '_x_next.npy' , 
+                              base + '_action_isok.npy' , 
+                              base + '_progress.npy' ]
         
-        self.compute()  
+        x_shape    = ( self.nodes_n , self.actions_n , self.sys.n )
+        isok_shape = ( self.nodes_n , self.actions_n )
+        
+        try:
+            
+            nodes_done = int( np.load( self.lookup_files[2] ) )
+            
+            mode = 'r' if nodes_done == self.nodes_n else 'r+'
+            
+            self.x_next      = np.load( self.lookup_files[0] , mmap_mode = mode )
+            self.action_isok = np.load( self.lookup_files[1] , mmap_mode = mode )
+            
+            if not ( ( self.x_next.shape == x_shape ) and 
+                     ( self.action_isok.shape == isok_shape ) and
+                     ( self.x_next.dtype == np.dtype( self.lookup_dtype ) ) ):
+                raise ValueError('Lookup table files do not match the grid')
+                
+        except ( IOError , ValueError ):
             
+            nodes_done = 0
+            
+            self.x_next      = np.lib.format.open_memmap( 
+                    self.lookup_files[0] , 'w+' , self.lookup_dtype , x_shape )
+            self.action_isok = np.lib.format.open_memmap( 
+                    self.lookup_files[1] , 'w+' , bool , isok_shape )
+            
+            np.save( self.lookup_files[2] , nodes_done )
+            
+        return nodes_done
+                        
+                        
+    ##############################
+    def compute_chunk_size(self):
+        """ Number of nodes per chunk fitting in the memory budget """
         
-    #############################
-    def discretizespace(self):
-        """ Grid the state space """
+        pair_bytes  = 8 * ( 4 * self.sys.n + 2 * self.sys.m + 2 ** self.sys.n ) + 1
+        chunk_nodes = int( self.max_memory / ( pair_bytes * self.actions_n ) )
         
-        # Grid
-        self.xgriddim = ( self.x0_n , self.x1_n , self.x2_n )
-                
-        self.xd       = [ None , None , None ]
-        self.xd[0]    = np.linspace( self.sys.x_lb[0]  , self.sys.x_ub[0]  , self.x0_n  )
-        self.xd[1]    = np.linspace( self.sys.x_lb[1]  , self.sys.x_ub[1]  , self.x1_n  )
-        self.xd[2]    = np.linspace( self.sys.x_lb[2]  , self.sys.x_ub[2]  , self.x2_n  )
+        return max( 1 , chunk_nodes )
+    
+    
+    ##############################
+    def compute_transitions_chunk(self, start , stop ):
+        """ Next states and validity of all actions for nodes # start to stop """
+                        
+        n = stop - start
         
-        self.x_grid2node    = np.zeros( ( self.x0_n , self.x1_n , self.x2_n ) , dtype = int )     # grid of corresponding index
+        # All node-action pairs of the chunk, node major
+        X = np.repeat( self.nodes_state[ start : stop , : ] , self.actions_n , axis = 0 )
+        U = np.tile( self.actions_input , ( n , 1 ) )
         
-        # 1-D List of nodes
-        self.nodes_n        = self.x0_n * self.x1_n * self.x2_n
-        self.nodes_state    = np.zeros(( self.nodes_n , self.sys.n ), dtype = float )  # Number of nodes x state dimensions
-        self.nodes_index    = np.zeros(( self.nodes_n , self.sys.n ), dtype = int   )  # Number of nodes x state dimensions
+        # Compute next state for all inputs
+        X_next = self.sys.x_next_batch( X , U , 0 , self.dt )
         
+        # validity of the options
+        isok = ( self.sys.isavalidstate_batch( X_next ) & 
+                 self.sys.isavalidinput_batch( X , U ) )
+        
+        return X_next , isok
         
-    #############################
-    def discretizeactions(self):
-        """ Grid the action space """
         
-        # Grid
-        self.ugriddim = ( self.u0_n , self.u1_n )
+    ##############################
+    def compute_lookuptable_chunk(self, start , stop ):
+        """ Compute lookup table for nodes # start to stop """
         
-        self.ud       = [ None , None ]        
-        self.ud[0]    = np.linspace( self.sys.u_lb[0]  , self.sys.u_ub[0]  , self.u0_n  )
-        self.ud[1]    = np.linspace( self.sys.u_lb[1]  , self.sys.u_ub[1]  , self.u1_n  )
+        n = stop - start
         
-        # 1-D List of actions
-        self.actions_n         =   self.u0_n * self.u1_n
-        self.actions_input     =   np.zeros(( self.actions_n , self.sys.m ), dtype = float )  # Number of actions x inputs dimensions
-        self.actions_index     =   np.zeros(( self.actions_n , self.sys.m ), dtype = int   )  # Number of actions x inputs dimensions
+        X_next , isok = self.compute_transitions_chunk( start , stop )
+        
+        self.x_next[ start : stop , : , : ] = X_next.reshape( n , self.actions_n , self.sys.n )
+        self.action_isok[ start : stop , : ] = isok.reshape( n , self.actions_n )
         
         
     ##############################
-    def generate_nodes(self):
-        """ Compute 1-D list of nodes """
+    def compute_interpolation_weights(self, X ):
+        """ 
+        Multi-linear interpolation of states X on the grid
+        ------------------------------------------------
+        X      : ( N , n ) states
+        index  : ( N , 2^n ) nodes # of the corners of the grid cells
+        weight : ( N , 2^n ) weights of the corners
+        
+        """
+        
+        n = self.sys.n
+        N = X.shape[0]
         
-        # For all state nodes
-        node = 0
+        # Lower corner index and fraction along each axis
+        i0 = np.zeros( ( N , n ) , dtype = int   )
+        w1 = np.zeros( ( N , n ) , dtype = float )
         
-        for i in range(self.x0_n):
-            for j in range(self.x1_n):
-                for k in range(self.x2_n):
+        for d in range( n ):
+            
+            xd = self.xd[d]
+            
+            if xd.size > 1 :
                 
-                    # State
-                    x = np.array([ self.xd[0][i]  ,  self.xd[1][j]  , self.xd[2][k] ])
-                    
-                    # State and grid index based on node #
-                    self.nodes_state[node,:] = x
-                    self.nodes_index[node,:] = np.array([i,j,k])
-                    
-                    # Node # based on index ijk
-                    self.x_grid2node[i,j,k]    = node
-    
-                    # Increment node number
-                    node = node + 1
+                i = np.searchsorted( xd , X[:,d] , side = 'right' ) - 1
+                i = np.clip( i , 0 , xd.size - 2 )
                 
+                w = ( X[:,d] - xd[i] ) / ( xd[i+1] - xd[i] )
                 
+                i0[:,d] = i
+                w1[:,d] = np.clip( w , 0 , 1 )
+        
+        # All 2^n corners of the grid cells
+        corners = 2 ** n
+        
+        index  = np.zeros( ( N , corners ) , dtype = np.int32 )
+        weight = np.ones(  ( N , corners ) , dtype = float    )
+        
+        griddim = np.array( self.xgriddim[ : n ] )
+        
+        for c in range( corners ):
+            
+            bits = np.array( [ ( c >> d ) & 1 for d in range( n ) ] )
+            
+            corner = np.minimum( i0 + bits , griddim - 1 )
+            
+            index[:,c] = np.ravel_multi_index( corner.T , griddim )
+            
+            for d in range( n ):
+                if bits[d]:
+                    weight[:,c] *= w1[:,d]
+                else:
+                    weight[:,c] *= 1 - w1[:,d]
+                    
+        return index , weight
+    
+    
     ##############################
-    def generate_actions(self):
-        """ Compute 1-D list of actions """
+    def compute_interpolation_matrix(self, uselookuptable = True ):
+        """ 
+        Sparse multi-linear interpolation matrix of the next states
+        ----------------------------------------------------------------
+        P : ( nodes_n * actions_n , nodes_n ) scipy.sparse CSR matrix such 
+            that J( x_next ) = P * J for all node-action pairs (node major),
+            rows of non-valid actions are empty
         
-        # For all state nodes
-        action = 0
+        uselookuptable : use the x_next lookup table if it was computed
         
-        for l in range(self.u0_n):
-            for m in range(self.u1_n):
+        """
+        
+        uselookuptable = uselookuptable and self.uselookuptable
+        
+        if not uselookuptable:
+            self.action_isok = np.zeros( ( self.nodes_n , self.actions_n ) , dtype = bool )
+        
+        corners     = 2 ** self.sys.n
+        chunk_nodes = self.compute_chunk_size()
+        chunks      = []
+        
+        for start in range( 0 , self.nodes_n , chunk_nodes ):
+            
+            stop  = min( start + chunk_nodes , self.nodes_n )
+            pairs = ( stop - start ) * self.actions_n
+            
+            if uselookuptable:
+                X_next = self.x_next[ start : stop ].reshape( pairs , self.sys.n )
+                isok   = self.action_isok[ start : stop ].reshape( pairs )
+            else:
+                X_next , isok = self.compute_transitions_chunk( start , stop )
+                self.action_isok[ start : stop ] = isok.reshape( stop - start , self.actions_n )
+            
+            index , weight = self.compute_interpolation_weights( X_next[ isok ] )
+            
+            # 2^n entries for valid pairs, none for the others
+            indptr     = np.zeros( pairs + 1 , dtype = int )
+            indptr[1:] = np.cumsum( isok ) * corners
+            
+            chunks.append( sparse.csr_matrix( 
+                    ( weight.reshape( -1 ) , index.reshape( -1 ) , indptr ) ,
+                    shape = ( pairs , self.nodes_n ) ) )
+            
+        self.P = sparse.vstack( chunks , format = 'csr' )
+        self.P.eliminate_zeros()
+        
+        return self.P
                 
-                u = np.array([ self.ud[0][l] , self.ud[1][m] ])
                 
-                # State and grid index based on node #
-                self.actions_input[action,:] = u
-                self.actions_index[action,:] = np.array([l,m])
-    
-                # Increment node number
-                action = action + 1
                 
+'''
+################################################################################
+'''
+
+
+class GridDynamicSystem3D(GridDynamicSystem):
+    """ Create a discrete gird state-action space for 3D continous dynamic system, two continuous input u """
+    
+    ############################
+    def __init__(self, sys , dt = 0.05 , x_n = 21 ,  u_n = 11 ):
+        
+        # Discretization Parameters
+        self.x0_n  = x_n       # x discretizatio
+        self.x1_n  = x_n       # dx discretization
+        self.x2_n  = x_n       # dx discretization
+        self.u0_n  = u_n      # u0 discretization
+        self.u1_n  = u_n
+        
+        GridDynamicSystem.__init__( self , sys , 
+                                    ( self.x0_n , self.x1_n , self.x2_n ) ,
+                                    ( self.u0_n , self.u1_n ) , dt )
 
 
 
@@ -335,9 +523,9 @@ class GridDynamicSystem3D(GridDynamicSystem):
 if __name__ == "__main__":     
     """ MAIN TEST """
     
-    from pyro.dynamic import Manipulator   as M
+    from pyro.dynamic import pendulum
 
     # Define dynamic system
-    R  =  M.OneLinkManipulator()
+    sys      = pendulum.SinglePendulum()
     
-    dR = GridDynamicSystem2D( R )
\ No newline at end of file
+    grid_sys = GridDynamicSystem( sys , ( 101 , 101 ) , ( 11 , ) )
\ No newline at end of file
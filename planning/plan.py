@@ -7,6 +7,8 @@ Created on Fri Nov 16 13:41:26 2018
 ###############################################################################
 import numpy as np
 
+from scipy.interpolate import CubicSpline
+
 ###############################################################################
 from pyro.analysis import simulation
 from pyro.control  import controller
@@ -42,10 +44,21 @@ class OpenLoopController( controller.StaticController ) :
         
         return u
         
+    #############################
+    def c_batch( self , Y , R , t = 0 ):
+        """  U depends only on time, all times are looked up at once """
+        
+        T = np.broadcast_to( t , Y.shape[0] )
+        
+        return self.trajectory.t2u( T )
+        
 
 ###############################################################################
 class Trajectory() :
-    """    """
+    """    
+    interpolation : 'nearest' , 'zoh' , 'linear' or 'cubic' 
+                    for t2u and t2x
+    """
     ############################
     def __init__(self, x , u , t , dx = None , y = None):
         """ 
@@ -62,6 +75,8 @@ class Trajectory() :
         self.dx_sol = dx
         self.y_sol  = y
         
+        self.interpolation = 'nearest'
+        
         self.compute_size()
         
     ############################
@@ -100,6 +115,12 @@ class Trajectory() :
         
         self.ubar = np.zeros( self.m )
         
+        # Time index of the last query
+        self.last_index = 0
+        
+        # Cubic splines coefficients, computed on first use
+        self.splines = {}
+        
     
     ############################
     def low_pass_filter_x( self , fc = 3 ):
@@ -115,17 +136,100 @@ class Trajectory() :
         for j in range(self.m):
             self.u_sol[:,j]  = self.low_pass_filter.filter_array( self.u_sol[:,j]  )
             
+        self.splines = {}
+            
+    
+    ############################
+    def t2i(self, t ):
+        """ 
+        get the index i of the time interval t_sol[i] <= t < t_sol[i+1] 
+        
+        Bisection in O(log N), the index of the last query is tried first 
+        so monotone queries, as in a simulation, are found in O(1).
+        Arrays of times are all searched at once.
+        """
+        
+        t_sol = self.t_sol.ravel()
+        i_max = max( self.time_steps - 2 , 0 )
+        
+        if np.ndim( t ) > 0:
+            i = np.searchsorted( t_sol , t , side = 'right' ) - 1
+            return np.clip( i , 0 , i_max )
+        
+        # Same or next interval than the last query
+        i = self.last_index
+        
+        for j in ( i , i + 1 ):
+            if j <= i_max and t_sol[j] <= t < t_sol[j+1]:
+                self.last_index = j
+                return j
+            
+        i = np.searchsorted( t_sol , t , side = 'right' ) - 1
+        i = min( max( i , 0 ) , i_max )
+        
+        self.last_index = i
+        
+        return i
+    
+    
+    ############################
+    def interpolate(self, name , t ):
+        """ interpolate the array self.<name> at time t """
+        
+        data = getattr( self , name )
+        
+        if np.ndim( t ) > 0:
+            t = np.asarray( t )
+        
+        if self.time_steps < 2:
+            return np.broadcast_to( data[0] , np.shape( t ) + data[0].shape )
+        
+        t_sol = self.t_sol.ravel()
+        
+        i  = self.t2i( t )
+        t0 = t_sol[ i ]
+        t1 = t_sol[ i + 1 ]
+        
+        if self.interpolation == 'nearest':
+            return data[ i + ( t - t0 > t1 - t ) ]
+        
+        elif self.interpolation == 'zoh':
+            return data[ i + ( t >= t1 ) ]
+        
+        elif self.interpolation == 'linear':
+            s = np.clip( ( t - t0 ) / ( t1 - t0 ) , 0 , 1 )
+            s = np.asarray( s )[...,None]
+            return data[ i ] * ( 1 - s ) + data[ i + 1 ] * s
+        
+        elif self.interpolation == 'cubic':
+            
+            if name not in self.splines:
+                self.splines[ name ] = CubicSpline( t_sol , data , axis = 0 ).c
+                
+            c  = self.splines[ name ][ : , i ]
+            dt = np.clip( t , t_sol[0] , t_sol[-1] ) - t0
+            dt = np.asarray( dt )[...,None]
+            
+            return ( ( c[0] * dt + c[1] ) * dt + c[2] ) * dt + c[3]
+        
+        else:
+            raise ValueError('not a valid interpolation mode')
+        
         
     ############################
     def t2u(self, t ):
-        """ get u from time """
+        """ get u from time, t can be an array of times """
         
-        if t < self.time_final:
-            # Find time index
-            i = (np.abs(self.t_sol - t)).argmin()
+        if np.ndim( t ) > 0:
+            t = np.asarray( t )
+            u = np.array( self.interpolate( 'u_sol' , t ) , dtype = float )
             
+            # Zero input after the trajectory
+            u[ t >= self.time_final ] = self.ubar
+            
+        elif t < self.time_final:
             # Find associated control input
-            u = self.u_sol[i,:]
+            u = self.interpolate( 'u_sol' , t )
         
         else:
             u = self.ubar
@@ -134,13 +238,9 @@ class Trajectory() :
     
     ############################
     def t2x(self, t ):
-        """ get x from time """
-        
-        # Find time index
-        i = (np.abs(self.t_sol - t)).argmin()
+        """ get x from time, t can be an array of times """
         
-        # Find associated control input
-        x = self.x_sol[i,:]
+        x = self.interpolate( 'x_sol' , t )
             
         return x
     
@@ -5,21 +5,29 @@ Created on Sun Mar  6 15:09:12 2016
 @author: alex
 """
 ###############################################################################
+import time
+import os
+import multiprocessing
+
 import numpy as np
 import matplotlib
 import matplotlib.pyplot as plt
 import mpl_toolkits.mplot3d.axes3d as p3
+from scipy.spatial import cKDTree
 
 ###############################################################################
 from pyro.dynamic  import system
 from pyro.analysis import simulation
+from pyro.analysis import costfunction
 from pyro.signal   import timefiltering
 from pyro.planning import plan
 
 
 ###############################################################################
 class Node:
-    """ node of the random tree """
+    """ node of the random tree, not yet stored in a tree """
+    
+    __slots__ = ( 'x' , 'u' , 't' , 'parent' )
     
     ############################
     def __init__(self, x , u , t , parent ):
@@ -35,6 +43,432 @@ class Node:
         """ Compute distance to otherNode """
         
         return np.linalg.norm( self.x - x_other )
+    
+    
+###############################################################################
+class TreeNode:
+    """ view of the node # id stored in a Tree """
+    
+    __slots__ = ( 'tree' , 'id' )
+    
+    ############################
+    def __init__(self, tree , node_id ):
+        
+        self.tree = tree
+        self.id   = node_id
+        
+    ############################
+    @property
+    def x(self):
+        return self.tree.x[ self.id ]
+    
+    ############################
+    @property
+    def u(self):
+        return self.tree.u[ self.id ]
+    
+    ############################
+    @property
+    def t(self):
+        return self.tree.t[ self.id ]
+    
+    ############################
+    @property
+    def cost(self):
+        return self.tree.cost[ self.id ]
+    
+    ############################
+    @property
+    def parent(self):
+        
+        parent_id = self.tree.parent[ self.id ]
+        
+        if parent_id < 0:
+            return None
+        
+        return TreeNode( self.tree , parent_id )
+    
+    ############################
+    def distanceTo(self, x_other ):
+        """ Compute distance to otherNode """
+        
+        return np.linalg.norm( self.x - x_other )
+    
+    
+###############################################################################
+class Tree:
+    """ 
+    Array storage of the random tree nodes
+    ----------------------------------------------------
+    x      : ( size , n ) node coordinates in the state space
+    u      : ( size , m ) control inputs used to get there
+    t      : ( size )     time when arriving at x
+    parent : ( size )     id of the previous node, -1 for the root
+    cost   : ( size )     cost to come from the root
+    
+    Arrays are preallocated and their capacity is doubled when full. The 
+    ids of the children of each node are kept in the list children.
+    
+    """
+    
+    ############################
+    def __init__(self, n , m , capacity = 1024 ):
+        
+        self.n = n
+        self.m = m
+        
+        self.capacity = capacity
+        
+        self.reset()
+        
+        
+    ############################
+    def reset(self):
+        """ Remove all nodes """
+        
+        self.x      = np.zeros(( self.capacity , self.n ))
+        self.u      = np.zeros(( self.capacity , self.m ))
+        self.t      = np.zeros( self.capacity )
+        self.parent = np.zeros( self.capacity , dtype = int )
+        self.cost   = np.zeros( self.capacity )
+        
+        self.children = []
+        
+        self.size   = 0
+        
+        
+    ############################
+    def grow(self):
+        """ Double the capacity of the arrays """
+        
+        self.x      = np.concatenate( ( self.x      , np.zeros_like( self.x ) ) )
+        self.u      = np.concatenate( ( self.u      , np.zeros_like( self.u ) ) )
+        self.t      = np.concatenate( ( self.t      , np.zeros_like( self.t ) ) )
+        self.parent = np.concatenate( ( self.parent , 
+                                        np.zeros_like( self.parent ) ) )
+        self.cost   = np.concatenate( ( self.cost   , np.zeros_like( self.cost ) ) )
+        
+        
+    ############################
+    def add(self, x , u , t , parent_id , cost = 0. ):
+        """ Store a node and return its id """
+        
+        if self.size == self.x.shape[0]:
+            self.grow()
+            
+        node_id = self.size
+        
+        self.x[ node_id ]      = x
+        self.t[ node_id ]      = t
+        self.parent[ node_id ] = parent_id
+        self.cost[ node_id ]   = cost
+        
+        if u is not None:
+            self.u[ node_id ] = u
+        
+        self.children.append( [] )
+        
+        if parent_id >= 0:
+            self.children[ parent_id ].append( node_id )
+        
+        self.size = self.size + 1
+        
+        return node_id
+    
+    
+    ############################
+    def set_parent(self, node_id , parent_id ):
+        """ Move node # node_id and its sub-tree under node # parent_id """
+        
+        self.children[ self.parent[ node_id ] ].remove( node_id )
+        self.children[ parent_id ].append( node_id )
+        
+        self.parent[ node_id ] = parent_id
+    
+    
+    ############################
+    def path(self, node_id ):
+        """ Return the ids of the nodes from the root to node # node_id """
+        
+        ids = []
+        
+        while node_id >= 0:
+            ids.append( node_id )
+            node_id = self.parent[ node_id ]
+            
+        return np.array( ids[::-1] , dtype = int )
+    
+    
+    ############################
+    def save(self, name = 'RRT_tree' ):
+        """ Save the node arrays """
+        
+        np.save( name + '_x'      + '.npy' , self.x[ : self.size ] )
+        np.save( name + '_u'      + '.npy' , self.u[ : self.size ] )
+        np.save( name + '_t'      + '.npy' , self.t[ : self.size ] )
+        np.save( name + '_parent' + '.npy' , self.parent[ : self.size ] )
+        np.save( name + '_cost'   + '.npy' , self.cost[ : self.size ] )
+        
+        
+    ############################
+    def load(self, name = 'RRT_tree' ):
+        """ Load the node arrays """
+        
+        self.x      = np.load( name + '_x'      + '.npy' )
+        self.u      = np.load( name + '_u'      + '.npy' )
+        self.t      = np.load( name + '_t'      + '.npy' )
+        self.parent = np.load( name + '_parent' + '.npy' )
+        self.cost   = np.load( name + '_cost'   + '.npy' )
+        
+        self.size   = self.t.shape[0]
+        
+        self.children = [ [] for i in range( self.size ) ]
+        
+        for i in range( self.size ):
+            if self.parent[ i ] >= 0:
+                self.children[ self.parent[ i ] ].append( i )
+        
+        # Keep room for new nodes
+        if self.size == 0:
+            self.reset()
+        else:
+            self.grow()
+        
+        
+###############################################################################
+class NearestNeighborIndex:
+    """ 
+    Brute-force nearest neighbor index of the tree nodes
+    ----------------------------------------------------
+    The weighted states of the nodes are stored in a contiguous array and
+    the distance d = || weights * ( x - x_node ) || is computed for all nodes
+    with a single vectorized expression.
+    
+    Child classes overload add and query with faster search structures.
+    
+    The state of an indexed node can be replaced with update when the node
+    is moved ( ex: rewiring ).
+    
+    """
+    
+    ############################
+    def __init__(self, n , weights = None ):
+        
+        self.n = n
+        
+        if weights is None:
+            weights = np.ones( n )
+            
+        self.weights  = np.asarray( weights , dtype = float )
+        
+        self.capacity = 1024
+        
+        self.reset()
+        
+        
+    ############################
+    def reset(self):
+        """ Remove all nodes """
+        
+        self.X     = np.zeros(( self.capacity , self.n ))  # weighted states
+        self.ids   = np.zeros( self.capacity , dtype = int ) # node ids
+        self.rows  = {}                                      # row of node ids
+        self.size  = 0
+        
+        
+    ############################
+    def add(self, x , node_id ):
+        """ Add the state x of node node_id """
+        
+        # Grow arrays
+        if self.size == self.X.shape[0]:
+            self.X   = np.concatenate( ( self.X   , np.zeros_like( self.X   ) ) )
+            self.ids = np.concatenate( ( self.ids , np.zeros_like( self.ids ) ) )
+        
+        self.X[ self.size ]   = self.weights * x
+        self.ids[ self.size ] = node_id
+        self.rows[ node_id ]  = self.size
+        self.size             = self.size + 1
+        
+        
+    ############################
+    def update(self, x , node_ids ):
+        """ 
+        Replace the states x ( N x n ) of the nodes node_ids, nodes that are
+        not indexed are skipped
+        
+        return the rows of the updated nodes
+        """
+        
+        indexed = np.array([ i in self.rows for i in node_ids ], dtype = bool )
+        
+        rows = np.array([ self.rows[ i ] for i in np.asarray( node_ids )[ indexed ] ],
+                        dtype = int )
+        
+        self.X[ rows ] = self.weights * np.asarray( x )[ indexed ]
+        
+        return rows
+        
+        
+    ############################
+    def query(self, x ):
+        """ Return ( node_id , distance ) of the nearest node to x """
+        
+        if self.size == 0:
+            return None , np.inf
+        
+        d = np.linalg.norm( self.X[ : self.size ] - self.weights * x , axis = 1 )
+        
+        i = d.argmin()
+        
+        return self.ids[ i ] , d[ i ]
+    
+    
+    ############################
+    def query_radius(self, x , r ):
+        """ Return the ids of the nodes within distance r of x """
+        
+        d = np.linalg.norm( self.X[ : self.size ] - self.weights * x , axis = 1 )
+        
+        return self.ids[ : self.size ][ d < r ]
+    
+    
+###############################################################################
+class KDTreeIndex( NearestNeighborIndex ):
+    """ 
+    Incrementally rebuilt KD-tree nearest neighbor index
+    ----------------------------------------------------
+    New nodes go in a small buffer searched by brute force, when the buffer
+    is full it is merged with the most recent KD-trees of smaller or equal 
+    size into a new KD-tree (logarithmic method). There are at most 
+    log2( size ) trees, so queries and insertions are sub-linear while the 
+    result is still the exact nearest node.
+    
+    """
+    
+    ############################
+    def __init__(self, n , weights = None ):
+        
+        self.buffer_size = 64  # nodes searched by brute force
+        
+        NearestNeighborIndex.__init__(self, n , weights )
+        
+        
+    ############################
+    def reset(self):
+        """ Remove all nodes """
+        
+        NearestNeighborIndex.reset(self)
+        
+        self.trees  = []     # list of ( start , KD-tree of X[ start : stop ] )
+        self.built  = 0      # number of nodes in the KD-trees
+        self.dirty  = set()  # start of the KD-trees with updated nodes
+        
+        
+    ############################
+    def add(self, x , node_id ):
+        """ Add the state x of node node_id """
+        
+        NearestNeighborIndex.add(self, x , node_id )
+        
+        # Merge the buffer with the smaller trees
+        if ( self.size - self.built ) == self.buffer_size:
+            
+            start = self.built
+            
+            while self.trees and ( ( start - self.trees[-1][0] ) <= 
+                                   ( self.size - start ) ):
+                start = self.trees.pop()[0]
+                self.dirty.discard( start )
+                
+            self.trees.append( ( start , cKDTree( self.X[ start : self.size ] ) ) )
+            
+            self.built = self.size
+            
+            
+    ############################
+    def update(self, x , node_ids ):
+        """ 
+        Replace the states x ( N x n ) of the nodes node_ids, the KD-trees
+        holding them are rebuilt at the next query
+        """
+        
+        rows = NearestNeighborIndex.update(self, x , node_ids )
+        
+        for start , tree in self.trees:
+            if ( ( rows >= start ) & ( rows < start + tree.n ) ).any():
+                self.dirty.add( start )
+                
+        return rows
+    
+    
+    ############################
+    def rebuild(self):
+        """ Rebuild the KD-trees with updated nodes """
+        
+        if not self.dirty:
+            return
+        
+        for k , ( start , tree ) in enumerate( self.trees ):
+            if start in self.dirty:
+                self.trees[ k ] = ( start , 
+                                    cKDTree( self.X[ start : start + tree.n ] ) )
+                
+        self.dirty = set()
+            
+            
+    ############################
+    def query(self, x ):
+        """ Return ( node_id , distance ) of the nearest node to x """
+        
+        self.rebuild()
+        
+        xw = self.weights * x
+        
+        i_min = -1
+        d_min = np.inf
+        
+        # KD-trees
+        for start , tree in self.trees:
+            d , i = tree.query( xw )
+            if d < d_min:
+                d_min = d
+                i_min = start + i
+                
+        # Buffer
+        if self.size > self.built:
+            d = np.linalg.norm( self.X[ self.built : self.size ] - xw , axis = 1 )
+            i = d.argmin()
+            if d[ i ] < d_min:
+                d_min = d[ i ]
+                i_min = self.built + i
+        
+        if i_min < 0:
+            return None , np.inf
+        
+        return self.ids[ i_min ] , d_min
+    
+    
+    ############################
+    def query_radius(self, x , r ):
+        """ Return the ids of the nodes within distance r of x """
+        
+        self.rebuild()
+        
+        xw = self.weights * x
+        
+        index = []
+        
+        # KD-trees
+        for start , tree in self.trees:
+            index.extend( [ start + i for i in tree.query_ball_point( xw , r ) ] )
+            
+        # Buffer
+        d = np.linalg.norm( self.X[ self.built : self.size ] - xw , axis = 1 )
+        
+        index.extend( self.built + np.flatnonzero( d < r ) )
+        
+        return self.ids[ np.array( index , dtype = int ) ]
         
         
 ###############################################################################
@@ -49,8 +483,12 @@ class RRT:
         # Init tree
         self.x_start = x_start  # origin of the graph
         self.start_node = Node( self.x_start , None , 0  , None )
-        self.nodes = []
-        self.nodes.append( self.start_node )
+        
+        # Node storage
+        self.tree = Tree( self.sys.n , self.sys.m )
+        
+        # Nearest neighbor search ( can be replaced by another index )
+        self.nn_index = KDTreeIndex( self.sys.n )
         
         # Params
         self.dt                   = 0.1
@@ -61,7 +499,6 @@ class RRT:
         self.alpha                = 0.9    # prob of random exploration
         self.beta                 = 0.0    # prob of random u
         self.max_nodes            = 2000  # maximum number of nodes
-        self.max_distance_compute = 2000   # max  nodes to check distance
         self.max_solution_time    = 100    # won"t look for longuer solution 
         
         self.test_u_domain        = False  # run a check on u input 
@@ -84,6 +521,48 @@ class RRT:
         # Init
         self.solution_is_found     = False
         self.randomized_input      = False
+        self.trajectory            = None
+        
+        self.init_tree()
+        
+        
+    #############################
+    def init_tree(self):
+        """ Reset the tree to the start node only """
+        
+        self.tree.reset()
+        self.nn_index.reset()
+        
+        self.add_node( self.start_node )
+        
+        
+    #############################
+    def add_node(self, node ):
+        """ 
+        Store a node in the tree and in the nearest neighbor index,
+        return the view of the stored node
+        """
+        
+        if node.parent is None:
+            parent_id = -1
+        else:
+            parent_id = node.parent.id
+        
+        node_id = self.tree.add( node.x , node.u , node.t , parent_id )
+        
+        # Nodes at max time cannot be extended, no need to index them
+        if node.t < self.max_solution_time:
+            self.nn_index.add( node.x , node_id )
+            
+        return TreeNode( self.tree , node_id )
+    
+    
+    #############################
+    @property
+    def nodes(self):
+        """ Views of all the nodes of the tree """
+        
+        return [ TreeNode( self.tree , i ) for i in range( self.tree.size ) ]
         
         
     #############################
@@ -131,32 +610,12 @@ class RRT:
     def nearest_neighbor(self, x_target ):    
         """ Get the nearest node to a given state x """
         
-        closest_node = None
-        min_distance = self.INF
+        node_id , distance = self.nn_index.query( x_target )
         
-        # Number of nodes is small
-        if len(self.nodes) < self.max_distance_compute + 1 :
-            # Brute force        
-            for node in self.nodes:
-                d = node.distanceTo( x_target )
-                if d < min_distance:
-                    if node.t < self.max_solution_time:
-                        min_distance = d
-                        closest_node = node
+        if node_id is None:
+            return None
         
-        # Else if there is too many nodes to check
-        else:
-            # Check only last X nodes
-            for i in range(self.max_distance_compute):
-                node = self.nodes[ len(self.nodes) - i - 1 ]
-                d = node.distanceTo( x_target )
-                if d < min_distance:
-                    if node.t < self.max_solution_time:
-                        min_distance = d
-                        closest_node = node
-            
-                
-        return closest_node
+        return TreeNode( self.tree , node_id )
         
         
     ############################
@@ -177,39 +636,46 @@ class RRT:
             t_next     = closest_node.t + self.dt * self.steps
             new_node   = Node( x_next , u , t_next  , closest_node )
             
-            if not( self.sys.isavalidstate( x_next ) ):
+            if not( self.sys.isavalidtransition_batch( closest_node.x[ None , : ] ,
+                                                       x_next[ None , : ] )[0] ):
                 new_node = None
         
         # Pick control input that bring the sys close to random point
         else:
             
-            new_node     = None
-            min_distance = self.INF
+            new_node = None
             
-            for u in self.u_options:
+            U  = np.array( self.u_options , dtype = float ).reshape( -1 , self.sys.m )
+            X0 = np.tile( closest_node.x , ( U.shape[0] , 1 ) )
                 
-                # if u domain check is active
-                if self.test_u_domain:
-                    # if input is not valid
-                    if not( self.sys.isavalidinput( closest_node.x , u ) ):
-                        # Skip this u
-                        continue
+            # if u domain check is active
+            if self.test_u_domain:
+                # Skip inputs that are not valid
+                u_isok = self.sys.isavalidinput_batch( X0 , U )
+                U      = U[ u_isok ]
+                X0     = X0[ u_isok ]
                 
-                x_next     = self.sys.x_next( closest_node.x , 
-                                              u , 
-                                              closest_node.t , 
-                                              self.dt ,
-                                              self.steps 
-                                              )
+            if U.shape[0] == 0:
+                return new_node
                 
-                t_next     = closest_node.t + self.dt * self.steps
-                node       = Node( x_next , u , t_next  , closest_node )
+            # All options integrated at once
+            X_next = self.sys.x_next_batch( X0 , 
+                                            U , 
+                                            closest_node.t , 
+                                            self.dt ,
+                                            self.steps 
+                                            )
                 
-                d = node.distanceTo( x_target )
+            d = np.linalg.norm( X_next - x_target , axis = 1 )
                 
-                if ( d < min_distance ) and self.sys.isavalidstate( x_next ) :
-                    min_distance = d
-                    new_node     = node
+            d[ ~self.sys.isavalidtransition_batch( X0 , X_next ) ] = np.inf
+            
+            i = d.argmin()
+            
+            # Only the closest valid option is converted to a node
+            if d[ i ] < self.INF:
+                t_next   = closest_node.t + self.dt * self.steps
+                new_node = Node( X_next[ i ] , U[ i ] , t_next  , closest_node )
                     
                 
         return new_node
@@ -228,7 +694,7 @@ class RRT:
             
             # if there is a valid control input
             if not new_node == None:
-                self.nodes.append( new_node )
+                self.add_node( new_node )
         
         
     ############################
@@ -243,8 +709,15 @@ class RRT:
            
         
     ############################
-    def find_path_to_goal(self, x_goal ):
-        """ """
+    def search(self, x_goal , time_budget = None ):
+        """ 
+        Grow the tree until a node is within goal_radius of x_goal
+        ----------------------------------------------------------
+        time_budget : max wall-clock time [sec], None for no limit
+        
+        return True if a node reached the goal, False if time is over
+        
+        """
         
         self.x_goal  = x_goal
         
@@ -252,12 +725,21 @@ class RRT:
         
         no_nodes = 0
         
+        self.nodes_computed = 0  # total number of nodes, including resets
+        
+        t_start = time.time()
+        
          # Plot
         if self.dyna_plot:
             self.dyna_plot_init()
         
         while not succes:
             
+            # Time budget
+            if time_budget is not None:
+                if ( time.time() - t_start ) > time_budget:
+                    return False
+            
             # Exploration:
             if np.random.rand() > self.alpha :
                 # Try to converge to goal
@@ -279,13 +761,15 @@ class RRT:
                 
                 # if there is a valid control input
                 if not new_node == None:
-                    self.nodes.append( new_node )
+                    new_node = self.add_node( new_node )
             
                     # Distance to goal
                     d = new_node.distanceTo( x_goal )
                     
                     no_nodes = no_nodes + 1
                     
+                    self.nodes_computed = self.nodes_computed + 1
+                    
                     ##################################################
                     # Debug
                     if self.debug:
@@ -313,11 +797,19 @@ class RRT:
                       '\nRRT reseting tree',
                       '\n-----------------------------------------------')
                 no_nodes = 0
-                self.nodes = []
-                self.nodes.append( self.start_node )
+                self.init_tree()
                 
                 if self.dyna_plot :
                     self.dyna_plot_clear()
+                    
+        return True
+        
+    
+    ############################
+    def find_path_to_goal(self, x_goal ):
+        """ """
+        
+        self.search( x_goal )
         
         print('\n-----------------------------------------------',
               '\nRRT found a path to the goal',
@@ -335,51 +827,21 @@ class RRT:
     def compute_path_to_goal(self):
         """ """
         
-        node = self.goal_node
-        
-        t      = 0
-        
-        x_list  = []
-        u_list  = []
-        t_list  = []
-        dx_list = []
-        
-        self.path_node_list = []
-        
-        # Until node = start_node
-        while node.distanceTo( self.x_start ) > self.eps:
-            
-            self.path_node_list.append( node )
-            
-            x_list.append( node.parent.x   )
-            u_list.append( node.u     )
-            t_list.append( node.parent.t   )
-            
-            dx_list.append( self.sys.f( node.parent.x , 
-                                        node.u , 
-                                        node.parent.t )  ) # state derivative
-            
-            # Previous Node
-            node  = node.parent 
-
-        # Arrange Time array
-        t = np.array( t_list )
-        t = np.flipud( t )
+        path = self.tree.path( self.goal_node.id )
         
-        # Arrange Input array
-        u = np.array( u_list ).T
-        u = np.fliplr( u )
+        # Nodes of the path, without the start node
+        self.path_node_list = [ TreeNode( self.tree , i ) for i in path[1:] ]
         
-        # Arrange State array
-        x = np.array( x_list ).T
-        x = np.fliplr( x )
+        # Each step of the plan is the parent state and the input of the child
+        x  = self.tree.x[ path[:-1] ]
+        u  = self.tree.u[ path[1:] ]
+        t  = self.tree.t[ path[:-1] ]
         
-        # Arrange State Derivative array
-        dx = np.array( dx_list ).T
-        dx = np.fliplr( dx )
+        # State derivative
+        dx = self.sys.f_batch( x , u , t )
             
         # Save plan
-        self.trajectory = plan.Trajectory( x.T , u.T , t.T , dx.T)
+        self.trajectory = plan.Trajectory( x , u , t , dx )
         
         # Create open-loop controller
         self.open_loop_controller = plan.OpenLoopController( self.trajectory )
@@ -388,14 +850,25 @@ class RRT:
         self.solution_is_found = True
     
     
+    ############################
+    def check_solution(self):
+        """ Raise an error if there is no trajectory """
+        
+        if self.trajectory is None:
+            raise ValueError('no solution: the goal was not reached')
+    
     ############################
     def filter_solution( self , fc = 3 ):
         
+        self.check_solution()
+        
         self.trajectory.lowpassfilter( fc )
     
     ############################
     def save_solution(self, name = 'RRT_Solution.npy' ):
         
+        self.check_solution()
+        
         self.trajectory.save( name )
         
     ############################
@@ -403,9 +876,28 @@ class RRT:
         
         self.trajectory = plan.load_trajectory( name )
     
+    ############################
+    def save_tree(self, name = 'RRT_tree' ):
+        
+        self.tree.save( name )
+        
+    ############################
+    def load_tree(self, name = 'RRT_tree' ):
+        
+        self.tree.load( name )
+        
+        # Rebuild the nearest neighbor index
+        self.nn_index.reset()
+        
+        for i in range( self.tree.size ):
+            if self.tree.t[ i ] < self.max_solution_time:
+                self.nn_index.add( self.tree.x[ i ] , i )
+    
     ############################
     def plot_open_loop_solution(self, params = 'xu' ):
         
+        self.check_solution()
+        
         self.trajectory.plot_trajectory( self.sys , params )
         
         
@@ -429,11 +921,13 @@ class RRT:
         ax       = self.fig_tree.add_subplot(111)
         
         # Plot Tree
-        for node in self.nodes:
-            if not(node.parent==None):
-                ax.plot( 
-                [node.x[ self.x_axis ],node.parent.x[ self.x_axis ]] , 
-                [node.x[ self.y_axis ],node.parent.x[ self.y_axis ]] , 'o-')
+        x      = self.tree.x
+        parent = self.tree.parent
+        
+        for i in range( 1 , self.tree.size ):
+            ax.plot( 
+            [ x[ i , self.x_axis ] , x[ parent[i] , self.x_axis ] ] , 
+            [ x[ i , self.y_axis ] , x[ parent[i] , self.y_axis ] ] , 'o-')
         
         # Plot Solution Path
         if self.solution_is_found:
@@ -484,12 +978,14 @@ class RRT:
         ax = self.fig_tree_3d.gca( projection='3d' )
         
         # Plot Tree
-        for node in self.nodes:
-            if not( node.parent == None ):
-                ax.plot( 
-                [ node.x[ self.x_axis ] , node.parent.x[ self.x_axis ]] ,
-                [ node.x[ self.y_axis ] , node.parent.x[ self.y_axis ]] ,
-                [ node.x[ self.z_axis ] , node.parent.x[ self.z_axis ]] , 'o-')
+        x      = self.tree.x
+        parent = self.tree.parent
+        
+        for i in range( 1 , self.tree.size ):
+            ax.plot( 
+            [ x[ i , self.x_axis ] , x[ parent[i] , self.x_axis ] ] ,
+            [ x[ i , self.y_axis ] , x[ parent[i] , self.y_axis ] ] ,
+            [ x[ i , self.z_axis ] , x[ parent[i] , self.z_axis ] ] , 'o-')
         
         # Plot Solution Path
         if not self.solution_is_found == None:
@@ -624,6 +1120,864 @@ class RRT:
         
 
 
+###############################################################################
+class BidirectionalRRT( RRT ):
+    """ 
+    RRT-Connect search with a forward and a backward tree
+    ------------------------------------------------------
+    The forward tree grows from x_start, the backward tree grows from x_goal
+    by integrating sys.f in reversed time. At each iteration one tree is 
+    extended toward a random state and the other tree is greedily extended 
+    toward the new node (connection step), then the roles are swapped.
+    
+    The backward tree nodes store the time-to-goal as t and the input that 
+    brings the node to its parent in forward time.
+    
+    Backward edges only approximately reverse a forward step, so once the
+    trees connect, the inputs of the backward path are re-simulated forward
+    from the connection state so the trajectory is dynamically exact. A
+    connection is discarded if a re-simulated transition is not valid or if
+    the last state x_end drifted out of goal_radius ( goal_error ).
+    
+    """
+    
+    ############################
+    def __init__(self, sys , x_start ):
+        
+        self.connect_steps = 50   # max extensions of a connection step
+        
+        RRT.__init__(self, sys , x_start )
+        
+        # Backward tree
+        self.tree_goal     = Tree( self.sys.n , self.sys.m )
+        self.nn_index_goal = KDTreeIndex( self.sys.n )
+        
+        self.dyna_plot = False
+        
+        
+    ############################
+    def init_goal_tree(self, x_goal ):
+        """ Reset the backward tree to the goal node only """
+        
+        self.tree_goal.reset()
+        self.nn_index_goal.reset()
+        
+        self.tree_goal.add( x_goal , None , 0 , -1 )
+        self.nn_index_goal.add( x_goal , 0 )
+        
+        
+    ############################
+    def extend_tree(self, tree , nn_index , x_target , dt ):
+        """ 
+        Extend the node of a tree nearest to x_target with the closest 
+        valid control option, dt < 0 integrates in reversed time
+        
+        return the new node id, or None
+        
+        """
+        
+        node_id , d = nn_index.query( x_target )
+        
+        if node_id is None:
+            return None
+        
+        U  = np.array( self.u_options , dtype = float ).reshape( -1 , self.sys.m )
+        X0 = np.tile( tree.x[ node_id ] , ( U.shape[0] , 1 ) )
+        
+        # if u domain check is active
+        if self.test_u_domain:
+            u_isok = self.sys.isavalidinput_batch( X0 , U )
+            U      = U[ u_isok ]
+            X0     = X0[ u_isok ]
+            
+        if U.shape[0] == 0:
+            return None
+        
+        X_next = self.sys.x_next_batch( X0 , U , tree.t[ node_id ] , dt , 
+                                        self.steps )
+        
+        d = np.linalg.norm( X_next - x_target , axis = 1 )
+        
+        d[ ~self.sys.isavalidtransition_batch( X0 , X_next ) ] = np.inf
+        
+        i = d.argmin()
+        
+        if not( d[ i ] < self.INF ):
+            return None
+        
+        t_next  = tree.t[ node_id ] + abs( dt ) * self.steps
+        
+        new_id  = tree.add( X_next[ i ] , U[ i ] , t_next , node_id )
+        
+        if t_next < self.max_solution_time:
+            nn_index.add( X_next[ i ] , new_id )
+            
+        self.nodes_computed = self.nodes_computed + 1
+        
+        return new_id
+    
+    
+    ############################
+    def connect_tree(self, tree , nn_index , x_target , dt ):
+        """ 
+        Greedily extend a tree toward x_target until it is within 
+        goal_radius or stops getting closer
+        
+        return the id of the closest node and its distance to x_target
+        
+        """
+        
+        node_id , d = nn_index.query( x_target )
+        
+        if node_id is None:
+            return None , np.inf
+        
+        d_min = np.linalg.norm( tree.x[ node_id ] - x_target )
+        
+        for k in range( self.connect_steps ):
+            
+            if d_min < self.goal_radius:
+                break
+            
+            new_id = self.extend_tree( tree , nn_index , x_target , dt )
+            
+            if new_id is None:
+                break
+            
+            d = np.linalg.norm( tree.x[ new_id ] - x_target )
+            
+            # No more progress
+            if not( d < d_min ):
+                break
+            
+            d_min   = d
+            node_id = new_id
+            
+        return node_id , d_min
+    
+    
+    ############################
+    def find_path_to_goal(self, x_goal , time_budget = None ):
+        """ 
+        Grow both trees until they connect
+        ------------------------------------------------
+        time_budget : max wall-clock time [sec], None for no limit
+        
+        return True if a path was found
+        
+        """
+        
+        self.x_goal = x_goal
+        
+        self.init_tree()
+        self.init_goal_tree( x_goal )
+        
+        self.nodes_computed = 0
+        
+        t_start = time.time()
+        
+        forward = True
+        succes  = False
+        
+        while not succes:
+            
+            # Time budget
+            if time_budget is not None:
+                if ( time.time() - t_start ) > time_budget:
+                    break
+            
+            x_random = self.rand_state()
+            
+            if forward:
+                # Extend forward tree, connect backward tree
+                start_id = self.extend_tree( self.tree , self.nn_index , 
+                                             x_random , self.dt )
+                
+                if start_id is not None:
+                    goal_id , d = self.connect_tree( self.tree_goal , 
+                                                     self.nn_index_goal , 
+                                                     self.tree.x[ start_id ] ,
+                                                     - self.dt )
+                    succes = d < self.goal_radius
+            else:
+                # Extend backward tree, connect forward tree
+                goal_id = self.extend_tree( self.tree_goal , 
+                                            self.nn_index_goal ,
+                                            x_random , - self.dt )
+                
+                if goal_id is not None:
+                    start_id , d = self.connect_tree( self.tree , 
+                                                      self.nn_index , 
+                                                      self.tree_goal.x[ goal_id ],
+                                                      self.dt )
+                    succes = d < self.goal_radius
+                    
+            if succes:
+                self.goal_node    = TreeNode( self.tree      , start_id )
+                self.connect_node = TreeNode( self.tree_goal , goal_id  )
+                
+                # Compute Path, the re-simulated path must be valid
+                succes = self.compute_path_to_goal()
+            
+            forward = not( forward )
+            
+        if not succes:
+            print('\n-----------------------------------------------',
+                  '\nRRT-Connect did not find a path to the goal',
+                  '\n-----------------------------------------------')
+            return False
+        
+        print('\n-----------------------------------------------',
+              '\nRRT-Connect found a path to the goal',
+              '\n( total node number = ', self.nodes_computed,
+              ' goal error = ', self.goal_error, ' )',
+              '\n-----------------------------------------------')
+        
+        return True
+        
+        
+    ############################
+    def compute_path_to_goal(self):
+        """
+        Join the forward path and the backward path at the connection
+        ----------------------------------------------------------------
+        The backward inputs are re-simulated from the connection state
+        
+        return False if a re-simulated transition is not valid or if the
+        path does not end within goal_radius
+        
+        """
+        
+        path      = self.tree.path( self.goal_node.id )
+        path_goal = self.tree_goal.path( self.connect_node.id )[::-1]
+        
+        # Forward part: parent state and input of the child
+        x_f = self.tree.x[ path[:-1] ]
+        u_f = self.tree.u[ path[1:] ]
+        t_f = self.tree.t[ path[:-1] ]
+        
+        # Backward part: inputs toward the goal
+        t_connect = self.tree.t[ path[-1] ]
+        
+        u_b = self.tree_goal.u[ path_goal[:-1] ]
+        t_b = ( t_connect + self.tree_goal.t[ path_goal[0] ] - 
+                self.tree_goal.t[ path_goal[:-1] ] )
+        
+        # Re-simulated forward from the connection state
+        x_b = np.zeros(( u_b.shape[0] + 1 , self.sys.n ))
+        
+        x_b[0] = self.tree.x[ path[-1] ]
+        
+        for k in range( u_b.shape[0] ):
+        
+            x_b[ k + 1 ] = self.sys.x_next_batch( x_b[ k : k + 1 ] ,
+                                                  u_b[ k : k + 1 ] , t_b[k] ,
+                                                  self.dt , self.steps )[0]
+            
+            if not self.sys.isavalidtransition_batch( x_b[ k : k + 1 ] ,
+                                                      x_b[ k + 1 : k + 2 ] )[0]:
+                return False
+        
+        self.x_end      = x_b[-1]
+        self.goal_error = np.linalg.norm( self.x_end - self.x_goal )
+        
+        if not( self.goal_error < self.goal_radius ):
+            return False
+        
+        # Nodes of the path, without the start node
+        self.path_node_list = [ TreeNode( self.tree , i ) for i in path[1:] ]
+        
+        x_b = x_b[:-1]
+        
+        x  = np.concatenate( ( x_f , x_b ) )
+        u  = np.concatenate( ( u_f , u_b ) )
+        t  = np.concatenate( ( t_f , t_b ) )
+        
+        # State derivative
+        dx = self.sys.f_batch( x , u , t )
+        
+        # Save plan
+        self.trajectory = plan.Trajectory( x , u , t , dx )
+        
+        # Create open-loop controller
+        self.open_loop_controller = plan.OpenLoopController( self.trajectory )
+        
+        #
+        self.solution_is_found = True
+        
+        return True
+        
+        
+    ############################
+    def plot_tree(self):
+        """ Plot forward tree, then backward tree and its path in red """
+        
+        ax = RRT.plot_tree(self)
+        
+        x      = self.tree_goal.x
+        parent = self.tree_goal.parent
+        
+        for i in range( 1 , self.tree_goal.size ):
+            ax.plot( 
+            [ x[ i , self.x_axis ] , x[ parent[i] , self.x_axis ] ] , 
+            [ x[ i , self.y_axis ] , x[ parent[i] , self.y_axis ] ] , 'x-')
+            
+        # Backward part of the solution path
+        if self.solution_is_found:
+            for i in self.tree_goal.path( self.connect_node.id )[1:]:
+                ax.plot( 
+                [ x[ i , self.x_axis ] , x[ parent[i] , self.x_axis ] ] , 
+                [ x[ i , self.y_axis ] , x[ parent[i] , self.y_axis ] ] , 'r')
+                
+        self.fig_tree.canvas.draw()
+        
+        return ax
+        
+        
+
+###############################################################################
+class RRTStar( RRT ):
+    """ 
+    Anytime kinodynamic RRT* search
+    ------------------------------------------------------
+    The tree keeps growing until the time budget is over and the best node 
+    within goal_radius of the goal gives the solution. The cost to come of 
+    a node is the sum of cf.g( x , u , t ) * dt * steps along its path.
+    
+    Steering is local: a near node can reach a state if one of the control 
+    options brings it ( with sys.x_next ) within steer_tolerance of the 
+    state. When adding a node, the near node of least cost that can reach 
+    it is chosen as parent, then the near nodes that can be reached with a 
+    lower cost from the new node are rewired. Only the near_max closest
+    nodes within rewire_radius are considered.
+    
+    A node always stores the state reached by steering from its parent:
+    the new node is moved to the steered state and a rewired node is moved
+    with its sub-tree re-integrated from the new parent. A rewiring is
+    discarded if the re-integrated sub-tree hits an invalid transition,
+    gets a higher cost, exceeds max_solution_time or leaves the goal.
+    
+    """
+    
+    ############################
+    def __init__(self, sys , x_start , cost_function = None ):
+        
+        RRT.__init__(self, sys , x_start )
+        
+        if cost_function is None:
+            cost_function = costfunction.TimeCostFunction( sys )
+            cost_function.ontarget_check = False
+        
+        self.cf = cost_function
+        
+        # Params
+        self.rewire_radius   = 1.0   # radius of the near nodes
+        self.near_max        = 10    # max number of near nodes
+        self.steer_tolerance = 0.1   # max distance of local steering
+        self.time_budget     = 10.0  # wall-clock budget [sec]
+        
+        self.dyna_plot = False
+        
+        
+    ############################
+    def edge_cost(self, X , U , T ):
+        """ Cost of applying U ( N x m ) from X ( N x n ) during dt * steps """
+        
+        return self.cf.g_batch( X , U , T ) * self.dt * self.steps
+    
+    
+    ############################
+    def steer(self, X0 , T0 ):
+        """ 
+        Integrate all the control options from each state of X0 ( K x n )
+        
+        return X_next ( K x A x n ) , U ( A x m ) and valid ( K x A )
+        
+        """
+        
+        U = np.array( self.u_options , dtype = float ).reshape( -1 , self.sys.m )
+        
+        K = X0.shape[0]
+        A = U.shape[0]
+        
+        X = np.repeat( X0 , A , axis = 0 )
+        V = np.tile( U , ( K , 1 ) )
+        T = np.repeat( T0 , A )
+        
+        X_next = self.sys.x_next_batch( X , V , T , self.dt , self.steps )
+        valid  = self.sys.isavalidtransition_batch( X , X_next )
+        
+        if self.test_u_domain:
+            valid = valid & self.sys.isavalidinput_batch( X , V )
+        
+        return X_next.reshape( K , A , -1 ) , U , valid.reshape( K , A )
+    
+    
+    ############################
+    def near_nodes(self, x ):
+        """ Return the ids of the near_max closest nodes within rewire_radius """
+        
+        near = self.nn_index.query_radius( x , self.rewire_radius )
+        
+        if near.size > self.near_max:
+        
+            d    = np.linalg.norm( self.tree.x[ near ] - x , axis = 1 )
+            near = near[ np.argpartition( d , self.near_max )[ : self.near_max ] ]
+        
+        return near
+    
+    
+    ############################
+    def choose_parent(self, node , near ):
+        """
+        Return the near node id , input , cost and steered state that best
+        reach node
+        """
+        
+        tree = self.tree
+        
+        parent_id = node.parent.id
+        u         = node.u
+        x         = node.x
+        
+        X = tree.x[ parent_id : parent_id + 1 ]
+        T = tree.t[ parent_id : parent_id + 1 ]
+        
+        cost = tree.cost[ parent_id ] + self.edge_cost( X , u[ None , : ] , T )[0]
+        
+        near = near[ near != parent_id ]
+        
+        if near.size == 0:
+            return parent_id , u , cost , x
+        
+        X_next , U , valid = self.steer( tree.x[ near ] , tree.t[ near ] )
+        
+        d      = np.linalg.norm( X_next - node.x , axis = 2 )
+        k , a  = np.nonzero( valid & ( d < self.steer_tolerance ) )
+        
+        if k.size == 0:
+            return parent_id , u , cost , x
+            
+        # All candidate edges at once
+        i = near[ k ]
+        c = tree.cost[ i ] + self.edge_cost( tree.x[ i ] , U[ a ] , tree.t[ i ] )
+            
+        j = c.argmin()
+                
+        if c[ j ] < cost:
+            return i[ j ] , U[ a[ j ] ] , c[ j ] , X_next[ k[ j ] , a[ j ] ]
+        
+        return parent_id , u , cost , x
+    
+    
+    ############################
+    def propagate(self, node_id , parent_id , u ):
+        """
+        Integrate the sub-tree of node_id from parent_id with input u
+        
+        return the ids ( parents first ) and the new x , t and cost of the
+        sub-tree nodes, or None if a transition is not valid
+        
+        """
+        
+        tree = self.tree
+        
+        level = [ node_id ]
+        
+        X0 = tree.x[ parent_id : parent_id + 1 ]
+        T0 = tree.t[ parent_id : parent_id + 1 ]
+        C0 = tree.cost[ parent_id : parent_id + 1 ]
+        U  = u[ None , : ]
+        
+        ids , X , T , C = [] , [] , [] , []
+        
+        # One batched integration for each level of the sub-tree
+        while level:
+        
+            X1 = self.sys.x_next_batch( X0 , U , T0 , self.dt , self.steps )
+            
+            if not self.sys.isavalidtransition_batch( X0 , X1 ).all():
+                return None
+            
+            T1 = T0 + self.dt * self.steps
+            C1 = C0 + self.edge_cost( X0 , U , T0 )
+            
+            ids.append( level )
+            X.append( X1 )
+            T.append( T1 )
+            C.append( C1 )
+            
+            # Row of the parent of each child in the current level
+            rows  = [ r for r , j in enumerate( level ) for c in tree.children[ j ] ]
+            level = [ c for j in level for c in tree.children[ j ] ]
+            
+            X0 , T0 , C0 = X1[ rows ] , T1[ rows ] , C1[ rows ]
+            U            = tree.u[ level ]
+        
+        return ( np.concatenate( ids ).astype( int ) , np.concatenate( X ) ,
+                 np.concatenate( T ) , np.concatenate( C ) )
+    
+    
+    ############################
+    def rewire(self, node_id , near ):
+        """ Reconnect the near nodes that are reached with a lower cost """
+        
+        tree = self.tree
+        
+        near = near[ near != node_id ]
+        
+        if near.size == 0:
+            return
+        
+        X_next , U , valid = self.steer( tree.x[ node_id : node_id + 1 ] , 
+                                         tree.t[ node_id : node_id + 1 ] )
+        
+        G = self.edge_cost( np.tile( tree.x[ node_id ] , ( U.shape[0] , 1 ) ) ,
+                            U , np.repeat( tree.t[ node_id ] , U.shape[0] ) )
+        
+        # Cost of reaching each near node ( K ) with each option ( A )
+        d    = np.linalg.norm( X_next[0][ : , None , : ] - tree.x[ near ] , axis = 2 )
+        cost = np.where( valid[0][ : , None ] & ( d < self.steer_tolerance ) ,
+                         tree.cost[ node_id ] + G[ : , None ] , np.inf )
+        
+        a    = cost.argmin( axis = 0 )
+        cost = cost[ a , np.arange( near.size ) ]
+        gain = tree.cost[ near ] - cost
+        
+        candidates = np.flatnonzero( gain > self.eps )
+        
+        if candidates.size == 0:
+            return
+        
+        ancestors = tree.path( node_id )
+        moved     = set()
+        
+        # Largest cost reduction first
+        for k in candidates[ np.argsort( - gain[ candidates ] ) ]:
+            
+            i = near[ k ]
+            
+            # States of moved nodes changed since the steering
+            if i in moved or i in ancestors:
+                continue
+            
+            sub = self.propagate( i , node_id , U[ a[ k ] ] )
+                
+            if sub is None:
+                continue
+                
+            ids , x , t , c = sub
+                
+            in_goal  = np.linalg.norm( x - self.x_goal , axis = 1 ) < self.goal_radius
+            was_goal = np.array([ j in self.goal_ids for j in ids ], dtype = bool )
+                
+            if ( ( c > tree.cost[ ids ] ).any() or
+                 ( was_goal & ~in_goal ).any() or
+                 ( ( t >= self.max_solution_time ) &
+                   ( tree.t[ ids ] < self.max_solution_time ) ).any() ):
+                continue
+                
+            # Move the sub-tree
+            tree.set_parent( i , node_id )
+                
+            tree.u[ i ]      = U[ a[ k ] ]
+            tree.x[ ids ]    = x
+            tree.t[ ids ]    = t
+            tree.cost[ ids ] = c
+        
+            self.nn_index.update( x , ids )
+        
+            for j in ids[ ( t < self.max_solution_time ) ]:
+                if j not in self.nn_index.rows:
+                    self.nn_index.add( tree.x[ j ] , j )
+        
+            self.goal_ids.update( ids[ in_goal ] )
+            
+            moved.update( ids )
+    
+    
+    ############################
+    def find_path_to_goal(self, x_goal , time_budget = None ):
+        """ 
+        Grow and rewire the tree until time_budget [sec] is over
+        ---------------------------------------------------------
+        return True if a path was found, False otherwise ( then there is
+        no trajectory )
+        
+        The best cost found vs planning time is kept in self.cost_history
+        
+        """
+        
+        if time_budget is None:
+            time_budget = self.time_budget
+        
+        self.x_goal = x_goal
+        
+        self.init_tree()
+        
+        self.solution_is_found = False
+        self.trajectory        = None
+        
+        self.nodes_computed = 0
+        self.goal_ids       = set()
+        self.cost_history   = []  # ( planning time , best cost )
+        
+        best_cost = np.inf
+        
+        t_start = time.time()
+        
+        while ( time.time() - t_start ) < time_budget:
+            
+            # Exploration:
+            if np.random.rand() > self.alpha :
+                x_random = x_goal
+            else:
+                x_random = self.rand_state()
+                
+            self.randomized_input = False
+            
+            node_near = self.nearest_neighbor( x_random )
+            
+            if node_near is None:
+                continue
+            
+            new_node = self.select_control_input( x_random , node_near )
+            
+            if new_node is None:
+                continue
+            
+            near = self.near_nodes( new_node.x )
+            
+            # Best parent
+            parent_id , u , cost , x = self.choose_parent( new_node , near )
+            
+            new_node.parent = TreeNode( self.tree , parent_id )
+            new_node.u      = u
+            new_node.x      = x
+            new_node.t      = self.tree.t[ parent_id ] + self.dt * self.steps
+            
+            node_id = self.add_node( new_node ).id
+            
+            self.tree.cost[ node_id ] = cost
+            
+            self.nodes_computed = self.nodes_computed + 1
+            
+            if np.linalg.norm( new_node.x - x_goal ) < self.goal_radius:
+                self.goal_ids.add( node_id )
+            
+            # Rewire near nodes
+            self.rewire( node_id , near )
+            
+            # Best solution
+            if self.goal_ids:
+                ids   = np.fromiter( self.goal_ids , dtype = int )
+                costs = self.tree.cost[ ids ]
+                
+                if costs.min() < best_cost:
+                    best_cost = costs.min()
+                    
+                    self.goal_node = TreeNode( self.tree , ids[ costs.argmin() ] )
+                    
+                    self.cost_history.append( ( time.time() - t_start , 
+                                                best_cost ) )
+                    
+        if not self.goal_ids:
+            print('\n-----------------------------------------------',
+                  '\nRRT* did not find a path to the goal',
+                  '\n-----------------------------------------------')
+            return False
+        
+        print('\n-----------------------------------------------',
+              '\nRRT* found a path to the goal',
+              '\n( cost = ', best_cost, ' total node number = ', 
+              self.nodes_computed, ' )',
+              '\n-----------------------------------------------')
+        
+        # Compute Path
+        self.compute_path_to_goal()
+        
+        return True
+    
+    
+    ############################
+    def plot_cost_history(self):
+        """ Plot best solution cost vs planning time """
+        
+        history = np.array( self.cost_history ).reshape( -1 , 2 )
+        
+        fig = plt.figure( figsize = self.figsize , dpi = self.dpi )
+        ax  = fig.add_subplot(111)
+        
+        ax.step( history[:,0] , history[:,1] , where = 'post' )
+        
+        ax.set_xlabel( 'Planning time [sec]' , fontsize = self.fontsize )
+        ax.set_ylabel( 'Solution cost'       , fontsize = self.fontsize )
+        
+        ax.grid(True)
+        ax.tick_params( labelsize = self.fontsize )
+        
+        fig.tight_layout()
+        fig.show()
+        
+        return ax
+        
+        
+
+###############################################################################
+def parallel_rrt_worker( args ):
+    """ 
+    Grow one independently seeded tree in a worker process
+    ------------------------------------------------------
+    args = ( planner , x_goal , seed , deadline )
+    
+    return ( seed , pid , succes , trajectory , nodes , elapsed time )
+    
+    """
+    
+    planner , x_goal , seed , deadline = args
+    
+    np.random.seed( seed )
+    
+    planner.dyna_plot = False
+    
+    t_start = time.time()
+    
+    succes = planner.search( x_goal , deadline - t_start )
+    
+    elapsed = time.time() - t_start
+    
+    trajectory = None
+    
+    if succes:
+        planner.compute_path_to_goal()
+        trajectory = planner.trajectory
+        
+    return ( seed , os.getpid() , succes , trajectory , 
+             planner.nodes_computed , elapsed )
+    
+    
+###############################################################################
+class ParallelRRT:
+    """ 
+    K independently seeded RRT searches in a pool of processes
+    ----------------------------------------------------------
+    planner : RRT with the system, start state, inputs and parameters 
+              used by all the trees
+    
+    mode = 'first' : return the first solution found
+    mode = 'best'  : return the shortest solution found within time_budget
+    
+    """
+    
+    ############################
+    def __init__(self, planner , workers = None ):
+        
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+            
+        self.planner = planner
+        self.workers = workers
+        
+        # Params
+        self.trees_n     = workers  # number of independently seeded trees
+        self.time_budget = 60.0     # wall-clock budget [sec]
+        self.mode        = 'first'
+        self.seed        = 0        # seed of the first tree
+        
+        # Init
+        self.solution_is_found = False
+        
+        
+    ############################
+    def find_path_to_goal(self, x_goal ):
+        """ Return True if a solution was found within the time budget """
+        
+        deadline = time.time() + self.time_budget
+        
+        args = [ ( self.planner , x_goal , self.seed + k , deadline ) 
+                 for k in range( self.trees_n ) ]
+        
+        self.results    = []
+        self.trajectory = None
+        
+        pool = multiprocessing.Pool( self.workers )
+        
+        try:
+            for result in pool.imap_unordered( parallel_rrt_worker , args ):
+                
+                self.results.append( result )
+                
+                trajectory = result[3]
+                
+                if trajectory is None:
+                    continue
+                
+                if ( self.trajectory is None or 
+                     trajectory.time_final < self.trajectory.time_final ):
+                    self.trajectory = trajectory
+                    
+                if self.mode == 'first':
+                    break
+        finally:
+            pool.terminate()
+            pool.join()
+            
+        self.print_stats()
+        
+        self.solution_is_found = self.trajectory is not None
+        
+        if self.solution_is_found:
+            
+            # Create open-loop controller
+            self.open_loop_controller = plan.OpenLoopController( self.trajectory )
+            
+            print('\n-----------------------------------------------',
+                  '\nParallel RRT found a path to the goal',
+                  '\n-----------------------------------------------')
+        else:
+            print('\n-----------------------------------------------',
+                  '\nParallel RRT did not find a path to the goal',
+                  '\n-----------------------------------------------')
+            
+        return self.solution_is_found
+    
+    
+    ############################
+    def print_stats(self):
+        """ Print the nodes per second of each tree and each worker """
+        
+        workers = {}
+        
+        for seed , pid , succes , trajectory , nodes , elapsed in self.results:
+            
+            print('Tree seed:', seed , ' worker:', pid , ' nodes:', nodes , 
+                  ' nodes/sec:', nodes / max( elapsed , 1E-9 ) , 
+                  ' solution:', succes )
+            
+            n , t = workers.get( pid , ( 0 , 0. ) )
+            workers[ pid ] = ( n + nodes , t + elapsed )
+            
+        self.nodes_per_sec = {}
+            
+        for pid , ( nodes , elapsed ) in workers.items():
+            
+            self.nodes_per_sec[ pid ] = nodes / max( elapsed , 1E-9 )
+            
+            print('Worker:', pid , ' nodes/sec:', self.nodes_per_sec[ pid ] )
+            
+            
+    ############################
+    def save_solution(self, name = 'RRT_Solution.npy' ):
+        
+        self.trajectory.save( name )
+        
+    ############################
+    def plot_open_loop_solution(self, params = 'xu' ):
+        
+        self.trajectory.plot_trajectory( self.planner.sys , params )
+        
+        
+
 '''
 #################################################################
 ##################          Main                         ########
@@ -5,11 +5,15 @@ Created on Wed Jul 12 12:09:37 2017
 @author: alxgr
 """
 
+import heapq
+import multiprocessing
+from multiprocessing import shared_memory
+
 import numpy as np
 import matplotlib.pyplot as plt
+from scipy import sparse
 from scipy.interpolate import RectBivariateSpline as interpol2D
-from scipy.interpolate import griddata
-from scipy.interpolate import LinearNDInterpolator
+from scipy.interpolate import RegularGridInterpolator
 
 from pyro.control import controller
 
@@ -62,8 +66,109 @@ class ViController( controller.StaticController ) :
     
     
 
-class ValueIteration_2D:
-    """ Dynamic programming for 2D continous dynamic system, one continuous input u """
+'''
+################################################################################
+'''
+
+###############################
+def bellman_backup( P , G , isok , J , INF ):
+    """ 
+    Bellman backup of a set of nodes
+    ------------------------------------------
+    P    : ( nodes x actions , nodes_n ) sparse transition matrix rows
+    G    : ( nodes , actions ) step costs
+    isok : ( nodes , actions ) allowable actions
+    J    : ( nodes_n ) cost-to-go of all nodes
+    INF  : cost of impossible situations
+    
+    return new cost-to-go and best action of the nodes
+    
+    """
+    
+    # Cost-to-go of all actions - Q values
+    Q = G + P.dot( J ).reshape( G.shape )
+    
+    # Not allowable states or inputs/states combinations
+    Q[ ~isok ] = INF
+    
+    J_new  = Q.min( axis = 1 )
+    policy = Q.argmin( axis = 1 )
+    
+    # Impossible situation ( unaceptable situation for any control actions )
+    policy[ J_new > ( INF - 1 ) ] = -1
+    
+    return J_new , policy
+
+
+# Data of the parallel value iteration worker processes
+worker_data = {}
+
+
+###############################
+def parallel_worker_init( P , G , isok , INF , shm_names , nodes_n ):
+    """ Keep transitions and attach the shared memory in a worker process """
+    
+    worker_data['P']    = P
+    worker_data['G']    = G
+    worker_data['isok'] = isok
+    worker_data['INF']  = INF
+    
+    # Keep references, the buffers are released when the worker exits
+    worker_data['shm'] = [ shared_memory.SharedMemory( name = name ) 
+                           for name in shm_names ]
+    
+    buffers = [ shm.buf for shm in worker_data['shm'] ]
+    
+    worker_data['J']      = np.ndarray( nodes_n , float    , buffers[0] )
+    worker_data['J_new']  = np.ndarray( nodes_n , float    , buffers[1] )
+    worker_data['policy'] = np.ndarray( nodes_n , np.int64 , buffers[2] )
+    
+    
+###############################
+def parallel_worker_backup( partition ):
+    """ 
+    Bellman backup of a partition ( start , stop ) of nodes in a worker,
+    results are written in the shared J_new and policy arrays
+    """
+    
+    start , stop = partition
+    
+    actions_n = worker_data['G'].shape[1]
+    
+    # Rows of the partition as views of the CSR arrays ( no copy )
+    P      = worker_data['P']
+    indptr = P.indptr[ start * actions_n : stop * actions_n + 1 ]
+    P      = sparse.csr_matrix( ( P.data[ indptr[0] : indptr[-1] ] , 
+                                  P.indices[ indptr[0] : indptr[-1] ] , 
+                                  indptr - indptr[0] ) , 
+                                shape = ( indptr.size - 1 , P.shape[1] ) , 
+                                copy = False )
+    
+    G    = worker_data['G'][ start : stop ]
+    isok = worker_data['isok'][ start : stop ]
+    
+    J_new , policy = bellman_backup( P , G , isok , worker_data['J'] , 
+                                     worker_data['INF'] )
+    
+    worker_data['J_new'][ start : stop ]  = J_new
+    worker_data['policy'][ start : stop ] = policy
+    
+    
+
+'''
+################################################################################
+'''
+
+
+class ValueIteration_ND:
+    """ 
+    Dynamic programming for continous dynamic system of any dimension
+    ------------------------------------------------------------------
+    The sparse interpolation matrix P of the next states of all 
+    node-action pairs is computed once by the grid, then each Bellman 
+    backup is g + P * J followed by a min over a ( nodes , actions ) array.
+    
+    """
     
     ############################
     def __init__(self, grid_sys , cost_function ):
@@ -81,132 +186,517 @@ class ValueIteration_2D:
         # Print params
         self.fontsize = 10
         
-        
         # Options
         self.uselookuptable = True
         
+        self.block_size     = 1000   # nodes per block of in-place sweeps
+        
+        # Precomputed transitions
+        self.transitions_are_computed = False
+        
+        # Convergence
+        self.residual_history = []
+        
+        # Prioritized sweeping
+        self.priority   = None  # bound of the Bellman residual of each node
+        self.priority_J = None  # cost-to-go array of the priorities
+        self.queue      = []    # heap of ( - priority , node )
+        
         
     ##############################
     def initialize(self):
         """ initialize cost-to-go and policy """
 
-        self.J             = np.zeros( self.grid_sys.xgriddim , dtype = float )
-        self.action_policy = np.zeros( self.grid_sys.xgriddim , dtype = int   )
+        # Final Cost
+        J_1D = np.zeros( self.grid_sys.nodes_n , dtype = float )
+        
+        # For all state nodes
+        for node in range( self.grid_sys.nodes_n ):
+            J_1D[node] = self.cf.h( self.grid_sys.nodes_state[ node , : ] )
+        
+        self.J             = J_1D.reshape( self.grid_sys.xgriddim )
+        self.action_policy = np.zeros( self.grid_sys.xgriddim , dtype = int )
 
         self.Jnew          = self.J.copy()
         self.Jplot         = self.J.copy()
+        
+        self.residual_history = []
 
-        # Initial evaluation
         
-        # For all state nodes        
-        for node in range( self.grid_sys.nodes_n ):  
+    ##############################
+    def compute_transitions(self):
+        """ 
+        Compute validity, step costs and the sparse interpolation matrix
+        of the next states of all node-action pairs 
+        """
             
-                x = self.grid_sys.nodes_state[ node , : ]
+        nodes_n   = self.grid_sys.nodes_n
+        actions_n = self.grid_sys.actions_n
                 
-                i = self.grid_sys.nodes_index[ node , 0 ]
-                j = self.grid_sys.nodes_index[ node , 1 ]
+        # Interpolation matrix of J at next states: J_next = P * J
+        self.P = self.grid_sys.compute_interpolation_matrix( self.uselookuptable )
                 
-                # Final Cost
-                self.J[i,j] = self.cf.h( x )
+        isok = np.asarray( self.grid_sys.action_isok ).reshape( nodes_n * actions_n )
+        
+        # Step costs
+        G = np.zeros( nodes_n * actions_n , dtype = float ) + self.cf.INF
+        
+        ok = np.flatnonzero( isok )
+            
+        X = self.grid_sys.nodes_state[   ok // actions_n , : ]
+        U = self.grid_sys.actions_input[ ok  % actions_n , : ]
+            
+        G[ ok ] = self.cf.g_batch( X , U )
+        
+        self.action_isok = isok.reshape( nodes_n , actions_n )
+        self.G           = G.reshape( nodes_n , actions_n )
+        
+        # Predecessors of each node, computed for prioritized sweeping
+        self.P_T        = None
+        self.priority_J = None
+        
+        self.transitions_are_computed = True
                         
                 
     ###############################
-    def compute_step(self):
-        """ One step of value iteration """
+    def backup(self, J , nodes = None ):
+        """ 
+        Bellman backup of a set of nodes
+        ------------------------------------------
+        J     : ( nodes_n ) cost-to-go of all nodes
+        nodes : None (all nodes), slice or array of nodes #
+        
+        return new cost-to-go and best action of the nodes
+        
+        """
+        
+        actions_n = self.grid_sys.actions_n
+        
+        if nodes is None:
+            P    = self.P
+            G    = self.G
+            isok = self.action_isok
+            
+        elif isinstance( nodes , slice ):
+            P    = self.P[ nodes.start * actions_n : nodes.stop * actions_n ]
+            G    = self.G[ nodes ]
+            isok = self.action_isok[ nodes ]
+            
+        else:
+            rows = ( nodes[:,None] * actions_n + np.arange( actions_n ) ).reshape( -1 )
+            P    = self.P[ rows ]
+            G    = self.G[ nodes ]
+            isok = self.action_isok[ nodes ]
+        
+        return bellman_backup( P , G , isok , J , self.cf.INF )
+    
+    
+    ###############################
+    def compute_residual(self, J , J_new ):
+        """ Max change of cost-to-go, ignoring nodes that stay impossible """
+        
+        delta = np.abs( J_new - J )
+        
+        impossible = ( J_new > ( self.cf.INF - 1 ) ) & ( J > ( self.cf.INF - 1 ) )
+        
+        delta[ impossible ] = 0
+        
+        return delta.max()
+    
+    
+    ###############################
+    def compute_step_jacobi(self):
+        """ One synchronous sweep of value iteration, return the residual """
+        
+        if not self.transitions_are_computed:
+            self.compute_transitions()
+        
+        J = self.J.reshape( self.grid_sys.nodes_n )
+        
+        J_new , policy = self.backup( J )
+        
+        self.Jnew          = J_new.reshape( self.grid_sys.xgriddim )
+        self.action_policy = policy.reshape( self.grid_sys.xgriddim )
+        
+        residual = self.compute_residual( J , J_new )
+        
+        self.J = self.Jnew.copy()
+        
+        self.residual_history.append( residual )
+        
+        return residual
+        
+        
+    ###############################
+    def compute_step_gauss_seidel(self, nodes = None ):
+        """ 
+        One in-place sweep of value iteration, return the residual
+        ---------------------------------------------------------------
+        nodes : array of nodes # in the order of the sweep, default is all
+                nodes in blocks of block_size contiguous nodes
+        
+        Each block of nodes uses the cost-to-go already updated by the 
+        previous blocks.
+        
+        """
+        
+        if not self.transitions_are_computed:
+            self.compute_transitions()
+        
+        nodes_n = self.grid_sys.nodes_n
+        
+        J      = self.J.reshape( nodes_n ).copy()
+        J_old  = J.copy()
+        policy = self.action_policy.reshape( nodes_n ).copy()
+        
+        if nodes is None:
+            blocks = [ slice( start , min( start + self.block_size , nodes_n ) ) 
+                       for start in range( 0 , nodes_n , self.block_size ) ]
+        else:
+            blocks = [ nodes[ start : start + self.block_size ] 
+                       for start in range( 0 , nodes.size , self.block_size ) ]
+        
+        for block in blocks:
+            J[ block ] , policy[ block ] = self.backup( J , block )
+        
+        self.J             = J.reshape( self.grid_sys.xgriddim )
+        self.Jnew          = self.J.copy()
+        self.action_policy = policy.reshape( self.grid_sys.xgriddim )
+        
+        residual = self.compute_residual( J_old , J )
+        
+        self.residual_history.append( residual )
+        
+        return residual
+    
+    
+    ###############################
+    def compute_step_prioritized(self, tol = 1E-3 ):
+        """ 
+        Prioritized sweeping, return the residual
+        ---------------------------------------------------------------
+        Each node has a priority, an upper bound of its Bellman residual,
+        and the nodes of priority larger than tol are kept in a priority
+        queue. Blocks of the block_size nodes of largest priority are backed
+        up in place. Then only the predecessors of the changed nodes, read
+        from the transposed interpolation matrix, are re-prioritized: their
+        priority is increased by max_a sum_s P( s | node , a ) | dJ( s ) |.
+        A step stops after nodes_n backups or when the queue is empty.
+        
+        The residual is the largest priority, ignoring the nodes that stay
+        impossible. The priorities of all nodes are computed by a full
+        backup only when self.J was not last modified by this method.
+        
+        """
+        
+        if not self.transitions_are_computed:
+            self.compute_transitions()
+        
+        nodes_n   = self.grid_sys.nodes_n
+        actions_n = self.grid_sys.actions_n
         
-        # Get interpolation of current cost space
-        J_interpol = interpol2D( self.grid_sys.xd[0] , self.grid_sys.xd[1] , self.J , bbox=[None, None, None, None], kx=1, ky=1,)
+        J      = self.J.reshape( nodes_n )
+        policy = self.action_policy.reshape( nodes_n )
         
-        # For all state nodes        
-        for node in range( self.grid_sys.nodes_n ):  
+        # Rows of the node-action pairs leading to each node
+        if self.P_T is None:
+            self.P_T = self.P.T.tocsr()
+        
+        if self.priority_J is not self.J:
+        
+            # Bellman residual of all nodes
+            J_new , _ = self.backup( J )
+        
+            self.priority = np.abs( J_new - J )
+            self.queue    = []
+            
+            self.push( np.flatnonzero( self.priority > tol ) )
+        
+        priority = self.priority
+        queue    = self.queue
+        backups  = 0
+        
+        while backups < nodes_n and queue and - queue[0][0] > tol:
+        
+            # Nodes of largest priority, skipping outdated queue entries
+            block = []
+            
+            while ( queue and len( block ) < self.block_size and
+                    - queue[0][0] > tol ):
+                
+                p , i = heapq.heappop( queue )
+                
+                if - p == priority[ i ]:
+                    block.append( i )
+                    priority[ i ] = 0
+            
+            if not block:
+                break
+            
+            block = np.array( block , dtype = int )
+            
+            J_old = J[ block ]
+            
+            J[ block ] , policy[ block ] = self.backup( J , block )
+            
+            backups = backups + block.size
+            
+            dJ = np.abs( J[ block ] - J_old )
+            
+            changed = dJ > 0
+            
+            if not changed.any():
+                continue
+            
+            # Bound of the change of Q of the node-action pairs leading to
+            # the changed nodes
+            P_in = self.P_T[ block[ changed ] ]
+            
+            rows , k = np.unique( P_in.indices , return_inverse = True )
+            
+            dQ = np.bincount( k , weights = P_in.data *
+                              np.repeat( dJ[ changed ] , np.diff( P_in.indptr ) ) )
+            
+            # Max over the actions of each predecessor ( rows are sorted )
+            preds = rows // actions_n
+            first = np.flatnonzero( np.diff( preds , prepend = -1 ) )
+            preds = preds[ first ]
+            
+            priority[ preds ] += np.maximum.reduceat( dQ , first )
+            
+            self.push( preds[ priority[ preds ] > tol ] )
+        
+        # Drop the outdated queue entries
+        if len( queue ) > 2 * nodes_n:
+            self.queue = []
+            self.push( np.flatnonzero( priority > tol ) )
+        
+        self.J             = J.reshape( self.grid_sys.xgriddim )
+        self.Jnew          = self.J.copy()
+        self.action_policy = policy.reshape( self.grid_sys.xgriddim )
+        self.priority_J    = self.J
+        
+        # Nodes that stay impossible even if J decreases by its priority
+        INF        = self.cf.INF - 1
+        impossible = ( J > INF ) & ( ( J - priority ) > INF )
+        
+        residual = np.where( impossible , 0 , priority ).max()
+        
+        self.residual_history.append( residual )
+        
+        return residual
+    
+    
+    ###############################
+    def push(self, nodes ):
+        """ Add nodes to the prioritized sweeping queue """
+        
+        for p , i in zip( ( - self.priority[ nodes ] ).tolist() , nodes.tolist() ):
+            heapq.heappush( self.queue , ( p , i ) )
+    
+    
+    ###############################
+    def compute_step_policy_iteration(self, eval_steps = 10 ):
+        """ 
+        One step of modified policy iteration, return the residual
+        ---------------------------------------------------------------
+        Policy improvement with a Bellman backup, then eval_steps sweeps 
+        of policy evaluation J = g_pi + P_pi * J with sparse mat-vec
+        
+        """
+        
+        if not self.transitions_are_computed:
+            self.compute_transitions()
+        
+        nodes_n   = self.grid_sys.nodes_n
+        actions_n = self.grid_sys.actions_n
             
-                x = self.grid_sys.nodes_state[ node , : ]
+        J = self.J.reshape( nodes_n )
                 
-                i = self.grid_sys.nodes_index[ node , 0 ]
-                j = self.grid_sys.nodes_index[ node , 1 ]
+        # Policy improvement
+        J_new , policy = self.backup( J )
 
-                # One steps costs - Q values
-                Q = np.zeros( self.grid_sys.actions_n  ) 
+        residual = self.compute_residual( J , J_new )
                 
-                # For all control actions
-                for action in range( self.grid_sys.actions_n ):
-                    
-                    u = self.grid_sys.actions_input[ action , : ]
+        # Transitions of the policy
+        valid = np.flatnonzero( policy >= 0 )
+        rows  = valid * actions_n + policy[ valid ]
                     
-                    # Compute next state and validity of the action                    
+        P_pi  = self.P[ rows ]
+        g_pi  = self.G.reshape( -1 )[ rows ]
                     
-                    if self.uselookuptable:
-                        
-                        x_next        = self.grid_sys.x_next[node,action,:]
-                        action_isok   = self.grid_sys.action_isok[node,action]
-                        
-                    else:
-                        
-                        x_next        = self.sys.f( x , u ) * self.dt + x
-                        x_ok          = self.sys.isavalidstate(x_next)
-                        u_ok          = self.sys.isavalidinput(x,u)
-                        action_isok   = ( u_ok & x_ok )
+        # Policy evaluation
+        for k in range( eval_steps ):
+            J_new[ valid ] = g_pi + P_pi.dot( J_new )
                     
-                    # If the current option is allowable
-                    if action_isok:
-                        
-                        J_next = J_interpol( x_next[0] , x_next[1] )
-                        
-                        # Cost-to-go of a given action
-                        Q[action] = self.cf.g( x , u ) + J_next[0,0]
-                        
-                    else:
-                        # Not allowable states or inputs/states combinations
-                        Q[action] = self.cf.INF
-                        
-                        
-                self.Jnew[i,j]          = Q.min()
-                self.action_policy[i,j] = Q.argmin()
+        self.J             = J_new.reshape( self.grid_sys.xgriddim )
+        self.Jnew          = self.J.copy()
+        self.action_policy = policy.reshape( self.grid_sys.xgriddim )
+        
+        self.residual_history.append( residual )
+        
+        return residual
                 
-                # Impossible situation ( unaceptable situation for any control actions )
-                if self.Jnew[i,j] > (self.cf.INF-1) :
-                    self.action_policy[i,j]      = -1
+                
+    ###############################
+    def compute_step(self):
+        """ One step of value iteration """
+        
+        J_old = self.J
         
+        self.compute_step_jacobi()
         
         # Convergence check        
-        delta = self.J - self.Jnew
+        delta = J_old - self.Jnew
         j_max     = self.Jnew.max()
         delta_max = delta.max()
         delta_min = delta.min()
         print('Max:',j_max,'Delta max:',delta_max, 'Delta min:',delta_min)
         
-        self.J = self.Jnew.copy()
-        
 
+    ################################
+    def compute_steps(self, l = 50, plot = False):
+        """ compute number of step """
+               
+        for i in range(l):
+            print('Step:',i)
+            self.compute_step()
+            
+            
+    ################################
+    def solve(self, method = 'jacobi' , tol = 1E-3 , max_steps = 1000 , 
+              eval_steps = 10 ):
+        """ 
+        Iterate until the residual is smaller than tol
+        ------------------------------------------------
+        method = 'jacobi'           : synchronous sweeps
+        method = 'gauss-seidel'     : in-place sweeps
+        method = 'prioritized'      : prioritized sweeping, in-place backups
+                                      of the nodes of largest Bellman
+                                      residual
+        method = 'policy-iteration' : modified policy iteration with 
+                                      eval_steps evaluation sweeps
+        
+        return the residual of each step
+        
+        """
+        
+        self.residual_history = []
+        
+        for i in range( max_steps ):
+            
+            if method == 'jacobi':
+                residual = self.compute_step_jacobi()
+            elif method == 'gauss-seidel':
+                residual = self.compute_step_gauss_seidel()
+            elif method == 'prioritized':
+                residual = self.compute_step_prioritized( tol )
+            elif method == 'policy-iteration':
+                residual = self.compute_step_policy_iteration( eval_steps )
+            else:
+                raise ValueError('not a valid value iteration method')
+            
+            print('Step:', i , 'Residual:', residual )
+            
+            if residual < tol:
+                print('Converged after', i + 1 , 'steps')
+                break
+            
+        return np.array( self.residual_history )
+            
+            
+    ################################
+    def compute_u_policy_grid(self):
+        """ grid of optimal control inputs """
+        
+        self.u_policy_grid = []
+        
+        policy = self.action_policy.reshape( self.grid_sys.nodes_n )
+        
+        # for all inputs
+        for k in range(self.sys.m):
+            
+            u = self.grid_sys.actions_input[ policy , k ]
+            
+            # If no action is good
+            u[ policy == -1 ] = 0
+            
+            self.u_policy_grid.append( u.reshape( self.grid_sys.xgriddim ) )
+            
+            
     ################################
     def assign_interpol_controller(self):
         """ controller from optimal actions """
         
-        # Compute grid of u
-        self.u_policy_grid    = []
+        self.compute_u_policy_grid()
+        
+        # Compute Interpol function
+        self.x2u_interpol_functions = []
         
         # for all inputs
         for k in range(self.sys.m):
-            self.u_policy_grid.append( np.zeros( self.grid_sys.xgriddim , dtype = float ) )
+            self.x2u_interpol_functions.append(
+                    RegularGridInterpolator( self.grid_sys.xd , 
+                                             self.u_policy_grid[k] ) )
+        
+        # Asign Controller
+        self.ctl.vi_law = self.vi_law
+        
+        
+    ################################
+    def vi_law(self, x , t = 0 ):
+        """ controller from optimal actions """
+        
+        # Saturate on the grid domain
+        x = np.clip( x , self.sys.x_lb , self.sys.x_ub )
+        
+        u = np.zeros( self.sys.m )
+        
+        # for all inputs
+        for k in range(self.sys.m):
+            u[k] = self.x2u_interpol_functions[k]( x )[0]
+        
+        return u
+    
+    
+    ################################
+    def load_data(self, name = 'DP_data'):
+        """ Save optimal controller policy and cost to go """
         
-        # For all state nodes        
-        for node in range( self.grid_sys.nodes_n ):  
+        try:
+
+            self.J              = np.load( name + '_J'  + '.npy' )
+            self.action_policy  = np.load( name + '_a'  + '.npy' ).astype(int)
             
-                i = self.grid_sys.nodes_index[ node , 0 ]
-                j = self.grid_sys.nodes_index[ node , 1 ]
-                
-                # If no action is good
-                if ( self.action_policy[i,j] == -1 ):
-                    
-                    # for all inputs
-                    for k in range(self.sys.m):
-                        self.u_policy_grid[k][i,j] = 0 
-                    
-                else:
-                    # for all inputs
-                    for k in range(self.sys.m):
-                        self.u_policy_grid[k][i,j] = self.grid_sys.actions_input[ self.action_policy[i,j] , k ]
+        except:
+            
+            print('Failed to load DP data ' )
+        
+        
+    ################################
+    def save_data(self, name = 'DP_data'):
+        """ Save optimal controller policy and cost to go """
+        
+        np.save( name + '_J'  , self.J                        )
+        np.save( name + '_a'  , self.action_policy.astype(int))
+    
+    
+    
+'''
+################################################################################
+'''
+    
+
+class ValueIteration_2D( ValueIteration_ND ):
+    """ Dynamic programming for 2D continous dynamic system, one continuous input u """
+        
+
+    ################################
+    def assign_interpol_controller(self):
+        """ controller from optimal actions """
         
+        # Compute grid of u
+        self.compute_u_policy_grid()
 
         # Compute Interpol function
         self.x2u_interpol_functions = []
@@ -236,17 +726,6 @@ class ValueIteration_2D:
             u[k] = self.x2u_interpol_functions[k]( x[0] , x[1] )
         
         return u
-    
-    
-    
-    ################################
-    def compute_steps(self, l = 50, plot = False):
-        """ compute number of step """
-               
-        for i in range(l):
-            print('Step:',i)
-            self.compute_step()
-            
             
                 
     ################################
@@ -317,29 +796,6 @@ class ValueIteration_2D:
         plt.tight_layout() 
         
         
-    ################################
-    def load_data(self, name = 'DP_data'):
-        """ Save optimal controller policy and cost to go """
-        
-        try:
-
-            self.J              = np.load( name + '_J'  + '.npy' )
-            self.action_policy  = np.load( name + '_a'  + '.npy' ).astype(int)
-            
-        except:
-            
-            print('Failed to load DP data ' )
-        
-        
-    ################################
-    def save_data(self, name = 'DP_data'):
-        """ Save optimal controller policy and cost to go """
-        
-        np.save( name + '_J'  , self.J                        )
-        np.save( name + '_a'  , self.action_policy.astype(int))
-        
-        
-        
         
 '''
 ################################################################################
@@ -349,182 +805,46 @@ class ValueIteration_2D:
 class ValueIteration_3D( ValueIteration_2D ):
     """ Dynamic programming for 3D continous dynamic system, 2 continuous input u """
     
-    ############################
-    def __init__(self, grid_sys , cost_function ):
-        
-        # Dynamic system
-        self.grid_sys = grid_sys        # Discretized Dynamic system class
-        self.sys      = grid_sys.sys     # Base Dynamic system class
-        
-        # Controller
-        self.ctl = ViController( self.sys.n , self.sys.m , self.sys.n)
-        
-        # Cost function
-        self.cf  = cost_function
-        
-        # Options
-        self.uselookuptable = False
-        
-        
     ##############################
     def initialize(self):
         """ initialize cost-to-go and policy """
 
-        self.J             = np.zeros( self.grid_sys.xgriddim , dtype = float )
-        self.J_1D          = np.zeros( self.grid_sys.nodes_n  , dtype = float )
-        self.action_policy = np.zeros( self.grid_sys.xgriddim , dtype = int   )
+        ValueIteration_2D.initialize( self )
 
-        self.Jnew          = self.J.copy()
+        self.J_1D          = self.J.reshape( self.grid_sys.nodes_n )
         self.J_1D_new      = self.J_1D.copy()
-        self.Jplot         = self.J.copy()
-
-        # Initial evaluation
-        
-        # For all state nodes        
-        for node in range( self.grid_sys.nodes_n ):  
-            
-                x = self.grid_sys.nodes_state[ node , : ]
-                
-                i = self.grid_sys.nodes_index[ node , 0 ]
-                j = self.grid_sys.nodes_index[ node , 1 ]
-                k = self.grid_sys.nodes_index[ node , 2 ]
-                
-                # Final Cost
-                j               = self.cf.h( x )
-                self.J[i,j,k]   = j
-                self.J_1D[node] = j
                         
                 
     ###############################
     def compute_step(self):
         """ One step of value iteration """
         
-        # Get interpolation of current cost space
-        #J_interpol = interpol2D( self.grid_sys.xd[0] , self.grid_sys.xd[1] , self.J , bbox=[None, None, None, None], kx=1, ky=1,)
-        
-        cartcoord   = self.grid_sys.nodes_state
-        values      = self.J_1D
-        J_interpol  = LinearNDInterpolator(cartcoord, values, fill_value=0)
-        
-        
-        # For all state nodes        
-        for node in range( self.grid_sys.nodes_n ):  
-            
-                x = self.grid_sys.nodes_state[ node , : ]
-                
-                i = self.grid_sys.nodes_index[ node , 0 ]
-                j = self.grid_sys.nodes_index[ node , 1 ]
-                k = self.grid_sys.nodes_index[ node , 2 ]
-
-                # One steps costs - Q values
-                Q = np.zeros( self.grid_sys.actions_n  ) 
-                
-                # For all control actions
-                for action in range( self.grid_sys.actions_n ):
-                    
-                    u = self.grid_sys.actions_input[ action , : ]
-                    
-                    # Compute next state and validity of the action                    
-                    x_next        = self.sys.f( x , u ) * self.grid_sys.dt + x
-                    x_ok          = self.sys.isavalidstate(x_next)
-                    u_ok          = self.sys.isavalidinput(x,u)
-                    action_isok   = ( u_ok & x_ok )
-                    
-                    # If the current option is allowable
-                    if action_isok:
-                        
-                        J_next = J_interpol( x_next )
-                        
-                        # Cost-to-go of a given action
-                        Q[action] = self.cf.g( x , u ) + J_next
-                        
-                    else:
-                        # Not allowable states or inputs/states combinations
-                        Q[action] = self.cf.INF
-                        
-                        
-                self.Jnew[i,j,k]          = Q.min()
-                self.J_1D_new[node]       = self.Jnew[i,j,k]
-                self.action_policy[i,j,k] = Q.argmin()
-                
-                # Impossible situation ( unaceptable situation for any control actions )
-                if self.Jnew[i,j,k] > (self.cf.INF-1) :
-                    self.action_policy[i,j,k]     = -1
-        
-        
-        # Convergence check        
-        delta = self.J - self.Jnew
-        j_max     = self.Jnew.max()
-        delta_max = delta.max()
-        delta_min = delta.min()
-        print('Max:',j_max,'Delta max:',delta_max, 'Delta min:',delta_min)
+        ValueIteration_2D.compute_step( self )
         
-        self.J    = self.Jnew.copy()
-        self.J_1D = self.J_1D_new.copy()
+        self.J_1D     = self.J.reshape( self.grid_sys.nodes_n )
+        self.J_1D_new = self.J_1D.copy()
 
         
     ################################
     def assign_interpol_controller(self):
         """ controller from optimal actions """
         
-        # Compute grid of u
-        self.u_policy_grid    = []
-        self.u_policy_1D      = []
-        
-        # for all inputs
-        for k in range(self.sys.m):
-            self.u_policy_grid.append( np.zeros( self.grid_sys.xgriddim , dtype = float ) )
-            self.u_policy_1D.append( np.zeros( self.grid_sys.nodes_n , dtype = float ) )
-        
-        # For all state nodes        
-        for node in range( self.grid_sys.nodes_n ):
-            
-            i = self.grid_sys.nodes_index[ node , 0 ]
-            j = self.grid_sys.nodes_index[ node , 1 ]
-            k = self.grid_sys.nodes_index[ node , 2 ]
-            
-            # If no action is good
-            if ( self.action_policy[i,j,k] == -1 ):
-                
-                # for all inputs
-                for k in range(self.sys.m):
-                    self.u_policy_grid[k][i,j,k] = 0 
-                    self.u_policy_1D[k][node]    = 0
-                
-            else:
-                # for all inputs
-                for k in range(self.sys.m):
-                    self.u_policy_grid[k][i,j,k] = self.grid_sys.actions_input[ self.action_policy[i,j,k] , k ]
-                    self.u_policy_1D[k][node]    = self.grid_sys.actions_input[ self.action_policy[i,j,k] , k ]
-        
-        
-        # Compute Interpol function
-        self.x2u_interpol_functions = []
+        # Grid of u and interpol functions
+        ValueIteration_ND.assign_interpol_controller( self )
         
-        cartcoord = self.grid_sys.nodes_state
+        self.u_policy_1D      = []
         
         # for all inputs
         for k in range(self.sys.m):
-            values  = self.u_policy_1D[k]
-            self.x2u_interpol_functions.append(
-                    LinearNDInterpolator(cartcoord, values, fill_value=0)
-                    )
+            self.u_policy_1D.append( 
+                    self.u_policy_grid[k].reshape( self.grid_sys.nodes_n ) )
         
-        # Asign Controller
-        self.ctl.vi_law = self.vi_law
         
-    
     ################################
     def vi_law(self, x , t = 0 ):
         """ controller from optimal actions """
         
-        u = np.zeros( self.sys.m )
-        
-        # for all inputs
-        for k in range(self.sys.m):
-            u[k] = self.x2u_interpol_functions[k]( x )
-        
-        return u
+        return ValueIteration_ND.vi_law( self , x , t )
         
         
     
@@ -595,23 +915,13 @@ class ValueIteration_3D( ValueIteration_2D ):
             self.J              = np.load( name + '_J'  + '.npy' )
             self.action_policy  = np.load( name + '_a'  + '.npy' ).astype(int)
             
-            self.J_1D          = np.zeros( self.grid_sys.nodes_n  , dtype = float )
+            # Create 1D J
+            self.J_1D          = self.J.reshape( self.grid_sys.nodes_n )
 
             self.Jnew          = self.J.copy()
             self.J_1D_new      = self.J_1D.copy()
             self.Jplot         = self.J.copy()
             
-            # Create 1D J       
-            for node in range( self.grid_sys.nodes_n ):  
-                
-                    x = self.grid_sys.nodes_state[ node , : ]
-                    
-                    i = self.grid_sys.nodes_index[ node , 0 ]
-                    j = self.grid_sys.nodes_index[ node , 1 ]
-                    k = self.grid_sys.nodes_index[ node , 2 ]
-                    
-                    self.J_1D[node] = self.J[i,j,k]
-            
         except:
             
             print('Failed to load DP data ' )
@@ -619,4 +929,171 @@ class ValueIteration_3D( ValueIteration_2D ):
 
         
         
-        
\ No newline at end of file
+                    
+
+'''
+################################################################################
+'''
+
+
+class ValueIteration_ND_Parallel( ValueIteration_ND ):
+    """ 
+    Value iteration with sweeps computed by a pool of worker processes
+    ------------------------------------------------------------------
+    The nodes are partitioned in contiguous blocks of partition_size nodes.
+    J, J_new and the policy are held in shared memory, at each sweep the 
+    workers backup their partitions from the same J and the sweep is 
+    synchronized before the next one. Every node is computed with the same
+    operations whatever the number of workers, so results are identical.
+    
+    Only the synchronous (jacobi) sweeps are parallel, the other methods of
+    solve() use the serial engine.
+    
+    The pool and shared memory start at the first parallel sweep. solve() 
+    and compute_steps() release them when done, after direct calls to 
+    compute_step() use close_pool() or a with statement:
+    
+        with ValueIteration_ND_Parallel( grid_sys , cf ) as vi:
+            vi.initialize()
+            vi.compute_step()
+    
+    """
+    
+    ############################
+    def __init__(self, grid_sys , cost_function , workers = None ):
+        
+        ValueIteration_ND.__init__(self, grid_sys , cost_function )
+        
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        
+        self.workers        = workers
+        self.partition_size = 10000  # nodes per task sent to the workers
+        
+        self.pool = None
+        self.shm  = []
+        
+        
+    ##############################
+    def start_pool(self):
+        """ Allocate shared memory and start the worker processes """
+        
+        if not self.transitions_are_computed:
+            self.compute_transitions()
+        
+        nodes_n = self.grid_sys.nodes_n
+        
+        # Shared J, J_new and policy
+        self.shm = [ shared_memory.SharedMemory( create = True , 
+                                                 size = nodes_n * 8 ) 
+                     for i in range(3) ]
+        
+        self.J_shared      = np.ndarray( nodes_n , float    , self.shm[0].buf )
+        self.J_new_shared  = np.ndarray( nodes_n , float    , self.shm[1].buf )
+        self.policy_shared = np.ndarray( nodes_n , np.int64 , self.shm[2].buf )
+        
+        # Partitions of the nodes, independent of the number of workers
+        self.partitions = [ ( start , min( start + self.partition_size , nodes_n ) )
+                            for start in range( 0 , nodes_n , self.partition_size ) ]
+        
+        shm_names = [ shm.name for shm in self.shm ]
+        
+        self.pool = multiprocessing.Pool( self.workers , parallel_worker_init , 
+                                          ( self.P , 
+                                            np.asarray( self.G ) , 
+                                            np.asarray( self.action_isok ) , 
+                                            self.cf.INF , 
+                                            shm_names , 
+                                            nodes_n ) )
+        
+        
+    ##############################
+    def close_pool(self):
+        """ Stop the worker processes and release the shared memory """
+        
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            
+            # Views must be released before closing the shared memory
+            del self.J_shared , self.J_new_shared , self.policy_shared
+            
+            for shm in self.shm:
+                shm.close()
+                shm.unlink()
+                
+            self.shm = []
+            
+            
+    ##############################
+    def __enter__(self):
+        
+        return self
+    
+    
+    ##############################
+    def __exit__(self, *args ):
+        
+        self.close_pool()
+        
+        
+    ##############################
+    def __del__(self):
+        """ Safety net, release workers and shared memory still in use """
+        
+        if getattr( self , 'pool' , None ) is not None:
+            self.close_pool()
+            
+            
+    ###############################
+    def compute_step_jacobi(self):
+        """ One parallel synchronous sweep, return the residual """
+        
+        if self.pool is None:
+            self.start_pool()
+        
+        J = self.J.reshape( self.grid_sys.nodes_n )
+        
+        self.J_shared[:] = J
+        
+        # Sweep, synchronized when all partitions are done
+        self.pool.map( parallel_worker_backup , self.partitions )
+        
+        J_new  = self.J_new_shared.copy()
+        policy = self.policy_shared.copy()
+        
+        self.Jnew          = J_new.reshape( self.grid_sys.xgriddim )
+        self.action_policy = policy.reshape( self.grid_sys.xgriddim )
+        
+        residual = self.compute_residual( J , J_new )
+        
+        self.J = self.Jnew.copy()
+        
+        self.residual_history.append( residual )
+        
+        return residual
+    
+    
+    ################################
+    def solve(self, method = 'jacobi' , tol = 1E-3 , max_steps = 1000 , 
+              eval_steps = 10 ):
+        """ Iterate until the residual is smaller than tol, see ValueIteration_ND """
+        
+        try:
+            residuals = ValueIteration_ND.solve(self, method , tol , max_steps , 
+                                                eval_steps )
+        finally:
+            self.close_pool()
+        
+        return residuals
+    
+    
+    ################################
+    def compute_steps(self, l = 50, plot = False):
+        """ compute number of step, then release the worker processes """
+        
+        try:
+            ValueIteration_ND.compute_steps(self, l , plot )
+        finally:
+            self.close_pool()
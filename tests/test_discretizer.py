@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped lookup tables must only be reused for the same system
+
+"""
+
+import os
+
+import numpy as np
+
+from pyro.dynamic  import pendulum
+from pyro.planning import discretizer
+
+
+###############################################################################
+class Environment:
+
+    def __init__(self):
+    
+        self.gravity = 9.81
+
+
+###############################################################################
+class PendulumInEnvironment( pendulum.SinglePendulum ):
+    """ Pendulum with its gravity in a nested object """
+    
+    def __init__(self):
+    
+        self.env = Environment()
+        
+        pendulum.SinglePendulum.__init__( self )
+    
+    @property
+    def gravity(self):
+        return self.env.gravity
+    
+    @gravity.setter
+    def gravity(self, value ):
+        self.env.gravity = value
+
+
+###############################################################################
+def grid( sys , lookup_dir ):
+
+    return discretizer.GridDynamicSystem( sys , ( 11 , 11 ) , ( 3 , ) ,
+                                          lookup_dir = lookup_dir )
+
+
+###############################################################################
+def test_lookup_table_reused_for_same_system( tmp_path ):
+
+    grid_sys = grid( PendulumInEnvironment() , str( tmp_path ) )
+    
+    # Second grid opens the completed files read-only
+    grid_sys2 = grid( PendulumInEnvironment() , str( tmp_path ) )
+    
+    assert grid_sys2.lookup_files == grid_sys.lookup_files
+    assert grid_sys2.x_next.mode == 'r'
+    assert np.array_equal( grid_sys2.x_next , grid( PendulumInEnvironment() , None ).x_next )
+
+
+###############################################################################
+def test_lookup_table_invalidated_by_nested_parameter( tmp_path ):
+
+    sys = PendulumInEnvironment()
+    
+    grid_sys = grid( sys , str( tmp_path ) )
+    
+    sys.env.gravity = 1.0
+    
+    grid_sys2 = grid( sys , str( tmp_path ) )
+    
+    assert grid_sys2.lookup_files != grid_sys.lookup_files
+    assert np.array_equal( grid_sys2.x_next , grid( sys , None ).x_next )
+    assert not np.array_equal( grid_sys2.x_next , grid_sys.x_next )
+
+
+###############################################################################
+def test_lookup_table_not_cached_with_unhashable_parameter( tmp_path ):
+
+    sys = pendulum.SinglePendulum()
+    
+    sys.custom_term = lambda q : 0.0
+    
+    grid_sys = grid( sys , str( tmp_path ) )
+    
+    assert grid_sys.lookuptable_key() is None
+    assert os.listdir( str( tmp_path ) ) == []
+    assert np.array_equal( grid_sys.x_next , grid( sys , None ).x_next )
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Trajectory references must match the interpolation of the trajectory
+
+"""
+
+import numpy as np
+from scipy.interpolate import interp1d, CubicSpline
+
+from pyro.control import nonlinear
+
+
+###############################################################################
+def random_trajectory( rng , N = 30 , dof = 2 ):
+    
+    # Non-uniform time-steps
+    t = np.concatenate( ( [ 0.0 ] , np.cumsum( rng.rand( N - 1 ) + 0.05 ) ) )
+    
+    q   = rng.randn( N , dof )
+    dq  = rng.randn( N , dof )
+    ddq = rng.randn( N , dof )
+    
+    return t , q , dq , ddq
+
+
+###############################################################################
+def test_linear_reference_matches_interp1d():
+    
+    rng = np.random.RandomState( 0 )
+    
+    t , q , dq , ddq = random_trajectory( rng )
+    
+    reference = nonlinear.TrajectoryReference( t , q , dq , ddq )
+    
+    expected = interp1d( t , np.hstack( ( q , dq , ddq ) ).T )
+    
+    # Monotone and random scalar queries, knots and ends included
+    ts = np.concatenate( ( np.linspace( t[0] , t[-1] , 301 ) , t , 
+                           rng.uniform( t[0] , t[-1] , 100 ) ) )
+    
+    for ti in ts:
+        assert np.allclose( reference( ti ) , expected( ti ) )
+        
+    # Array of times
+    assert np.allclose( reference( ts ) , expected( ts ).T )
+    
+    
+###############################################################################
+def test_cubic_reference_matches_spline():
+    
+    rng = np.random.RandomState( 1 )
+    
+    t , q , dq , ddq = random_trajectory( rng )
+    
+    reference = nonlinear.TrajectoryReference( t , q , dq , ddq , order = 3 )
+    
+    expected = CubicSpline( t , np.hstack( ( q , dq , ddq ) ) , axis = 0 )
+    
+    ts = rng.uniform( t[0] , t[-1] , 200 )
+    
+    for ti in ts:
+        assert np.allclose( reference( ti ) , expected( ti ) )
+        
+    assert np.allclose( reference( ts ) , expected( ts ) )
+    
+    # Times out of the trajectory are clipped to its ends
+    assert np.allclose( reference( t[-1] + 1.0 ) , expected( t[-1] ) )
+    assert np.allclose( reference( t[0] - 1.0 ) , expected( t[0] ) )
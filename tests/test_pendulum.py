@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Pendulum dynamics must follow the H, C, g, d and B of child classes
+
+"""
+
+import numpy as np
+
+from pyro.dynamic  import pendulum
+from pyro.analysis import simulation
+
+
+###############################################################################
+class SpringPendulum( pendulum.SinglePendulum ):
+    """ Single pendulum with an additional torsional spring """
+    
+    def g(self, q ):
+        
+        return pendulum.SinglePendulum.g( self , q ) + 2.5 * q
+    
+
+###############################################################################
+class DampedDoublePendulum( pendulum.DoublePendulum ):
+    """ Double pendulum with viscous friction on both joints """
+    
+    def d(self, q , dq ):
+        
+        return 2 * dq
+    
+    
+###############################################################################
+def reference_f( sys , x , u ):
+    """ Foward dynamics written directly from H, C, g, d and B """
+    
+    q , dq = sys.x2q( x )
+    
+    ddq = np.linalg.solve( sys.H( q ) , np.dot( sys.B( q ) , u ) 
+                                        - np.dot( sys.C( q , dq ) , dq ) 
+                                        - sys.g( q ) - sys.d( q , dq ) )
+    
+    return np.concatenate( ( dq , ddq ) )
+
+
+###############################################################################
+def test_overloaded_terms_are_used_by_f():
+    
+    for sys , x , u in [ ( SpringPendulum() , 
+                           np.array([ 0.3 , 0.1 ]) , 
+                           np.array([ 0.5 ]) ) ,
+                         ( DampedDoublePendulum() , 
+                           np.array([ 0.1 , 0.2 , 0.3 , -0.4 ]) , 
+                           np.array([ 1.0 , 2.0 ]) ) ]:
+        
+        assert np.allclose( sys.f( x , u ) , reference_f( sys , x , u ) )
+        
+        
+###############################################################################
+def test_stock_bundle_matches_terms():
+    
+    for sys in [ pendulum.SinglePendulum() , pendulum.DoublePendulum() ]:
+        
+        sys.d1 = 0.3
+        sys.d2 = 0.2
+        
+        rng = np.random.RandomState( 0 )
+        Q   = rng.randn( 10 , sys.dof )
+        dQ  = rng.randn( 10 , sys.dof )
+        
+        H , C , g , d = sys.dynamics_bundle( Q , dQ )
+        
+        for i in range( 10 ):
+            assert np.allclose( H[i] , sys.H( Q[i] ) )
+            assert np.allclose( C[i] , sys.C( Q[i] , dQ[i] ) )
+            assert np.allclose( g[i] , sys.g( Q[i] ) )
+            assert np.allclose( d[i] , sys.d( Q[i] , dQ[i] ) )
+        
+        
+###############################################################################
+def test_overloaded_terms_are_used_by_f_batch():
+    
+    rng = np.random.RandomState( 0 )
+    
+    for sys in [ SpringPendulum() , DampedDoublePendulum() ,
+                 pendulum.SinglePendulum() , pendulum.DoublePendulum() ]:
+        
+        X = rng.randn( 20 , sys.n )
+        U = rng.randn( 20 , sys.m )
+        
+        dX = np.array([ reference_f( sys , x , u ) for x , u in zip( X , U ) ])
+        
+        assert np.allclose( sys.f_batch( X , U ) , dX )
+        
+        
+###############################################################################
+class ForcedPendulum( pendulum.SinglePendulum ):
+    """ Single pendulum with a time-varying torque added in f """
+    
+    def f(self, x , u , t = 0 ):
+        
+        return pendulum.SinglePendulum.f( self , x , u + np.sin( t ) , t )
+    
+
+###############################################################################
+class AccelerationLimitedPendulum( pendulum.SinglePendulum ):
+    """ Single pendulum with saturated accelerations """
+    
+    def ddq(self, q , dq , u , t = 0 ):
+        
+        return np.clip( pendulum.SinglePendulum.ddq( self , q , dq , u , t ) , -1 , 1 )
+    
+    
+###############################################################################
+def test_overloaded_f_and_ddq_are_used_by_f_batch():
+    
+    rng = np.random.RandomState( 0 )
+    
+    for sys in [ ForcedPendulum() , AccelerationLimitedPendulum() ]:
+        
+        X = rng.randn( 20 , sys.n )
+        U = rng.randn( 20 , sys.m )
+        T = rng.rand( 20 )
+        
+        dX = np.array([ sys.f( x , u , t ) for x , u , t in zip( X , U , T ) ])
+        
+        assert np.allclose( sys.f_batch( X , U , T ) , dX )
+        
+    # Batch simulations do not vectorize a child class overloading f only
+    assert not simulation.BatchSimulation( ForcedPendulum() ).is_vectorized()
+    assert simulation.BatchSimulation( AccelerationLimitedPendulum() ).is_vectorized()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Random tree planners must return paths the system can follow
+
+"""
+
+import numpy as np
+
+from pyro.dynamic  import pendulum
+from pyro.planning import randomtree
+from pyro.analysis import costfunction
+
+
+###############################################################################
+def pendulum_planner( planner_class ):
+
+    sys = pendulum.SinglePendulum()
+    
+    planner = planner_class( sys , np.array([ 0.1 , 0.0 ]) )
+    
+    planner.u_options = [ np.array([ u ]) for u in [ -5 , -3 , -1 , 0 , 1 , 3 , 5 ] ]
+    
+    planner.goal_radius = 0.2
+    planner.dyna_plot   = False
+    
+    return planner
+
+
+###############################################################################
+def replay_error( sys , traj , x_end , dt ):
+    """ Max error of the trajectory steps replayed with sys.x_next """
+    
+    x = np.vstack( ( traj.x_sol , x_end ) )
+    
+    x_next = sys.x_next_batch( traj.x_sol , traj.u_sol , traj.t_sol , dt )
+    
+    return np.abs( x_next - x[1:] ).max()
+
+
+###############################################################################
+def test_rrt_star_tree_follows_the_dynamics():
+
+    np.random.seed( 3 )
+    
+    planner = pendulum_planner( randomtree.RRTStar )
+    
+    planner.cf = costfunction.QuadraticCostFunction( planner.sys )
+    planner.cf.ontarget_check = False
+    
+    planner.rewire_radius = 0.5
+    
+    # Count the rewirings
+    rewired   = []
+    set_parent = planner.tree.set_parent
+    
+    def count_set_parent( node_id , parent_id ):
+        rewired.append( node_id )
+        set_parent( node_id , parent_id )
+    
+    planner.tree.set_parent = count_set_parent
+    
+    x_goal = np.array([ -3.14 , 0.0 ])
+    
+    assert planner.find_path_to_goal( x_goal , time_budget = 1.0 )
+    
+    assert len( rewired ) > 0
+    
+    tree = planner.tree
+    ids  = np.arange( 1 , tree.size )
+    p    = tree.parent[ ids ]
+    
+    # Each node is exactly reached from its parent
+    x_next = planner.sys.x_next_batch( tree.x[ p ] , tree.u[ ids ] , tree.t[ p ] ,
+                                       planner.dt )
+    
+    assert np.allclose( x_next , tree.x[ ids ] )
+    assert np.allclose( tree.t[ ids ] , tree.t[ p ] + planner.dt )
+    assert np.allclose( tree.cost[ ids ] , tree.cost[ p ] +
+                        planner.edge_cost( tree.x[ p ] , tree.u[ ids ] , tree.t[ p ] ) )
+    
+    # Children lists match the parents
+    for i in range( tree.size ):
+        assert sorted( tree.children[ i ] ) == list( np.flatnonzero( tree.parent[ : tree.size ] == i ) )
+    
+    # Index holds the current states
+    index = planner.nn_index
+    rows  = np.array([ index.rows[ i ] for i in range( tree.size ) ])
+    
+    assert np.allclose( index.X[ rows ] , index.weights * tree.x[ : tree.size ] )
+    
+    # Solution
+    x_end = tree.x[ planner.goal_node.id ]
+    
+    assert np.linalg.norm( x_end - x_goal ) < planner.goal_radius
+    assert replay_error( planner.sys , planner.trajectory , x_end , planner.dt ) < 1e-9
+
+
+###############################################################################
+def test_rrt_star_without_solution():
+
+    np.random.seed( 0 )
+    
+    planner = pendulum_planner( randomtree.RRTStar )
+    
+    assert not planner.find_path_to_goal( np.array([ -3.14 , 0.0 ]) ,
+                                          time_budget = 0.01 )
+    
+    assert planner.trajectory is None
+    
+    try:
+        planner.plot_open_loop_solution()
+        assert False
+    except ValueError:
+        pass
+
+
+###############################################################################
+def test_bidirectional_rrt_path_follows_the_dynamics():
+
+    np.random.seed( 1 )
+    
+    planner = pendulum_planner( randomtree.BidirectionalRRT )
+    
+    x_goal = np.array([ -3.14 , 0.0 ])
+    
+    assert planner.find_path_to_goal( x_goal , time_budget = 5.0 )
+    
+    # Backward half re-simulated forward, ending within goal_radius
+    assert np.linalg.norm( planner.x_end - x_goal ) < planner.goal_radius
+    assert replay_error( planner.sys , planner.trajectory , planner.x_end , 
+                         planner.dt ) < 1e-9
+
+
+###############################################################################
+def test_parallel_rrt_paths_follow_the_dynamics():
+
+    planner = pendulum_planner( randomtree.RRT )
+    
+    parallel = randomtree.ParallelRRT( planner , workers = 2 )
+    
+    parallel.trees_n     = 3
+    parallel.time_budget = 10.0
+    parallel.mode        = 'best'
+    
+    x_goal = np.array([ -3.14 , 0.0 ])
+    
+    assert parallel.find_path_to_goal( x_goal )
+    
+    # One result per seed, the best one is kept
+    results = parallel.results
+    
+    assert sorted( r[0] for r in results ) == [ 0 , 1 , 2 ]
+    
+    times = [ r[3].time_final for r in results if r[3] is not None ]
+    
+    assert parallel.trajectory.time_final == min( times )
+    
+    # The trajectory of each tree replays its edges
+    for seed , pid , succes , traj , nodes , elapsed in results:
+        
+        if succes:
+            x_end = planner.sys.x_next_batch( traj.x_sol[-1:] , traj.u_sol[-1:] , 
+                                              traj.t_sol[-1] , planner.dt )[0]
+            
+            assert np.linalg.norm( x_end - x_goal ) < planner.goal_radius
+            assert replay_error( planner.sys , traj , x_end , planner.dt ) < 1e-9
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Batch simulations must match individual simulations
+
+"""
+
+import numpy as np
+
+from pyro.dynamic  import pendulum
+from pyro.analysis import simulation
+
+
+###############################################################################
+def test_batch_costs_with_events_match_single_simulations():
+    
+    sys = pendulum.SinglePendulum()
+    
+    # The first run reaches the goal, the second one never does
+    x0     = np.array([[ 1.0 , 0.0 ] , 
+                       [ 0.1 , 0.0 ]])
+    x_goal = np.array([ 0.0 , -2.0 ])
+    
+    J = []
+    
+    for x in x0:
+        
+        sim = simulation.Simulation( sys , 5 , 501 , 'rk4' )
+        
+        sim.x0          = x
+        sim.x_goal      = x_goal
+        sim.goal_radius = 0.5
+        
+        sim.compute()
+        
+        J.append( sim.J )
+        
+    for vectorized in [ True , False ]:
+        
+        batch = simulation.BatchSimulation( sys , 5 , 501 , 'rk4' )
+        
+        batch.x0          = x0
+        batch.x_goal      = x_goal
+        batch.goal_radius = 0.5
+        batch.vectorized  = vectorized
+        batch.workers     = 1
+        
+        batch.compute()
+        
+        assert list( batch.termination ) == [ 'goal' , None ]
+        assert np.allclose( batch.J , J )
+        
+        
+###############################################################################
+def test_event_trims_results_not_horizon():
+    
+    sys = pendulum.SinglePendulum()
+    
+    sim = simulation.Simulation( sys , 5 , 501 , 'rk4' )
+    
+    sim.x0          = np.array([ 1.0 , 0.0 ])
+    sim.x_goal      = np.array([ 0.0 , -2.0 ])
+    sim.goal_radius = 0.5
+    
+    sim.compute()
+    
+    # Results are trimmed, the configured horizon is kept
+    n = sim.x_sol.shape[0]
+    
+    assert sim.termination == 'goal' and n < 501
+    assert sim.tf == 5 and sim.n == 501
+    assert sim.t.shape[0] == n and sim.t[-1] < 5
+    assert sim.u_sol.shape[0] == n and sim.J_sol.shape[0] == n
+    
+    sim.x_goal = None
+    sim.compute()
+    
+    assert sim.x_sol.shape[0] == 501 and sim.t[-1] == 5
+    
+    # Batch simulations
+    batch = simulation.BatchSimulation( sys , 5 , 501 , 'rk4' )
+    
+    batch.x0          = np.array([[ 1.0 , 0.0 ]])
+    batch.x_goal      = np.array([ 0.0 , -2.0 ])
+    batch.goal_radius = 0.5
+    
+    batch.compute()
+    
+    assert batch.tf == 5 and batch.n == 501
+    assert batch.x_sol.shape[1] == n and batch.t.shape[0] == n
+    assert batch.J_sol.shape == ( 1 , n )
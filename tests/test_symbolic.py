@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Generated mechanical systems must have exact Jacobians and be cached
+
+"""
+
+import os
+
+import numpy as np
+
+from pyro.dynamic import symbolic
+
+
+###############################################################################
+def chain( cache_dir , dof = 2 , **defaults ):
+    
+    L , q , dq , params , d = symbolic.planar_chain_model( dof )
+    
+    for s in params:
+        if s.name in defaults:
+            params[ s ] = defaults[ s.name ]
+    
+    return symbolic.generate_mechanical_system( L , q , dq , params , d , 
+                                                cache_dir = cache_dir )
+
+
+###############################################################################
+def test_jacobians_match_finite_differences( tmp_path ):
+    
+    sys = chain( str( tmp_path ) , d1 = 0.3 , d2 = 0.2 , m2 = 2.0 )()
+    
+    rng = np.random.RandomState( 0 )
+    X   = rng.randn( 5 , sys.n )
+    U   = rng.randn( 5 , sys.m )
+    
+    A , B = sys.f_jacobians( X , U )
+    
+    eps = 1E-6
+    
+    for i in range( 5 ):
+        
+        # Central differences of f
+        A_fd = np.zeros(( sys.n , sys.n ))
+        B_fd = np.zeros(( sys.n , sys.m ))
+        
+        for k in range( sys.n ):
+            e = np.zeros( sys.n )
+            e[k] = eps
+            A_fd[:,k] = ( sys.f( X[i] + e , U[i] ) - sys.f( X[i] - e , U[i] ) ) / ( 2 * eps )
+            
+        for k in range( sys.m ):
+            e = np.zeros( sys.m )
+            e[k] = eps
+            B_fd[:,k] = ( sys.f( X[i] , U[i] + e ) - sys.f( X[i] , U[i] - e ) ) / ( 2 * eps )
+            
+        assert np.allclose( A[i] , A_fd , atol = 1E-6 )
+        assert np.allclose( B[i] , B_fd , atol = 1E-6 )
+        
+        # Single state
+        A_i , B_i = sys.f_jacobians( X[i] , U[i] )
+        
+        assert np.allclose( A_i , A[i] ) and np.allclose( B_i , B[i] )
+        
+        
+###############################################################################
+def test_generated_module_is_cached( tmp_path , monkeypatch ):
+    
+    cache_dir = str( tmp_path )
+    
+    System = chain( cache_dir , dof = 1 )
+    
+    assert len( os.listdir( cache_dir ) ) == 1
+    
+    # Same model: loaded from the cache without a new derivation
+    def no_derivation( *args ):
+        raise AssertionError('model derived again')
+    
+    monkeypatch.setattr( symbolic , 'generate_source' , no_derivation )
+    
+    Cached = chain( cache_dir , dof = 1 )
+    
+    x = np.array([ 0.4 , -0.2 ])
+    u = np.array([ 0.5 ])
+    
+    assert np.allclose( Cached().f( x , u ) , System().f( x , u ) )
+    
+    monkeypatch.undo()
+    
+    # Other default parameters: new module
+    Heavy = chain( cache_dir , dof = 1 , m1 = 3.0 )
+    
+    assert len( os.listdir( cache_dir ) ) == 2
+    assert Heavy().m1 == 3.0
+    assert not np.allclose( Heavy().f( x , u ) , System().f( x , u ) )
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Value iteration methods must converge to the same fixed point
+
+"""
+
+import numpy as np
+
+from pyro.dynamic  import pendulum
+from pyro.planning import discretizer
+from pyro.planning import valueiteration
+from pyro.analysis import costfunction
+
+
+###############################################################################
+def solve( grid_sys , cf , method ):
+    
+    vi = valueiteration.ValueIteration_ND( grid_sys , cf )
+    vi.initialize()
+    vi.solve( method , tol = 1E-6 , max_steps = 5000 )
+    
+    return vi.J.reshape( -1 )
+
+
+###############################################################################
+def test_prioritized_matches_jacobi_with_infeasible_nodes():
+    
+    sys = pendulum.SinglePendulum()
+    
+    grid_sys = discretizer.GridDynamicSystem( sys , ( 21 , 21 ) , ( 3 , ) )
+    
+    cf     = costfunction.QuadraticCostFunction( sys )
+    cf.INF = 1E4
+    
+    J_jacobi      = solve( grid_sys , cf , 'jacobi' )
+    J_prioritized = solve( grid_sys , cf , 'prioritized' )
+    
+    feasible = J_jacobi < ( cf.INF - 1 )
+    
+    # The grid has infeasible regions
+    assert not feasible.all()
+    
+    assert np.array_equal( feasible , J_prioritized < ( cf.INF - 1 ) )
+    
+    assert np.allclose( J_jacobi[ feasible ] , J_prioritized[ feasible ] , 
+                        atol = 1E-3 )
+    
+    
+###############################################################################
+def test_parallel_pool_is_released():
+    
+    sys = pendulum.SinglePendulum()
+    
+    grid_sys = discretizer.GridDynamicSystem( sys , ( 11 , 11 ) , ( 3 , ) )
+    
+    cf = costfunction.QuadraticCostFunction( sys )
+    
+    vi = valueiteration.ValueIteration_ND_Parallel( grid_sys , cf , 1 )
+    vi.initialize()
+    vi.compute_steps( 2 )
+    
+    assert vi.pool is None and vi.shm == []
+    
+    with valueiteration.ValueIteration_ND_Parallel( grid_sys , cf , 1 ) as vi:
+        vi.initialize()
+        vi.compute_step()
+        
+        assert vi.pool is not None
+        
+    assert vi.pool is None and vi.shm == []
+
+
+###############################################################################
+def test_prioritized_steps_only_back_up_queued_nodes():
+    
+    sys = pendulum.SinglePendulum()
+    
+    grid_sys = discretizer.GridDynamicSystem( sys , ( 21 , 21 ) , ( 3 , ) )
+    
+    cf     = costfunction.QuadraticCostFunction( sys )
+    cf.INF = 1E4
+    
+    vi = valueiteration.ValueIteration_ND( grid_sys , cf )
+    vi.initialize()
+    vi.compute_transitions()
+    
+    backup = vi.backup
+    sweeps = []
+    
+    def count_full_backups( J , nodes = None ):
+        if nodes is None:
+            sweeps.append( nodes )
+        return backup( J , nodes )
+    
+    vi.backup = count_full_backups
+    
+    residuals = vi.solve( 'prioritized' , tol = 1E-6 , max_steps = 5000 )
+    
+    assert residuals[-1] < 1E-6
+    
+    # Only the initial priorities need all the nodes
+    assert len( residuals ) > 1 and len( sweeps ) == 1
+    
+    J = vi.J.copy()
+    
+    # Converged values stay converged
+    vi.solve( 'prioritized' , tol = 1E-6 )
+    
+    assert np.array_equal( J , vi.J ) and len( sweeps ) == 1
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Obstacle checks must follow the obstacles of the robot
+
+"""
+
+import numpy as np
+
+from pyro.dynamic import vehicle
+
+
+###############################################################################
+def test_obstacle_edited_in_place():
+
+    sys = vehicle.HolonomicMobileRobotwithObstacles()
+    
+    x = np.array([ 3.0 , 5.0 ])
+    
+    assert not sys.isavalidstate( x )
+    
+    # Shrink the first box so x is now free
+    sys.obstacles[0][1] = ( 2.5 , 10 )
+    
+    assert sys.isavalidstate( x )
+    assert sys.isavalidtransition_batch( x[ None , : ] , x[ None , : ] )[0]
+    
+    # Replace the list
+    sys.obstacles = [ [ ( 2 , 2 ) , ( 4 , 10 ) ] ]
+    
+    assert not sys.isavalidstate( x )
+
+
+###############################################################################
+def test_forced_obstacle_map_rebuild():
+
+    sys = vehicle.HolonomicMobileRobotwithObstacles()
+    
+    obstacle_map = sys.obstacle_map
+    
+    assert sys.update_obstacle_map() is obstacle_map
+    assert sys.update_obstacle_map( force = True ) is not obstacle_map